@@ -0,0 +1,196 @@
+"""
+Offline benchmarks of pycftools against the local mock of the CFTools Data API (tests/stub_server.py).
+
+The mock runs in a separate process, so its work doesn't compete with the client for the GIL.
+Measured: requests/sec and p50 / p99 latency for sequential, threaded and asyncio usage,
+the cost of a token refresh and memory allocated per call.
+
+    python benchmarks/bench.py
+    python benchmarks/bench.py --json baseline.json
+    python benchmarks/bench.py --compare baseline.json --tolerance 0.2   # exit code 1 on a regression
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'tests')]
+
+import pycftools  # noqa: E402
+from stub_server import StubCfToolsServer  # noqa: E402
+
+# Result key -> True if higher is better.
+HIGHER_IS_BETTER = {'rps': True, 'p50_ms': False, 'p99_ms': False, 'ms': False, 'bytes_per_call': False}
+
+
+def _serve(port_queue):
+    stub = StubCfToolsServer()
+    port_queue.put(stub.url)
+    stub.serve_forever()
+
+
+def _client(url, **kwargs):
+    return pycftools.CfToolsApi(app_id='app', app_secret='secret', game_identifier='1', ip='127.0.0.1',
+                                game_port='2302', server_api_id='server', server_banlist_id='banlist',
+                                rate_limiter=False, token_store=pycftools.MemoryTokenStore(), api_url=url, **kwargs)
+
+
+def _summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def _timed(call):
+    started = time.perf_counter()
+    call()
+    return time.perf_counter() - started
+
+
+def bench_sequential(url, calls):
+    cfapi = _client(url)
+    cfapi.server_info()
+    started = time.perf_counter()
+    latencies = [_timed(cfapi.server_info) for _ in range(calls)]
+    result = _summary(latencies, time.perf_counter() - started)
+    cfapi.close()
+    return result
+
+
+def bench_threads(url, calls, workers):
+    cfapi = _client(url)
+    cfapi.server_info()
+    # Distinct players, so the single flight doesn't collapse the calls.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        started = time.perf_counter()
+        latencies = list(executor.map(lambda i: _timed(lambda: cfapi.server_player_stats(f'cf-{i}')), range(calls)))
+        elapsed = time.perf_counter() - started
+    cfapi.close()
+    return _summary(latencies, elapsed)
+
+
+def bench_asyncio(url, calls, concurrency):
+    async def run():
+        cfapi = pycftools.AsyncCfToolsApi(app_id='app', app_secret='secret', game_identifier='1', ip='127.0.0.1',
+                                          game_port='2302', server_api_id='server', server_banlist_id='banlist',
+                                          rate_limiter=False, token_store=pycftools.MemoryTokenStore(), api_url=url,
+                                          max_connections=concurrency)
+        await cfapi.server_info()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(i):
+            async with semaphore:
+                started = time.perf_counter()
+                await cfapi.server_player_stats(f'cf-{i}')
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*[call(i) for i in range(calls)])
+        elapsed = time.perf_counter() - started
+        await cfapi.close()
+        return _summary(latencies, elapsed)
+
+    return asyncio.run(run())
+
+
+def bench_token_refresh(url, rounds):
+    """
+    First call of a fresh client (register + store + call) minus a call with the token in place.
+    """
+    cold, warm = [], []
+    for _ in range(rounds):
+        cfapi = _client(url)
+        cold.append(_timed(cfapi.server_info))
+        warm.append(_timed(cfapi.server_info))
+        cfapi.close()
+    return {'ms': (statistics.median(cold) - statistics.median(warm)) * 1000}
+
+
+def bench_memory(url, calls):
+    """
+    Peak bytes allocated during a call, and bytes still held after all the calls (a leak shows up here).
+    """
+    cfapi = _client(url)
+    for _ in range(10):
+        cfapi.server_info()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    peaks = []
+    for _ in range(calls):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        cfapi.server_info()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    cfapi.close()
+    return {'bytes_per_call': statistics.median(peaks), 'retained_bytes_per_call': retained / calls}
+
+
+def compare(results, baseline, tolerance):
+    """
+    :return: List of regression descriptions, empty if there are none.
+    """
+    regressions = []
+    for name, values in results.items():
+        for key, value in values.items():
+            old = baseline.get(name, {}).get(key)
+            if old is None or key not in HIGHER_IS_BETTER or not old:
+                continue
+            change = (value - old) / old
+            if (change < -tolerance) if HIGHER_IS_BETTER[key] else (change > tolerance):
+                regressions.append(f'{name}.{key}: {old:.2f} -> {value:.2f} ({change:+.0%})')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='baseline json written by --json')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative change against the baseline')
+    arguments = parser.parse_args()
+
+    url_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(url_queue,), daemon=True)
+    server.start()
+    url = url_queue.get(timeout=10)
+    try:
+        results = {
+            'sequential': bench_sequential(url, arguments.calls),
+            'threads': bench_threads(url, arguments.calls, arguments.workers),
+        }
+        if pycftools.httpx is not None:
+            results['asyncio'] = bench_asyncio(url, arguments.calls, arguments.workers)
+        results['token_refresh'] = bench_token_refresh(url, 20)
+        results['memory'] = bench_memory(url, min(arguments.calls, 500))
+    finally:
+        server.terminate()
+
+    for name, values in results.items():
+        print(f'{name:<14}' + '  '.join(f'{key}={value:,.2f}' for key, value in values.items()))
+    if arguments.json:
+        with open(arguments.json, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+    if arguments.compare:
+        with open(arguments.compare, 'r', encoding='utf-8') as baseline:
+            regressions = compare(results, json.load(baseline), arguments.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,674 +1,5764 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing, contextmanager
 from functools import wraps
 
+import argparse
+import array
+import asyncio
+import base64
+import bisect
+import codecs
+import collections
+import contextvars
+import csv
 import datetime
+import email.utils
+import fnmatch
+import gzip
+import heapq
+import http.client
+import threading
+import time
+import urllib.parse
 import requests
+import requests.adapters
+import urllib3
 import hashlib
+import json
 import pickle
+import random
 import os
+import socket
+import sqlite3
+import sys
+import tempfile
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
-class CfToolsApi(object):
-    def __init__(self, app_id, app_secret, game_identifier, ip, game_port, server_api_id, server_banlist_id,
-                 auth_token_filename='token.raw', pycftools_debug=False, timestamp_delta=43200):
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class CfToolsError(Exception):
+    """
+    Base class for errors raised by pycftools itself.
+    """
+
+
+class RateLimitExceeded(CfToolsError):
+    def __init__(self, route, retry_after):
         """
-        Class CfToolsApi used to access various cftools api methods.
-        The main use, getting access to api.
-        The ability to automate some processes, and getting access to the application from outside.
+        Raised in non-blocking mode when a route has no free quota.
 
-        :param app_id: Application Id from https://developer.cftools.cloud/applications
-        :type app_id: str
-        :param app_secret: Application secret from https://developer.cftools.cloud/applications
-        :type app_secret: str
-        :param game_identifier: Game_identifier is needed to create server id.
-        :type game_identifier: str
-        :param ip: Ipv4 is needed to create server id.
-        :type ip: str
-        :param game_port: Game_port is needed to create server id.
-        :type game_port: str
-        :param server_api_id: Server_api_id this is the global server identifier and it can be found in the server API settings.
-        :type server_api_id: str
-        :param server_banlist_id: Server_banlist_id is global banlist identifier, it can be found in ban-manager https://app.cftools.cloud/ban-manager - see for Banlist ID.
-        :type server_banlist_id: str
-        :param auth_token_filename: Auth_token_filename this is the filename var for auth token file.
-        :type auth_token_filename: str
-        :param pycftools_debug: This is the variable for enabling debug outputs from the program.
-        :type pycftools_debug: bool
-        :param timestamp_delta: This is the time offset delta when the token in the file needs to be updated. By default, the value is set to half a day - 43200. UNIXTIMESTAMP
-        :type timestamp_delta: int
+        :param route: Route name, the same as the api method name (or 'auth').
+        :type route: str
+        :param retry_after: Seconds until the next request for this route is allowed.
+        :type retry_after: float
         """
+        super().__init__(f'Rate limit for {route} exceeded, retry after {retry_after:.2f}s')
+        self.route = route
+        self.retry_after = retry_after
 
-        self.__pycftools_debug = pycftools_debug
-        self.__application_id = app_id
-        self.__application_secret = app_secret
-        self.__server_id_hash = self._create_server_id_hash(game_identifier, ip, game_port)
-        self.__server_api_id = server_api_id
 
-        # General public api url
-        self.__public_api_url = 'https://data.cftools.cloud'
+# Set by RateLimiter.nowait(), works per thread and per asyncio task.
+_rate_limit_nowait = contextvars.ContextVar('pycftools_rate_limit_nowait', default=False)
 
-        # ---------------- Api urls ----------------
 
-        self.__authentication_url = ''.join([self.__public_api_url, '/v1/auth/register'])
-        self.__grants_url = ''.join([self.__public_api_url, '/v1/@app/grants'])
-        self.__server_details_url = ''.join(
-            [self.__public_api_url, f'/v1/gameserver/{self.__server_id_hash}'])
-        self.__server_info_url = ''.join(
-            [self.__public_api_url, f'/v1/server/{self.__server_api_id}/info'])
-        self.__server_statistics_url = ''.join(
-            [self.__public_api_url, f'/v1/server/{self.__server_api_id}/statistics'])
-        self.__server_player_list_url = ''.join(
-            [self.__public_api_url, f'/v1/server/{self.__server_api_id}/GSM/list'])
-        self.__server_kick_url = ''.join(
-            [self.__public_api_url, f'/v1/server/{self.__server_api_id}/kick'])
-        self.__server_private_message_url = ''.join(
-            [self.__public_api_url, f'/v1/server/{self.__server_api_id}/message-private'])
-        self.__server_public_message_url = ''.join(
-            [self.__public_api_url, f'/v1/server/{self.__server_api_id}/message-server'])
-        self.__server_row_rcon_command_url = ''.join(
-            [self.__public_api_url, f'/v1/server/{self.__server_api_id}/raw'])
-        self.__server_teleport_url = ''.join(
-            [self.__public_api_url, f'/v0/server/{self.__server_api_id}/gameLabs/teleport'])
-        self.__server_spawn_url = ''.join(
-            [self.__public_api_url, f'/v0/server/{self.__server_api_id}/gameLabs/spawn'])
-        self.__server_queue_priority_url = ''.join(
-            [self.__public_api_url, f'/v1/server/{self.__server_api_id}/queuepriority'])
-        self.__server_whitelist_url = ''.join(
-            [self.__public_api_url, f'/v1/server/{self.__server_api_id}/whitelist'])
-        self.__server_leaderboard_url = ''.join(
-            [self.__public_api_url, f'/v1/server/{self.__server_api_id}/leaderboard'])
-        self.__server_player_stats_url = ''.join(
-            [self.__public_api_url, f'/v1/server/{self.__server_api_id}/player'])
-        self.__server_banlist_url = ''.join(
-            [self.__public_api_url, f'/v1/banlist/{server_banlist_id}/bans'])
-        self.__server_lookup_url = ''.join([self.__public_api_url, '/v1/users/lookup'])
+class RateLimiter(object):
+    # Documented CFTools quotas: route -> (requests, period in seconds).
+    DEFAULT_QUOTAS = {
+        'auth': (2, 60),
+        'grants': (1, 60),
+        'server_leaderboard': (7, 60),
+        'server_player_stats': (10, 60),
+    }
 
-        # ---------------- Api urls End ----------------
+    def __init__(self, quotas=None):
+        """
+        Token-bucket scheduler keyed by route.
+        Every route has a bucket of `requests` tokens refilled evenly over `period` seconds.
+        Calls over the quota are not sent to fail - they are queued and paced until their slot comes.
+        Routes without quota are not limited.
 
-        self.__api_cftools_session = requests.Session()
-        self.__api_cftools_bearer_token = None
+        One limiter may be shared by several clients, it is thread-safe and works for sync and async clients.
 
-        self.__api_cftools_headers = {}
-        self.__cftools_token_file = auth_token_filename
-        self.__timestamp_delta = timestamp_delta
+        :param quotas: Dict route -> (requests, period). By default, DEFAULT_QUOTAS are used.
+        :type quotas: dict
+        """
+        self.__quotas = dict(self.DEFAULT_QUOTAS if quotas is None else quotas)
+        # route -> [tokens, last refill monotonic time]
+        self.__buckets = {}
+        self.__waiting = {}
+        self.__lock = threading.Lock()
 
-        self.__token_timestamp = None
-        self.__first_load = True
+    def set_quota(self, route, requests_count, period):
+        """
+        Set or replace quota for a route.
 
-    # ---------------- Save/load tokens ----------------
+        :param route: Route name.
+        :type route: str
+        :param requests_count: Requests allowed per period.
+        :type requests_count: int
+        :param period: Period in seconds.
+        :type period: float
+        """
+        with self.__lock:
+            self.__quotas[route] = (requests_count, period)
+            self.__buckets.pop(route, None)
 
-    def check_register(wmethod):
+    def __refill(self, route, now):
         """
-        This method is needed to check if we have an up-to-date authorization token.
-        It checks if there is a file with a token inside.
-        If such is found, it checks the relevance of the token and loads if everything is correct.
-        Else asks for a new one, and automatically sets / saves.
+        Must be called with the lock held.
 
-        Note:
-            Saving a token to a file is the simplest thing that came to my mind.
-            Perhaps there is some kind of security threat from this.
-            Write to issues on github to discuss :)
+        :return: Bucket list [tokens, last] and seconds per token, or (None, None) if route is not limited.
+        """
+        quota = self.__quotas.get(route)
+        if quota is None:
+            return None, None
+        requests_count, period = quota
+        interval = period / requests_count
+        bucket = self.__buckets.get(route)
+        if bucket is None:
+            bucket = self.__buckets[route] = [float(requests_count), now]
+        else:
+            bucket[0] = min(float(requests_count), bucket[0] + (now - bucket[1]) / interval)
+            bucket[1] = now
+        return bucket, interval
 
-            Saving the token to a file makes it possible not to request a new token -
-            every time after the object is re-created.
-            Moreover, there is a delay of 2 requests per minute.
+    def wait_time(self, route):
+        """
+        :return: Seconds a new request for the route would have to wait now.
+        :rtype: float
+        """
+        with self.__lock:
+            bucket, interval = self.__refill(route, time.monotonic())
+            if bucket is None or bucket[0] >= 1:
+                return 0.0
+            return (1 - bucket[0]) * interval
 
-            this. - in this context is self.
-            I use this method as a wrapper for other methods where the authorization token must be up to date.
+    def queue_depth(self, route=None):
+        """
+        :param route: Route name, if None - total for all routes.
+        :type route: str
+        :return: Number of calls currently waiting for their slot.
+        :rtype: int
+        """
+        with self.__lock:
+            if route is None:
+                return sum(self.__waiting.values())
+            return self.__waiting.get(route, 0)
 
+    def try_acquire(self, route):
+        """
+        Non-blocking acquire.
 
-        :return: return True if all auth moments is OK. else False.
+        :return: True if the request may be sent right now, else False and nothing is consumed.
         :rtype: bool
         """
+        with self.__lock:
+            bucket, interval = self.__refill(route, time.monotonic())
+            if bucket is None:
+                return True
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True
+            return False
 
-        @wraps(wmethod)
-        def wrapper(*args, **kwargs):
-            self = args[0]
-            print(f'|| {datetime.datetime.now()} || Cf tools auth...') if self.__pycftools_debug else None
-            try:
-                if self.__first_load:
-                    if os.path.exists(self.__cftools_token_file):
-                        print(f'|| {datetime.datetime.now()} || Token file found') if self.__pycftools_debug else None
-                        self.__load_auth_bearer_token()
-                    else:
-                        print(
-                            f'|| {datetime.datetime.now()} || File with token not finded, creating new.') if self.__pycftools_debug else None
-                        self.__save_auth_bearer_token(self.__get_auth_bearer_token())
-                        self.__api_cftools_headers['Authorization'] = f'Bearer {self.__api_cftools_bearer_token}'
-                        self.__token_timestamp = datetime.datetime.now().timestamp()
-                    self.__first_load = False
-                else:
-                    print(f'|| {datetime.datetime.now()} || Load token from mem') if self.__pycftools_debug else None
-                    if self.__check_token_timestamp(self.__token_timestamp):
-                        self.__save_auth_bearer_token(self.__get_auth_bearer_token())
-                        self.__api_cftools_headers['Authorization'] = f'Bearer {self.__api_cftools_bearer_token}'
-                        self.__token_timestamp = datetime.datetime.now().timestamp()
-
-                print(f'|| {datetime.datetime.now()} || Token loaded') if self.__pycftools_debug else None
-                return wmethod(*args, **kwargs)
-            except Exception as err:
-                print(err)
+    def reserve(self, route):
+        """
+        Takes the next slot of the route, even if it is in the future.
+        Caller must wait returned seconds and then call release(route) if it was positive,
+        release(route, refund=True) if it gave up waiting.
 
-        return wrapper
+        :return: Seconds to wait before the request may be sent.
+        :rtype: float
+        """
+        with self.__lock:
+            bucket, interval = self.__refill(route, time.monotonic())
+            if bucket is None:
+                return 0.0
+            bucket[0] -= 1
+            if bucket[0] >= 0:
+                return 0.0
+            self.__waiting[route] = self.__waiting.get(route, 0) + 1
+            return -bucket[0] * interval
 
-    def __save_auth_bearer_token(self, token):
+    def release(self, route, refund=False):
         """
-        Method to save token to file.
+        Marks a reserved call as no longer waiting.
 
-        :param token: Auth bearer token.
-        :type token: str
+        :param refund: The call gave up waiting and was not sent, give its slot back to the bucket.
+        :type refund: bool
         """
-        with open(self.__cftools_token_file, 'wb') as conf_file:
-            to_save_data = {
-                'token': token,
-                'timestamp': datetime.datetime.now().timestamp()
-            }
-            pickle.dump(to_save_data, conf_file)
+        with self.__lock:
+            self.__waiting[route] -= 1
+            if refund:
+                bucket, interval = self.__refill(route, time.monotonic())
+                if bucket is not None:
+                    bucket[0] = min(float(self.__quotas[route][0]), bucket[0] + 1)
 
-    def __check_token_timestamp(self, timestamp):
+    def __check_nowait(self, route):
         """
-        :param timestamp: Unix timestamp from file. It shows the creation date of the token.
-        :type timestamp: float
-        :return: return True if token is outdated, else if token is not outdated - return False
-        :rtype: bool
+        :return: True if the call is handled by the non-blocking mode.
         """
-        if (timestamp + self.__timestamp_delta) <= datetime.datetime.now().timestamp():
-            print(f'|| {datetime.datetime.now()} || Auth token is outdated') if self.__pycftools_debug else None
-            return True
-        else:
-            print(f'|| {datetime.datetime.now()} || Auth token is not outdated') if self.__pycftools_debug else None
+        if not _rate_limit_nowait.get():
             return False
+        if not self.try_acquire(route):
+            raise RateLimitExceeded(route, self.wait_time(route))
+        return True
 
-    def __load_auth_bearer_token(self):
+    def acquire(self, route):
         """
-        Method to load dict with token from file.
+        Blocks the current thread until the route has a free slot.
+        In nowait() mode raises RateLimitExceeded instead of waiting.
         """
-        with open(self.__cftools_token_file, 'rb') as conf_file:
+        if self.__check_nowait(route):
+            return
+        wait = self.reserve(route)
+        if wait > 0:
+            refund = True
             try:
-                to_load_data = pickle.load(conf_file)
-                if self.__check_token_timestamp(to_load_data['timestamp']):
-                    self.__save_auth_bearer_token(self.__get_auth_bearer_token())
-                    self.__api_cftools_headers['Authorization'] = f'Bearer {self.__api_cftools_bearer_token}'
-                    self.__token_timestamp = datetime.datetime.now().timestamp()
-                else:
-                    self.__api_cftools_headers['Authorization'] = f'''Bearer {to_load_data['token']}'''
-                    self.__token_timestamp = to_load_data['timestamp']
+                time.sleep(wait)
+                refund = False
+            finally:
+                self.release(route, refund)
+
+    async def acquire_async(self, route):
+        """
+        Asyncio version of acquire(), suspends only the current task.
+        """
+        if self.__check_nowait(route):
+            return
+        wait = self.reserve(route)
+        if wait > 0:
+            # A task cancelled while it waits gives its slot back, so it doesn't delay the calls queued after it.
+            refund = True
+            try:
+                await asyncio.sleep(wait)
+                refund = False
+            finally:
+                self.release(route, refund)
 
-                print(
-                    f'|| {datetime.datetime.now()} || Setting api headers {self.__api_cftools_headers}') if self.__pycftools_debug else None
-            except EOFError:
-                self.__save_auth_bearer_token(self.__get_auth_bearer_token())
-                self.__api_cftools_headers['Authorization'] = f'Bearer {self.__api_cftools_bearer_token}'
-                self.__token_timestamp = datetime.datetime.now().timestamp()
+    @staticmethod
+    @contextmanager
+    def nowait():
+        """
+        Context manager for latency-sensitive callers.
+        Inside of it api calls do not wait for quota, RateLimitExceeded is raised instead.
 
-    def __get_auth_bearer_token(self):
+        Example:
+            with RateLimiter.nowait():
+                cfapi.server_leaderboard('kills', -1, 10)
         """
-        Some routes require authentication in the form of Bearer tokens in the request headers.
+        reset_token = _rate_limit_nowait.set(True)
+        try:
+            yield
+        finally:
+            _rate_limit_nowait.reset(reset_token)
 
-        Note:
-            MAX REQUESTS: 2/MINUTE
 
-        :return: Bearer token.
-        :rtype: str
+class RequestDropped(CfToolsError):
+    def __init__(self, route, reason):
         """
-        payload = {
-            # Your application id.
-            'application_id': self.__application_id,
-            # Your application secret.
-            'secret': self.__application_secret
-        }
-        reg_data = self.__api_cftools_session.post(self.__authentication_url, data=payload)
-        if reg_data.status_code == 200:
-            self.__api_cftools_bearer_token = reg_data.json()['token']
-            print(f'|| {datetime.datetime.now()} || Auth token received. - ~ {self.__api_cftools_bearer_token}') if self.__pycftools_debug else None
-            return self.__api_cftools_bearer_token
-        else:
-            print(f'|| {datetime.datetime.now()} || Auth error reg_data status code : {reg_data.status_code}')
-            assert False
+        Raised by the RequestScheduler for a background read it dropped instead of sending.
 
-    # ---------------- Save/load tokens End ----------------
+        :param route: Route name.
+        :type route: str
+        :param reason: Why the request was dropped.
+        :type reason: str
+        """
+        super().__init__(f'Request for {route} dropped: {reason}')
+        self.route = route
+        self.reason = reason
 
-    # ---------------- Grant process and access permissions ----------------
 
-    # When trying to access restricted routes or data, an API application must be granted access by the resource owner.
-    # This permission can be granted by sending the resource owner the "Grant URL"
-    # You can find on your application dashboard.
+# Set by RequestScheduler.priority(), works per thread and per asyncio task.
+_request_priority = contextvars.ContextVar('pycftools_request_priority', default=None)
 
-    @check_register
-    def grants(self):
-        """
-        Get list of all grants and their respective id's.
 
-        Note:
-            MAX REQUESTS: 1/MINUTE
+class _SlotWaiter(object):
+    __slots__ = ('route', 'queued_at', 'event', 'loop', 'future', 'popped', 'error')
 
-        :return: List of all grants and their respective id's.
-        :rtype: Response
-        """
-        return self.__api_cftools_session.get(self.__grants_url, headers=self.__api_cftools_headers)
+    def __init__(self, route):
+        self.route = route
+        self.queued_at = time.monotonic()
+        self.event = None
+        self.loop = None
+        self.future = None
+        # Taken out of the queue, either granted a slot or dropped (error is set).
+        self.popped = False
+        self.error = None
 
-    @check_register
-    def server_details(self):
-        """
-        Get server details by Server Id. Server id server id is specified in the class constructor.
 
-        :return: Server details by Server Id.
-        :rtype: Response
-        """
-        return self.__api_cftools_session.get(self.__server_details_url,
-                                              headers=self.__api_cftools_headers)
+def _resolve_future(future):
+    if not future.done():
+        future.set_result(None)
 
-    # ---------------- Server ----------------
 
-    # All subsequent routes require a Server API Id and an active application grant.
+class RequestScheduler(object):
+    MODERATION = 0
+    REALTIME = 1
+    BACKGROUND = 2
+    # Route -> priority class, routes missing here are REALTIME.
+    ROUTE_PRIORITIES = {
+        'auth': MODERATION,
+        'server_kick': MODERATION,
+        'server_ban': MODERATION,
+        'server_unban': MODERATION,
+        'server_private_message': MODERATION,
+        'server_public_message': MODERATION,
+        'server_row_rcon_command': MODERATION,
+        'server_teleport': MODERATION,
+        'server_spawn': MODERATION,
+        'server_whitelist_entry': MODERATION,
+        'server_whitelist_delete_entry': MODERATION,
+        'server_queue_priority_entry': MODERATION,
+        'queue_priority_delete_entry': MODERATION,
+        'grants': BACKGROUND,
+        'server_statistics': BACKGROUND,
+        'server_leaderboard': BACKGROUND,
+        'server_player_stats': BACKGROUND,
+        'server_banlist': BACKGROUND,
+        'server_whitelist': BACKGROUND,
+        'server_queue_priority_list': BACKGROUND,
+    }
 
-    @check_register
-    def server_info(self):
+    def __init__(self, max_concurrent=8, route_priorities=None, max_background_queue=64, stale_after=30.0):
         """
-        Get general information about the registered server.
+        Limits the requests in flight and hands free slots out by priority class:
+        moderation (writes) first, then realtime reads, then background reads.
+        Within a class routes take turns, so one busy route can't starve the others.
+        Background reads waiting longer than stale_after, or beyond max_background_queue, are dropped
+        with RequestDropped - by the time they'd be sent their data would be stale anyway.
+        Identical GET requests are coalesced by the client's SingleFlight before they get here.
 
-        :return: Information about the registered server
-        :rtype: Response
+        One scheduler may be shared by several clients, it is thread-safe and works for sync and async clients.
+
+        :param max_concurrent: Requests in flight at once, keep it at or below the connection pool size.
+        :type max_concurrent: int
+        :param route_priorities: Dict route -> class, merged over ROUTE_PRIORITIES.
+        :type route_priorities: dict
+        :param max_background_queue: Background reads allowed to wait, the oldest are dropped beyond it.
+        :type max_background_queue: int
+        :param stale_after: Seconds a background read may wait before it is dropped.
+        :type stale_after: float
         """
-        return self.__api_cftools_session.get(self.__server_info_url,
-                                              headers=self.__api_cftools_headers)
+        self.__max_concurrent = max_concurrent
+        self.__route_priorities = {**self.ROUTE_PRIORITIES, **(route_priorities or {})}
+        self.__max_background_queue = max_background_queue
+        self.__stale_after = stale_after
+        # Per class: route -> deque of waiters, in round-robin order of routes.
+        self.__queues = [collections.OrderedDict() for _ in range(3)]
+        self.__background_queued = 0
+        self.__in_flight = 0
+        self.__lock = threading.Lock()
+        self.dropped = 0
 
-    @check_register
-    def server_statistics(self):
+    def priority_of(self, route):
         """
-        Get server statistics.
+        :return: Priority class of a request for the route made now, see priority().
+        :rtype: int
+        """
+        level = _request_priority.get()
+        return self.__route_priorities.get(route, self.REALTIME) if level is None else level
 
-        :return: Server statistics.
-        :rtype: Response
+    def __enqueue(self, waiter, level):
         """
-        return self.__api_cftools_session.get(self.__server_statistics_url,
-                                              headers=self.__api_cftools_headers)
+        Must be called with the lock held.
 
-    @check_register
-    def server_player_list(self):
+        :return: True if a slot was free and is taken, else the waiter is queued.
         """
-        Get full player list.
+        if self.__in_flight < self.__max_concurrent:
+            self.__in_flight += 1
+            return True
+        self.__queues[level].setdefault(waiter.route, collections.deque()).append(waiter)
+        if level == self.BACKGROUND:
+            self.__background_queued += 1
+            if self.__background_queued > self.__max_background_queue:
+                oldest = min((queue[0] for queue in self.__queues[self.BACKGROUND].values()),
+                             key=lambda queued: queued.queued_at)
+                self.__remove(oldest, self.BACKGROUND)
+                self.__drop(oldest, 'background queue is full')
+        return False
 
-        :return: Full player list.
-        :rtype: Response
+    def __remove(self, waiter, level):
+        queue = self.__queues[level][waiter.route]
+        queue.remove(waiter)
+        if not queue:
+            del self.__queues[level][waiter.route]
+        if level == self.BACKGROUND:
+            self.__background_queued -= 1
+
+    def __wake(self, waiter):
+        waiter.popped = True
+        if waiter.loop is not None:
+            waiter.loop.call_soon_threadsafe(_resolve_future, waiter.future)
+        else:
+            waiter.event.set()
+
+    def __drop(self, waiter, reason):
+        self.dropped += 1
+        waiter.error = RequestDropped(waiter.route, reason)
+        self.__wake(waiter)
+
+    def __next_waiter(self):
         """
-        return self.__api_cftools_session.get(self.__server_player_list_url,
-                                              headers=self.__api_cftools_headers)
+        Must be called with the lock held.
 
-    @check_register
-    def server_kick(self, gs_id, reason):
+        :return: Next waiter to get a slot, or None.
         """
-        Kick a player.
+        now = time.monotonic()
+        for level, routes in enumerate(self.__queues):
+            while routes:
+                route, queue = next(iter(routes.items()))
+                waiter = queue.popleft()
+                if queue:
+                    routes.move_to_end(route)
+                else:
+                    del routes[route]
+                if level == self.BACKGROUND:
+                    self.__background_queued -= 1
+                    if now - waiter.queued_at > self.__stale_after:
+                        self.__drop(waiter, 'stale')
+                        continue
+                return waiter
+        return None
 
-        :param gs_id: An active gamesession_id (See server_player_list() for details)
-        :type gs_id: str
-        :param reason: Reason 1-128 len max.
-        :type reason: str
-        :return: Returns 204 on success.
-        :rtype: Response
+    def __cancel(self, waiter, level):
         """
-        payload = {
-            'gamesession_id': gs_id,
-            'reason': reason
-        }
-        return self.__api_cftools_session.post(self.__server_kick_url, data=payload,
-                                               headers=self.__api_cftools_headers)
+        Called when the waiter gave up (deadline, cancellation).
 
-    @check_register
-    def server_private_message(self, gs_id, content):
+        :return: True if it was granted a slot meanwhile and the slot is still to be used or released.
         """
-        Send a private message to a player.
+        with self.__lock:
+            if not waiter.popped:
+                self.__remove(waiter, level)
+                return False
+        return waiter.error is None
 
-        :param gs_id: An active gamesession_id (See server_player_list() for details)
-        :type gs_id: str
-        :param content: Message content length: 1-256.
-        :type content: str
-        :return: Returns 204 on success.
-        :rtype: Response
+    def acquire(self, route, timeout=None):
         """
-        payload = {
-            'gamesession_id': gs_id,
-            'content': content
-        }
-        return self.__api_cftools_session.post(self.__server_private_message_url,
-                                               data=payload, headers=self.__api_cftools_headers)
+        Blocks the current thread until a slot is free for it.
 
-    @check_register
-    def server_public_message(self, content):
+        :param route: Route name.
+        :type route: str
+        :param timeout: Seconds to wait at most, DeadlineExceeded is raised after it.
+        :type timeout: float
         """
-        Send a public message to the server.
+        level = self.priority_of(route)
+        waiter = _SlotWaiter(route)
+        waiter.event = threading.Event()
+        with self.__lock:
+            if self.__enqueue(waiter, level):
+                return
+        if not waiter.event.wait(timeout) and not self.__cancel(waiter, level) and waiter.error is None:
+            raise DeadlineExceeded(route)
+        # A waiter dropped just as its wait ran out reports the drop.
+        if waiter.error is not None:
+            raise waiter.error
 
-        :param content: Message content length: 1-256.
-        :type content: str
-        :return: Returns 204 on success.
-        :rtype: Response
+    async def acquire_async(self, route, timeout=None):
         """
-        payload = {'content': content}
-        return self.__api_cftools_session.post(self.__server_public_message_url,
-                                               data=payload, headers=self.__api_cftools_headers)
+        Asyncio version of acquire(), suspends only the current task.
+        """
+        level = self.priority_of(route)
+        waiter = _SlotWaiter(route)
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        with self.__lock:
+            if self.__enqueue(waiter, level):
+                return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if not self.__cancel(waiter, level) and waiter.error is None:
+                raise DeadlineExceeded(route)
+        except asyncio.CancelledError:
+            if self.__cancel(waiter, level):
+                self.release()
+            raise
+        if waiter.error is not None:
+            raise waiter.error
 
-    @check_register
-    def server_row_rcon_command(self, command):
+    def release(self):
         """
-        Send a raw RCon command to the server.
+        Frees the slot taken by acquire(), passing it to the next waiter.
+        """
+        with self.__lock:
+            waiter = self.__next_waiter()
+            if waiter is None:
+                self.__in_flight -= 1
+            else:
+                self.__wake(waiter)
 
-        :param command: Command length: 1-256.
-        :type command: str
-        :return: Returns 204 on success.
-        :rtype: Response
+    def stats(self):
         """
-        payload = {'command': command}
-        return self.__api_cftools_session.post(self.__server_row_rcon_command_url,
-                                               data=payload, headers=self.__api_cftools_headers)
+        :return: Dict with in_flight, queued per class and dropped.
+        :rtype: dict
+        """
+        with self.__lock:
+            return {
+                'in_flight': self.__in_flight,
+                'queued': {name: sum(len(queue) for queue in self.__queues[level].values())
+                           for level, name in enumerate(('moderation', 'realtime', 'background'))},
+                'dropped': self.dropped
+            }
 
-    @check_register
-    def server_teleport(self, gs_id, coords):
+    @staticmethod
+    @contextmanager
+    def priority(level):
         """
-        Teleport a player GameLabs required Not all games supported.
+        Overrides the priority class of the api calls made inside of the block.
 
-        :param gs_id: An active gamesession_id (See server_player_list() for details)
-        :type gs_id: str
-        :param coords: Coordinates list{2}: [X, Y]
-        :type coords: list
-        :return: Returns 204 on success.
-        :rtype: Response
+        Example:
+            with RequestScheduler.priority(RequestScheduler.BACKGROUND):
+                cfapi.server_player_list()
+
+        :param level: RequestScheduler.MODERATION, REALTIME or BACKGROUND.
+        :type level: int
         """
-        payload = {
-            'gamesession_id': gs_id,
-            'coords': coords
-        }
-        return self.__api_cftools_session.post(self.__server_teleport_url,
-                                               data=payload, headers=self.__api_cftools_headers)
+        reset_token = _request_priority.set(level)
+        try:
+            yield
+        finally:
+            _request_priority.reset(reset_token)
 
-    @check_register
-    def server_spawn(self, gs_id, obj_name, quantity):
+
+class _FileLock(object):
+    def __init__(self, path, shared=False):
         """
-        Spawn an object for player GameLabs required Not all games supported.
+        Advisory inter-process lock on a separate lock file.
+        Uses flock on posix systems. Where fcntl is not available, it falls back to an in-process lock only.
 
-        :param gs_id: An active gamesession_id (See server_player_list() for details)
-        :type gs_id: str
-        :param obj_name: Object string.
-        :type obj_name: str
-        :param quantity: Quantity 1-9999 High quantities will lag a server.
-        :type quantity: int
-        :return: Returns 204 on success.
-        :rtype: Response
+        :param path: Path of the lock file, it is created if missing.
+        :type path: str
+        :param shared: Take a shared (read) lock instead of an exclusive one.
+        :type shared: bool
         """
-        payload = {
-            'gamesession_id': gs_id,
-            'object': obj_name,
-            'quantity': quantity
-        }
-        return self.__api_cftools_session.post(self.__server_spawn_url, data=payload,
-                                               headers=self.__api_cftools_headers)
+        self.__path = path
+        self.__shared = shared
+        self.__file = None
 
-    @check_register
-    def server_queue_priority_list(self, cftools_id, comment):
+    __fallback_guard = threading.Lock()
+    __fallback_locks = {}
+
+    def acquire(self):
         """
-        Get a list of all queue priority entries Streamed response.
+        Blocks until the lock is taken.
+        """
+        if fcntl is None:
+            with _FileLock.__fallback_guard:
+                lock = _FileLock.__fallback_locks.setdefault(os.path.abspath(self.__path), threading.Lock())
+            lock.acquire()
+            self.__file = lock
+            return
+        self.__file = open(self.__path, 'a+b')
+        fcntl.flock(self.__file.fileno(), fcntl.LOCK_SH if self.__shared else fcntl.LOCK_EX)
 
-        :param cftools_id: CFTools ID
-        :type cftools_id: str
-        :param comment: Comment string.
-        :type comment: str
-        :return: List of all queue priority entries.
-        :rtype: Response
+    def release(self):
         """
-        payload = {
-            'cftools_id': cftools_id,
-            'comment': comment
+        Releases the lock.
+        """
+        if fcntl is None:
+            self.__file.release()
+        else:
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_UN)
+            self.__file.close()
+        self.__file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class TokenStore(object):
+    """
+    Base class of bearer token stores.
+    A store keeps one token with its creation timestamp, and may be shared by many clients and processes.
+
+    To plug in another backend (shared memory, redis, ...) implement load(), save() and refresh_lock().
+    """
+
+    def load(self):
+        """
+        :return: Dict {'token': str, 'timestamp': float} or None if there is no usable token.
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def save(self, token, timestamp):
+        """
+        :param token: Auth bearer token.
+        :type token: str
+        :param timestamp: Unix timestamp of token creation.
+        :type timestamp: float
+        """
+        raise NotImplementedError
+
+    def refresh_lock(self):
+        """
+        Lock electing the single refresher. While one client holds it and registers a new token,
+        the others wait and then load the fresh token from the store instead of registering again.
+
+        :return: Object with acquire() / release(), usable as a context manager.
+        """
+        raise NotImplementedError
+
+
+class FileTokenStore(TokenStore):
+    def __init__(self, filename='token.raw'):
+        """
+        Token store in a pickle file - the format used by pycftools from the start.
+        Safe for many processes: writes go to a temp file which is atomically renamed over the old one,
+        reads and writes are guarded by a lock file, and the refresh election uses another lock file.
+
+        :param filename: Token file name.
+        :type filename: str
+        """
+        self.__filename = filename
+        self.__lock_filename = f'{filename}.lock'
+        self.__refresh_lock_filename = f'{filename}.refresh.lock'
+
+    def load(self):
+        with _FileLock(self.__lock_filename, shared=True):
+            try:
+                with open(self.__filename, 'rb') as conf_file:
+                    to_load_data = pickle.load(conf_file)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                return None
+        if not isinstance(to_load_data, dict) or 'token' not in to_load_data or 'timestamp' not in to_load_data:
+            return None
+        return to_load_data
+
+    def save(self, token, timestamp):
+        to_save_data = {
+            'token': token,
+            'timestamp': timestamp
+        }
+        directory = os.path.dirname(os.path.abspath(self.__filename))
+        with _FileLock(self.__lock_filename):
+            fd, tmp_filename = tempfile.mkstemp(dir=directory, prefix='.pycftools-token-')
+            try:
+                with os.fdopen(fd, 'wb') as conf_file:
+                    pickle.dump(to_save_data, conf_file)
+                    conf_file.flush()
+                    os.fsync(conf_file.fileno())
+                os.replace(tmp_filename, self.__filename)
+            except BaseException:
+                if os.path.exists(tmp_filename):
+                    os.remove(tmp_filename)
+                raise
+
+    def refresh_lock(self):
+        return _FileLock(self.__refresh_lock_filename)
+
+
+class SqliteTokenStore(TokenStore):
+    def __init__(self, filename='token.sqlite3', key='default'):
+        """
+        Token store in a local SQLite database. Several tokens (e.g. for different applications)
+        can live in one database under different keys.
+
+        :param filename: Database file name.
+        :type filename: str
+        :param key: Token key inside of the database.
+        :type key: str
+        """
+        self.__filename = filename
+        self.__key = key
+        self.__refresh_lock_filename = f'{filename}.{key}.refresh.lock'
+        with closing(self.__connect()) as connection, connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS pycftools_token '
+                               '(key TEXT PRIMARY KEY, token TEXT NOT NULL, timestamp REAL NOT NULL)')
+
+    def __connect(self):
+        return sqlite3.connect(self.__filename, timeout=30)
+
+    def load(self):
+        connection = self.__connect()
+        try:
+            row = connection.execute('SELECT token, timestamp FROM pycftools_token WHERE key = ?',
+                                     (self.__key,)).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return {'token': row[0], 'timestamp': row[1]}
+
+    def save(self, token, timestamp):
+        connection = self.__connect()
+        try:
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO pycftools_token (key, token, timestamp) VALUES (?, ?, ?)',
+                                   (self.__key, token, timestamp))
+        finally:
+            connection.close()
+
+    def refresh_lock(self):
+        return _FileLock(self.__refresh_lock_filename)
+
+
+async def _acquire_in_thread(lock):
+    """
+    Acquires a blocking lock in a worker thread without blocking the event loop.
+    If the waiting task is cancelled, the lock is released as soon as the thread gets it, instead of leaking.
+    """
+    acquiring = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        acquiring.add_done_callback(
+            lambda future: lock.release() if not future.cancelled() and future.exception() is None else None)
+        raise
+
+
+class MemoryTokenStore(TokenStore):
+    def __init__(self):
+        """
+        In-process token store. Lets several clients of one process share a token without any file.
+        """
+        self.__data = None
+        self.__refresh_lock = threading.Lock()
+
+    def load(self):
+        return self.__data
+
+    def save(self, token, timestamp):
+        self.__data = {'token': token, 'timestamp': timestamp}
+
+    def refresh_lock(self):
+        return self.__refresh_lock
+
+
+class ResponseCache(object):
+    # Route -> seconds. Steamrelay refreshes server data every 30 to 60 seconds, so does the cache.
+    DEFAULT_TTLS = {
+        'server_details': 30,
+        'server_info': 30,
+        'server_statistics': 30,
+        'server_leaderboard': 60,
+        'server_whitelist': 30,
+        'server_queue_priority_list': 30,
+        'server_banlist': 30,
+    }
+
+    # Write route -> read routes it makes stale.
+    INVALIDATED_BY = {
+        'server_whitelist_entry': ('server_whitelist',),
+        'server_whitelist_delete_entry': ('server_whitelist',),
+        'server_queue_priority_entry': ('server_queue_priority_list',),
+        'queue_priority_delete_entry': ('server_queue_priority_list',),
+        'server_ban': ('server_banlist',),
+        'server_unban': ('server_banlist',),
+    }
+
+    def __init__(self, ttls=None, maxsize=1024):
+        """
+        TTL response cache for read routes with LRU eviction.
+        Only successful (200) responses are kept. Writes made through the client
+        invalidate the reads they affect, see INVALIDATED_BY.
+
+        One cache may be shared by several clients, it is thread-safe. Keys include the full url and params.
+
+        :param ttls: Dict route -> ttl in seconds. Routes missing here are never cached. By default, DEFAULT_TTLS.
+        :type ttls: dict
+        :param maxsize: Maximum number of cached responses.
+        :type maxsize: int
+        """
+        self.__ttls = dict(self.DEFAULT_TTLS if ttls is None else ttls)
+        self.__maxsize = maxsize
+        # key -> (route, expires monotonic time, response)
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cacheable(self, route):
+        """
+        :return: True if responses of the route are cached.
+        :rtype: bool
+        """
+        return route in self.__ttls
+
+    @staticmethod
+    def make_key(url, params=None):
+        """
+        :return: Cache key of a GET request.
+        :rtype: tuple
+        """
+        if not params:
+            return url, ()
+        return url, tuple(sorted((k, str(v)) for k, v in params.items()))
+
+    def get(self, key):
+        """
+        :return: Cached response or None if missing or expired.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self.__entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                del self.__entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, route, key, response):
+        """
+        Keeps the response if the route is cached and the response is successful.
+        """
+        ttl = self.__ttls.get(route)
+        if ttl is None or response.status_code != 200:
+            return
+        with self.__lock:
+            self.__entries[key] = (route, time.monotonic() + ttl, response)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__maxsize:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, route=None):
+        """
+        Drops cached responses.
+
+        :param route: Route to drop, if None - everything is dropped.
+        :type route: str
+        """
+        with self.__lock:
+            if route is None:
+                self.__entries.clear()
+                return
+            for key in [key for key, entry in self.__entries.items() if entry[0] == route]:
+                del self.__entries[key]
+
+    def invalidate_after(self, route):
+        """
+        Drops the reads made stale by a write route.
+        """
+        for stale_route in self.INVALIDATED_BY.get(route, ()):
+            self.invalidate(stale_route)
+
+    def stats(self):
+        """
+        :return: Dict with hits, misses, evictions and current size.
+        :rtype: dict
+        """
+        with self.__lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.__entries)
+            }
+
+
+class _Flight(object):
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    def __init__(self):
+        """
+        Collapses identical concurrent calls into one.
+        While a call with some key is in flight, other callers with the same key
+        do not start their own - they wait for it and get the same result (or exception).
+
+        Works for threads (do) and for coroutines of one event loop (do_async), and is thread-safe.
+        """
+        self.__flights = {}
+        self.__tasks = {}
+        self.__lock = threading.Lock()
+        # Number of calls served by another in-flight call.
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        :param key: Hashable key of the call.
+        :param fn: Function to call if there is no call with the same key in flight.
+        :return: Result of fn.
+        """
+        with self.__lock:
+            flight = self.__flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.__flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn(*args, **kwargs)
+            return flight.result
+        except BaseException as err:
+            flight.error = err
+            raise
+        finally:
+            with self.__lock:
+                del self.__flights[key]
+            flight.event.set()
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """
+        fn runs once as a task of its own, shared by the first caller and the followers.
+        A cancelled caller - the first one included - only stops waiting, the others still get the result.
+
+        :param key: Hashable key of the call.
+        :param fn: Coroutine function to await if there is no call with the same key in flight.
+        :return: Result of fn.
+        """
+        with self.__lock:
+            task = self.__tasks.get(key)
+            if task is None:
+                task = self.__tasks[key] = asyncio.ensure_future(fn(*args, **kwargs))
+                task.add_done_callback(lambda done: self.__land(key, done))
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def __land(self, key, task):
+        with self.__lock:
+            if self.__tasks.get(key) is task:
+                del self.__tasks[key]
+        if not task.cancelled():
+            # Every caller may have been cancelled, mark the exception as retrieved.
+            task.exception()
+
+
+class AuthenticationError(CfToolsError):
+    def __init__(self, status_code):
+        """
+        Raised when /v1/auth/register does not give a token.
+
+        :param status_code: Status code of the auth response.
+        :type status_code: int
+        """
+        super().__init__(f'Auth error reg_data status code : {status_code}')
+        self.status_code = status_code
+
+
+class RetryPolicy(object):
+    # Methods which are safe to send again after a transport error or a 5xx.
+    IDEMPOTENT_METHODS = ('GET', 'DELETE')
+
+    def __init__(self, max_retries=3, backoff=0.5, max_backoff=30.0, statuses=(429, 500, 502, 503, 504),
+                 retry_non_idempotent=False):
+        """
+        Describes when and how a request is retried.
+
+        429 responses are retried for every method - the request was rejected, not executed.
+        Transport errors and other statuses are retried for idempotent methods only,
+        unless retry_non_idempotent is set (a repeated POST may e.g. issue a ban twice).
+
+        Delays use full jitter: random between 0 and min(max_backoff, backoff * 2 ** attempt).
+        A Retry-After header of the response is honored instead.
+
+        :param max_retries: Maximum number of retries of one request.
+        :type max_retries: int
+        :param backoff: Base delay in seconds.
+        :type backoff: float
+        :param max_backoff: Maximum delay in seconds.
+        :type max_backoff: float
+        :param statuses: Response status codes to retry.
+        :type statuses: tuple
+        :param retry_non_idempotent: Retry POST requests after transport errors and 5xx as well.
+        :type retry_non_idempotent: bool
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.retry_non_idempotent = retry_non_idempotent
+
+    def retryable(self, method, status_code=None):
+        """
+        :param method: Http method.
+        :type method: str
+        :param status_code: Response status code, None for a transport error.
+        :type status_code: int
+        :return: True if the outcome may be retried.
+        :rtype: bool
+        """
+        if status_code is not None and status_code not in self.statuses:
+            return False
+        if status_code == 429:
+            return True
+        return self.retry_non_idempotent or method in self.IDEMPOTENT_METHODS
+
+    def delay(self, attempt, retry_after=None):
+        """
+        :param attempt: Number of the failed attempt, starting from 0.
+        :type attempt: int
+        :param retry_after: Value of the Retry-After header.
+        :type retry_after: str
+        :return: Seconds to wait before the next attempt.
+        :rtype: float
+        """
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                try:
+                    retry_at = email.utils.parsedate_to_datetime(retry_after).timestamp()
+                    return min(max(retry_at - time.time(), 0.0), self.max_backoff)
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class _RetryCounter(object):
+    __slots__ = ('retries',)
+
+    def __init__(self):
+        self.retries = 0
+
+
+# Counter of Retrier.counting() in the current context.
+_retry_counter = contextvars.ContextVar('pycftools_retry_counter', default=None)
+
+
+class Retrier(object):
+    def __init__(self, policy=None, route_policies=None, budget_ratio=0.2, budget_burst=10):
+        """
+        Runtime part of retries: picks the policy of a route, keeps the retry budget and statistics.
+        One retrier may be shared by several clients, it is thread-safe.
+
+        The retry budget stops retry storms: every request adds budget_ratio to the budget, every retry takes 1.
+        So retries can not exceed budget_ratio of the traffic, with bursts of up to budget_burst retries.
+        Registration of a token (route 'auth') is retried after transport errors too, it is safe to repeat.
+
+        :param policy: Default RetryPolicy. By default, RetryPolicy().
+        :type policy: RetryPolicy
+        :param route_policies: Dict route -> RetryPolicy (or None to disable retries of the route).
+        :type route_policies: dict
+        :param budget_ratio: Retries allowed per request.
+        :type budget_ratio: float
+        :param budget_burst: Maximum (and initial) size of the budget.
+        :type budget_burst: int
+        """
+        self.__policy = RetryPolicy() if policy is None else policy
+        self.__route_policies = {'auth': RetryPolicy(retry_non_idempotent=True), **(route_policies or {})}
+        self.__budget_ratio = budget_ratio
+        self.__budget_burst = budget_burst
+        self.__budget = float(budget_burst)
+        self.__lock = threading.Lock()
+        # route -> dict of counters
+        self.__stats = {}
+
+    def __route_stats(self, route):
+        stats = self.__stats.get(route)
+        if stats is None:
+            stats = self.__stats[route] = {'requests': 0, 'retries': 0, 'recovered': 0, 'gave_up': 0,
+                                           'budget_denied': 0}
+        return stats
+
+    def retry_delay(self, route, method, attempt, status_code=None, retry_after=None):
+        """
+        Decides whether the outcome of an attempt is retried.
+
+        :param route: Route name.
+        :type route: str
+        :param method: Http method.
+        :type method: str
+        :param attempt: Number of the attempt, starting from 0.
+        :type attempt: int
+        :param status_code: Response status code, None for a transport error.
+        :type status_code: int
+        :param retry_after: Value of the Retry-After header.
+        :type retry_after: str
+        :return: Seconds to wait before the retry, or None if the outcome is final.
+        :rtype: float
+        """
+        policy = self.__route_policies.get(route, self.__policy)
+        with self.__lock:
+            stats = self.__route_stats(route)
+            if attempt == 0:
+                stats['requests'] += 1
+                self.__budget = min(self.__budget + self.__budget_ratio, self.__budget_burst)
+            failed = status_code is None or status_code in (policy.statuses if policy else ())
+            if not failed:
+                if attempt > 0:
+                    stats['recovered'] += 1
+                return None
+            if policy is None or not policy.retryable(method, status_code):
+                return None
+            if attempt >= policy.max_retries:
+                stats['gave_up'] += 1
+                return None
+            if self.__budget < 1:
+                stats['budget_denied'] += 1
+                return None
+            self.__budget -= 1
+            stats['retries'] += 1
+        counter = _retry_counter.get()
+        if counter is not None:
+            counter.retries += 1
+        return policy.delay(attempt, retry_after)
+
+    @staticmethod
+    @contextmanager
+    def counting():
+        """
+        Counts the retries granted to the requests made within the block, in this thread or task.
+
+        Example:
+            with pycftools.Retrier.counting() as counter:
+                cfapi.server_ban(...)
+            counter.retries
+
+        :return: Counter with the retries attribute.
+        """
+        counter = _RetryCounter()
+        token = _retry_counter.set(counter)
+        try:
+            yield counter
+        finally:
+            _retry_counter.reset(token)
+
+    def stats(self):
+        """
+        :return: Dict route -> {'requests', 'retries', 'recovered', 'gave_up', 'budget_denied'}.
+        :rtype: dict
+        """
+        with self.__lock:
+            return {route: dict(stats) for route, stats in self.__stats.items()}
+
+    @property
+    def budget(self):
+        """
+        :return: Retries currently left in the budget.
+        :rtype: float
+        """
+        return self.__budget
+
+
+class DeadlineExceeded(CfToolsError):
+    def __init__(self, route):
+        """
+        Raised when the deadline budget set by deadline() runs out before a request could be done.
+
+        :param route: Route name.
+        :type route: str
+        """
+        super().__init__(f'Deadline exceeded for {route}')
+        self.route = route
+
+
+class CircuitOpenError(CfToolsError):
+    def __init__(self, route, retry_after):
+        """
+        Raised without sending a request while the circuit breaker of the route is open.
+
+        :param route: Route name.
+        :type route: str
+        :param retry_after: Seconds until a probe request is allowed.
+        :type retry_after: float
+        """
+        super().__init__(f'Circuit for {route} is open, retry after {retry_after:.2f}s')
+        self.route = route
+        self.retry_after = retry_after
+
+
+# Absolute time.monotonic() deadline set by deadline(), works per thread and per asyncio task.
+_deadline = contextvars.ContextVar('pycftools_deadline', default=None)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Deadline budget for the api calls made inside of the block, including rate limit waits and retries.
+    Every request gets its timeouts cut to the time left, and DeadlineExceeded is raised when it runs out.
+    Nested deadlines can only shorten the budget.
+
+    Example:
+        with pycftools.deadline(2.0):
+            cfapi.server_kick(gs_id, 'reason')
+
+    :param seconds: Budget in seconds.
+    :type seconds: float
+    """
+    deadline_at = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline_at = min(deadline_at, outer)
+    reset_token = _deadline.set(deadline_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(reset_token)
+
+
+def _cap_timeout(timeout, remaining):
+    """
+    :param timeout: None, seconds or (connect, read) tuple.
+    :param remaining: Seconds left until the deadline.
+    :return: Timeout of the same shape, no part longer than remaining.
+    """
+    if timeout is None:
+        return remaining
+    if isinstance(timeout, tuple):
+        return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+    return min(timeout, remaining)
+
+
+def _httpx_timeout(timeout):
+    """
+    :param timeout: None, seconds or (connect, read) tuple, as accepted by requests.
+    :return: Equivalent httpx.Timeout.
+    :rtype: httpx.Timeout
+    """
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+class CircuitBreaker(object):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0):
+        """
+        Circuit breaker per route. After failure_threshold failures in a row (transport errors and 5xx)
+        the route is open: calls fail fast with CircuitOpenError instead of waiting on a degraded endpoint.
+        After recovery_timeout seconds one probe request is let through (half open),
+        its success closes the circuit, its failure opens it again.
+
+        :param failure_threshold: Failures in a row which open the circuit.
+        :type failure_threshold: int
+        :param recovery_timeout: Seconds the circuit stays open before a probe.
+        :type recovery_timeout: float
+        """
+        self.__failure_threshold = failure_threshold
+        self.__recovery_timeout = recovery_timeout
+        # route -> [state, failures in a row, monotonic time the circuit opened or the probe started]
+        self.__routes = {}
+        self.__lock = threading.Lock()
+
+    def allow(self, route):
+        """
+        Must be called before a request. Raises CircuitOpenError if the request must not be sent.
+        """
+        with self.__lock:
+            circuit = self.__routes.get(route)
+            if circuit is None or circuit[0] == self.CLOSED:
+                return
+            now = time.monotonic()
+            retry_after = circuit[2] + self.__recovery_timeout - now
+            if retry_after <= 0:
+                # This caller is the probe, the others keep failing fast until it is done,
+                # or until another recovery_timeout passes if it never reports back.
+                circuit[0] = self.HALF_OPEN
+                circuit[2] = now
+                return
+            raise CircuitOpenError(route, max(retry_after, 0.0))
+
+    def record(self, route, success):
+        """
+        Must be called with the outcome of every allowed request.
+
+        :param route: Route name.
+        :type route: str
+        :param success: False for transport errors and 5xx responses.
+        :type success: bool
+        """
+        with self.__lock:
+            circuit = self.__routes.get(route)
+            if success:
+                if circuit is not None:
+                    circuit[0] = self.CLOSED
+                    circuit[1] = 0
+                return
+            if circuit is None:
+                circuit = self.__routes[route] = [self.CLOSED, 0, 0.0]
+            circuit[1] += 1
+            if circuit[0] == self.HALF_OPEN or circuit[1] >= self.__failure_threshold:
+                circuit[0] = self.OPEN
+                circuit[2] = time.monotonic()
+
+    def state(self, route):
+        """
+        :return: 'closed', 'open' or 'half_open'.
+        :rtype: str
+        """
+        with self.__lock:
+            circuit = self.__routes.get(route)
+            return self.CLOSED if circuit is None else circuit[0]
+
+    def states(self):
+        """
+        :return: Dict route -> state for every route which ever failed.
+        :rtype: dict
+        """
+        with self.__lock:
+            return {route: circuit[0] for route, circuit in self.__routes.items()}
+
+
+# Innermost span opened by Metrics.span() or a request, works per thread and per asyncio task.
+_current_span = contextvars.ContextVar('pycftools_current_span', default=None)
+
+
+class Span(object):
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_span_id', 'start_time_unix_nano', 'end_time_unix_nano',
+                 'attributes', 'error')
+
+    def __init__(self, name, parent=None, attributes=None):
+        """
+        OpenTelemetry-style span of an api request or of a Metrics.span() block.
+
+        :param name: Span name.
+        :type name: str
+        :param parent: Parent span, its trace id is inherited.
+        :type parent: Span
+        :param attributes: Dict of attributes.
+        :type attributes: dict
+        """
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def end(self, error=None):
+        self.end_time_unix_nano = time.time_ns()
+        self.error = error
+
+    @staticmethod
+    def __otlp_value(value):
+        if isinstance(value, bool):
+            return {'boolValue': value}
+        if isinstance(value, int):
+            return {'intValue': str(value)}
+        if isinstance(value, float):
+            return {'doubleValue': value}
+        return {'stringValue': str(value)}
+
+    def to_otlp(self):
+        """
+        :return: The span in OTLP/JSON form, ready to be put into a resourceSpans / scopeSpans export.
+        :rtype: dict
+        """
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 3,  # SPAN_KIND_CLIENT
+            'startTimeUnixNano': str(self.start_time_unix_nano),
+            'endTimeUnixNano': str(self.end_time_unix_nano),
+            'attributes': [{'key': key, 'value': self.__otlp_value(value)} for key, value in self.attributes.items()],
+            'status': {'code': 2, 'message': str(self.error)} if self.error is not None else {'code': 1}
         }
-        return self.__api_cftools_session.get(self.__server_queue_priority_url,
-                                              params=payload,
-                                              headers=self.__api_cftools_headers)
+        if self.parent_span_id is not None:
+            span['parentSpanId'] = self.parent_span_id
+        return span
+
+    def __repr__(self):
+        return f'Span(name={self.name!r}, trace_id={self.trace_id!r}, span_id={self.span_id!r})'
+
+
+class Metrics(object):
+    # Upper bounds of the latency histogram buckets in seconds.
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, span_exporter=None):
+        """
+        In-process instrumentation of api clients: latency histograms and counters per route,
+        rate limit wait time, request / response hooks and spans.
+        Clients without metrics (the default) skip all of it, the cost is a single attribute check per request.
+
+        Request latency covers the whole call of the route - rate limit waits and retries included.
+        Auth refreshes are the requests of the 'auth' route.
+
+        One Metrics may be shared by several clients, it is thread-safe.
+
+        :param buckets: Upper bounds of the latency histogram buckets in seconds, sorted.
+        :type buckets: tuple
+        :param span_exporter: Callable span_exporter(span) getting every finished Span, e.g. sending span.to_otlp()
+            to a collector. Spans are only built when it is set.
+        :type span_exporter: callable
+        """
+        self.__buckets = tuple(buckets)
+        self.__span_exporter = span_exporter
+        self.__request_hooks = []
+        self.__response_hooks = []
+        # route -> [bucket counts..., +Inf count, sum]
+        self.__histograms = {}
+        # (metric name, labels tuple) -> value
+        self.__counters = collections.defaultdict(float)
+        self.__lock = threading.Lock()
+
+    def add_request_hook(self, hook):
+        """
+        :param hook: Callable hook(route, method, url, kwargs) called before a request is sent.
+        :type hook: callable
+        """
+        self.__request_hooks.append(hook)
+
+    def add_response_hook(self, hook):
+        """
+        :param hook: Callable hook(route, method, response, error, duration) called after a request,
+            response is None if it raised error.
+        :type hook: callable
+        """
+        self.__response_hooks.append(hook)
+
+    def start_request(self, route, method, url, kwargs):
+        """
+        Called by the client before a request.
+
+        :return: Opaque token for end_request().
+        """
+        for hook in self.__request_hooks:
+            hook(route, method, url, kwargs)
+        span = None
+        if self.__span_exporter is not None:
+            span = Span(f'{method} {route}', _current_span.get(),
+                        {'http.request.method': method, 'url.full': url, 'pycftools.route': route})
+        return route, method, span, time.perf_counter()
+
+    def end_request(self, token, response=None, error=None):
+        """
+        Called by the client after a request, with the final response or the error it raised.
+        """
+        route, method, span, started = token
+        duration = time.perf_counter() - started
+        status = str(response.status_code) if response is not None else type(error).__name__
+        with self.__lock:
+            histogram = self.__histograms.get(route)
+            if histogram is None:
+                histogram = self.__histograms[route] = [0] * (len(self.__buckets) + 1) + [0.0]
+            histogram[bisect.bisect_left(self.__buckets, duration)] += 1
+            histogram[-1] += duration
+            self.__counters['pycftools_requests_total', (('route', route), ('status', status))] += 1
+        if span is not None:
+            if response is not None:
+                span.attributes['http.response.status_code'] = response.status_code
+            span.end(error if error is not None else
+                     (f'HTTP {response.status_code}' if response.status_code >= 500 else None))
+            self.__span_exporter(span)
+        for hook in self.__response_hooks:
+            hook(route, method, response, error, duration)
+
+    def inc(self, name, route, value=1):
+        """
+        Adds to a counter of a route, e.g. inc('pycftools_retries_total', 'server_info').
+        """
+        with self.__lock:
+            self.__counters[name, (('route', route),)] += value
+
+    def observe_rate_limit_wait(self, route, seconds):
+        """
+        Called by the client with the time a request waited for its rate limit slot.
+        """
+        if seconds > 0:
+            self.inc('pycftools_rate_limit_wait_seconds_total', route, seconds)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Opens a parent span, the requests made inside of the block become its children.
+        Does nothing without a span_exporter.
+
+        Example:
+            with metrics.span('ban wave', admin='alice'):
+                cfapi.server_ban(...)
+        """
+        if self.__span_exporter is None:
+            yield None
+            return
+        span = Span(name, _current_span.get(), attributes)
+        reset_token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as err:
+            span.end(err)
+            raise
+        else:
+            span.end()
+        finally:
+            _current_span.reset(reset_token)
+            self.__span_exporter(span)
+
+    def snapshot(self):
+        """
+        :return: Dict with 'latency' - route -> {'buckets': {le: cumulative count}, 'sum': ..., 'count': ...}
+            and 'counters' - metric name -> {labels tuple: value}.
+        :rtype: dict
+        """
+        with self.__lock:
+            latency = {}
+            for route, histogram in self.__histograms.items():
+                cumulative, buckets = 0, {}
+                for bound, count in zip(self.__buckets + (float('inf'),), histogram):
+                    cumulative += count
+                    buckets[bound] = cumulative
+                latency[route] = {'buckets': buckets, 'sum': histogram[-1], 'count': cumulative}
+            counters = {}
+            for (name, labels), value in self.__counters.items():
+                counters.setdefault(name, {})[labels] = value
+        return {'latency': latency, 'counters': counters}
+
+    @staticmethod
+    def __labels(labels):
+        return ','.join(f'{key}="{value}"' for key, value in labels)
+
+    def prometheus(self):
+        """
+        :return: All metrics in the Prometheus text exposition format.
+        :rtype: str
+        """
+        snapshot = self.snapshot()
+        lines = ['# HELP pycftools_request_duration_seconds Latency of api calls, rate limit waits and retries included.',
+                 '# TYPE pycftools_request_duration_seconds histogram']
+        for route, histogram in sorted(snapshot['latency'].items()):
+            for bound, count in histogram['buckets'].items():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'pycftools_request_duration_seconds_bucket{{route="{route}",le="{le}"}} {count}')
+            lines.append(f'pycftools_request_duration_seconds_sum{{route="{route}"}} {histogram["sum"]!r}')
+            lines.append(f'pycftools_request_duration_seconds_count{{route="{route}"}} {histogram["count"]}')
+        for name, values in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE {name} counter')
+            for labels, value in sorted(values.items()):
+                lines.append(f'{name}{{{self.__labels(labels)}}} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+
+class CassetteMissError(CfToolsError):
+    def __init__(self, method, url):
+        """
+        Raised by a replaying session for a request that is not in the cassette.
+
+        :param method: Request method.
+        :type method: str
+        :param url: Request url.
+        :type url: str
+        """
+        super().__init__(f'No recorded response for {method} {url}')
+        self.method = method
+        self.url = url
+
+
+class Cassette(object):
+    SCRUBBED = 'scrubbed'
+    # Response headers not worth keeping.
+    DROPPED_HEADERS = ('set-cookie', 'date', 'connection', 'keep-alive', 'transfer-encoding', 'content-encoding')
+
+    def __init__(self, filename):
+        """
+        Recorded request / response pairs of the CFTools Data API, for offline runs and load tests.
+        Stored as gzipped JSON lines: method, url, body, status, headers, content,
+        start offset and duration of every interaction. Bearer tokens, the application secret
+        and issued tokens are scrubbed before anything is written.
+
+        Example:
+            cassette = pycftools.Cassette('traffic.jsonl.gz')
+            cfapi = pycftools.CfToolsApi(..., transport=cassette.recorder())
+            ...
+            cfapi.close()                                       # saves the cassette
+
+            cfapi = pycftools.CfToolsApi(..., transport=cassette.replayer(speed=60))
+            cassette.play(cassette.replayer(), speed=480, concurrency=16)
+
+        :param filename: Cassette file name.
+        :type filename: str
+        """
+        self.filename = filename
+        self.interactions = []
+        self.__lock = threading.Lock()
+        self.__started = None
+        if os.path.exists(filename):
+            self.load()
+
+    def load(self):
+        with gzip.open(self.filename, 'rt', encoding='utf-8') as cassette:
+            self.interactions = [json.loads(line) for line in cassette if line.strip()]
+
+    def save(self):
+        """
+        Writes all interactions, atomically replacing the file.
+        """
+        with self.__lock:
+            interactions = sorted(self.interactions, key=lambda interaction: interaction['t'])
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.cassette-')
+        try:
+            with os.fdopen(descriptor, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as cassette:
+                for interaction in interactions:
+                    cassette.write(json.dumps(interaction, separators=(',', ':')).encode() + b'\n')
+            os.replace(temporary, self.filename)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    @staticmethod
+    def scrub_body(body):
+        """
+        :return: Form encoded request body with the application secret replaced.
+        :rtype: str
+        """
+        if not body:
+            return body or None
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', 'replace')
+        fields = urllib.parse.parse_qsl(body, keep_blank_values=True)
+        if not any(key == 'secret' for key, _ in fields):
+            return body
+        return urllib.parse.urlencode([(key, Cassette.SCRUBBED if key == 'secret' else value)
+                                       for key, value in fields])
+
+    @staticmethod
+    def request_key(method, url, body):
+        """
+        :return: Key matching a request to its recordings, independent of query parameter order.
+        :rtype: tuple
+        """
+        split = urllib.parse.urlsplit(url)
+        query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(split.query, keep_blank_values=True)))
+        return method, split.path, query, Cassette.scrub_body(body)
+
+    def record(self, request, response, started, duration):
+        """
+        Adds an interaction, called by the recording adapter.
+
+        :param request: Sent requests.PreparedRequest.
+        :param response: Received response, its content is read.
+        :param started: time.monotonic() when the request was sent.
+        :param duration: Seconds until the content was read.
+        """
+        content = response.content
+        if content and urllib.parse.urlsplit(request.url).path.endswith('/auth/register'):
+            try:
+                content = json.dumps({**json.loads(content), 'token': self.SCRUBBED}).encode()
+            except ValueError:
+                pass
+        try:
+            stored, encoded = content.decode('utf-8'), False
+        except UnicodeDecodeError:
+            stored, encoded = base64.b64encode(content).decode(), True
+        with self.__lock:
+            if self.__started is None:
+                self.__started = started
+            self.interactions.append({
+                't': round(started - self.__started, 6),
+                'd': round(duration, 6),
+                'method': request.method,
+                'url': request.url,
+                'body': self.scrub_body(request.body),
+                'status': response.status_code,
+                'headers': {name: value for name, value in response.headers.items()
+                            if name.lower() not in self.DROPPED_HEADERS},
+                'content': stored,
+                'b64': encoded
+            })
+
+    def recorder(self):
+        """
+        :return: Transport adapter recording the traffic into the cassette, closing it saves the cassette.
+        :rtype: requests.adapters.HTTPAdapter
+        """
+        return _RecordingAdapter(self)
+
+    def replayer(self, speed=None):
+        """
+        :param speed: Emulate the recorded response times divided by speed (1 - original timing),
+            None answers right away.
+        :type speed: float
+        :return: Transport adapter answering from the cassette, nothing goes to the network.
+        :rtype: requests.adapters.BaseAdapter
+        """
+        return _ReplayAdapter(self, speed)
+
+    def play(self, transport=None, speed=1.0, concurrency=8, base_url=None):
+        """
+        Sends the recorded requests again on their recorded schedule, sped up by speed -
+        e.g. speed=480 runs a day of traffic in 3 minutes. Requests are issued by concurrency workers,
+        a request is late if all of them are busy. Recorded tokens are scrubbed, so the target
+        is a replayer or a server which doesn't check them (tests/stub_server.py with token='scrubbed').
+
+        :param transport: Transport adapter to send with, by default the network.
+        :type transport: requests.adapters.BaseAdapter
+        :param speed: Time compression of the schedule.
+        :type speed: float
+        :param concurrency: Number of workers.
+        :type concurrency: int
+        :param base_url: Replace scheme and host of the recorded urls, e.g. 'http://127.0.0.1:8080'.
+        :type base_url: str
+        :return: List of (interaction, response or exception, latency in seconds, lateness in seconds).
+        :rtype: list
+        """
+        session = requests.Session()
+        if transport is not None:
+            session.mount('https://', transport)
+            session.mount('http://', transport)
+        started = time.monotonic()
+
+        def send(interaction):
+            lateness = time.monotonic() - started - interaction['t'] / speed
+            url = interaction['url']
+            if base_url is not None:
+                split = urllib.parse.urlsplit(url)
+                url = base_url.rstrip('/') + urllib.parse.urlunsplit(('', '', split.path, split.query, ''))
+            sent = time.monotonic()
+            try:
+                outcome = session.request(interaction['method'], url, data=interaction['body'],
+                                          headers={'Authorization': f'Bearer {self.SCRUBBED}'})
+            except Exception as err:
+                outcome = err
+            return interaction, outcome, time.monotonic() - sent, max(lateness, 0.0)
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='pycftools-play') as executor:
+            for interaction in sorted(self.interactions, key=lambda recorded: recorded['t']):
+                delay = started + interaction['t'] / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(send, interaction))
+        session.close()
+        return [future.result() for future in futures]
+
+
+class _RecordingAdapter(requests.adapters.HTTPAdapter):
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.__cassette = cassette
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        response = super().send(request, **kwargs)
+        # Streamed responses are read here, they can't be recorded otherwise.
+        response.content
+        self.__cassette.record(request, response, started, time.monotonic() - started)
+        return response
+
+    def close(self):
+        super().close()
+        self.__cassette.save()
+
+
+class _ReplayAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, cassette, speed=None):
+        """
+        Answers requests with the recorded responses of the same method, url and body, in recorded order.
+        When the recordings of a request run out, the last one is repeated.
+        """
+        super().__init__()
+        self.__speed = speed
+        self.__lock = threading.Lock()
+        self.__recordings = {}
+        for interaction in sorted(cassette.interactions, key=lambda recorded: recorded['t']):
+            key = Cassette.request_key(interaction['method'], interaction['url'], interaction['body'])
+            self.__recordings.setdefault(key, collections.deque()).append(interaction)
+
+    def send(self, request, **kwargs):
+        with self.__lock:
+            recordings = self.__recordings.get(Cassette.request_key(request.method, request.url, request.body))
+            if not recordings:
+                raise CassetteMissError(request.method, request.url)
+            interaction = recordings.popleft() if len(recordings) > 1 else recordings[0]
+        if self.__speed:
+            time.sleep(interaction['d'] / self.__speed)
+        response = requests.Response()
+        response.status_code = interaction['status']
+        response.reason = http.client.responses.get(interaction['status'], '')
+        response.headers = requests.structures.CaseInsensitiveDict(interaction['headers'])
+        content = interaction['content']
+        response._content = base64.b64decode(content) if interaction['b64'] else content.encode('utf-8')
+        response._content_consumed = True
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class _TrackedPoolMixin(object):
+    # Set by _TrackedPoolManager on every pool it creates.
+    _pycftools_transport = None
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        if self._pycftools_transport is not None:
+            self._pycftools_transport._checkout(self, conn)
+        return conn
+
+    def _put_conn(self, conn):
+        if self._pycftools_transport is not None and conn is not None:
+            self._pycftools_transport._checkin(self, conn)
+        super()._put_conn(conn)
+
+
+class _TrackedHTTPConnectionPool(_TrackedPoolMixin, urllib3.HTTPConnectionPool):
+    pass
+
+
+class _TrackedHTTPSConnectionPool(_TrackedPoolMixin, urllib3.HTTPSConnectionPool):
+    pass
+
+
+class _TrackedPoolManager(urllib3.PoolManager):
+    def __init__(self, transport, **kwargs):
+        super().__init__(**kwargs)
+        self.pool_classes_by_scheme = {'http': _TrackedHTTPConnectionPool, 'https': _TrackedHTTPSConnectionPool}
+        self.__transport = transport
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        pool._pycftools_transport = self.__transport
+        return pool
+
+
+class PooledTransport(requests.adapters.HTTPAdapter):
+    def __init__(self, pool_connections=4, pool_maxsize=32, pool_block=False, keep_alive=True, idle_timeout=55.0,
+                 tcp_keepalive=True, max_retries=0):
+        """
+        Transport adapter with a tunable connection pool and connection reuse statistics.
+        Default transport of CfToolsApi and CfToolsCluster sessions.
+
+        A pooled connection idle for longer than idle_timeout is closed before reuse instead of
+        failing on a socket the server or a load balancer has already dropped.
+        Set pool_maxsize to the number of threads calling the api, a smaller pool opens extra connections
+        and discards them afterwards ("connection pool is full"), counted as discarded in stats().
+
+        Example:
+            cfapi = pycftools.CfToolsApi(..., transport=pycftools.PooledTransport(pool_maxsize=64, pool_block=True))
+            cfapi.warm_up(connections=8)
+            cfapi.connection_stats()
+
+        :param pool_connections: Number of hosts to keep pools for.
+        :type pool_connections: int
+        :param pool_maxsize: Connections kept per host.
+        :type pool_maxsize: int
+        :param pool_block: Wait for a free connection instead of opening more than pool_maxsize per host.
+        :type pool_block: bool
+        :param keep_alive: Reuse connections. False sends Connection: close with every request.
+        :type keep_alive: bool
+        :param idle_timeout: Seconds a pooled connection may stay idle before it is evicted, None keeps it forever.
+        :type idle_timeout: float
+        :param tcp_keepalive: Enable TCP keepalive probes on the sockets, so dead connections are noticed.
+        :type tcp_keepalive: bool
+        :param max_retries: Transport level retries of urllib3, the client has its own Retrier.
+        :type max_retries: int
+        """
+        self.__keep_alive = keep_alive
+        self.__idle_timeout = idle_timeout
+        self.__tcp_keepalive = tcp_keepalive
+        self.__counts_lock = threading.Lock()
+        self.__counts = collections.Counter()
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block,
+                         max_retries=max_retries)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        if self.__tcp_keepalive:
+            pool_kwargs.setdefault('socket_options', urllib3.connection.HTTPConnection.default_socket_options +
+                                   [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)])
+        self.poolmanager = _TrackedPoolManager(self, num_pools=connections, maxsize=maxsize, block=block,
+                                               **pool_kwargs)
+
+    def __count(self, name, value=1):
+        with self.__counts_lock:
+            self.__counts[name] += value
+
+    def _checkout(self, pool, conn):
+        """
+        Called by the pool when a connection is taken for a request. Evicts it if it was idle too long,
+        counts it as new if it has to connect.
+        """
+        released = getattr(conn, '_pycftools_released', None)
+        if conn.sock is not None and released is not None and self.__idle_timeout is not None \
+                and time.monotonic() - released > self.__idle_timeout:
+            conn.close()
+            self.__count('evicted_idle')
+        if conn.sock is None:
+            self.__count('connections')
+            if isinstance(pool, urllib3.HTTPSConnectionPool):
+                self.__count('tls_handshakes')
+
+    def _checkin(self, pool, conn):
+        """
+        Called by the pool when a connection is given back.
+        """
+        conn._pycftools_released = time.monotonic()
+        if pool.pool is not None and pool.pool.full():
+            self.__count('discarded')
+
+    def send(self, request, **kwargs):
+        if not self.__keep_alive:
+            request.headers['Connection'] = 'close'
+        self.__count('requests')
+        return super().send(request, **kwargs)
+
+    def warm_up(self, url, connections=2):
+        """
+        Opens connections (TCP and TLS handshakes) to the host of url ahead of the first requests.
+
+        :param url: Url of the host, e.g. the api url.
+        :type url: str
+        :param connections: Number of connections, at most pool_maxsize.
+        :type connections: int
+        :return: Number of connections opened.
+        :rtype: int
+        """
+        if hasattr(self, 'get_connection_with_tls_context'):
+            pool = self.get_connection_with_tls_context(requests.Request('GET', url).prepare(), verify=True)
+        else:
+            pool = self.get_connection(url)
+            self.cert_verify(pool, url, True, None)
+        conns = []
+        try:
+            for _ in range(min(connections, self._pool_maxsize)):
+                conns.append(pool._get_conn(timeout=0))
+        except urllib3.exceptions.EmptyPoolError:
+            pass
+
+        def connect(conn):
+            if conn.sock is not None:
+                return False
+            try:
+                conn.connect()
+                return True
+            except (OSError, urllib3.exceptions.HTTPError):
+                conn.close()
+                return False
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(len(conns), 1), thread_name_prefix='pycftools-warm-up') as executor:
+                return sum(executor.map(connect, conns))
+        finally:
+            for conn in conns:
+                pool._put_conn(conn)
+
+    def stats(self):
+        """
+        :return: Connection reuse statistics: requests, connections (opened), tls_handshakes, reused,
+            reuse_ratio, evicted_idle, discarded (pool was full).
+        :rtype: dict
+        """
+        with self.__counts_lock:
+            counts = dict(self.__counts)
+        stats = {name: counts.get(name, 0)
+                 for name in ('requests', 'connections', 'tls_handshakes', 'evicted_idle', 'discarded')}
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        stats['reuse_ratio'] = stats['reused'] / stats['requests'] if stats['requests'] else 0.0
+        return stats
+
+
+# Yielded by _JsonStreamParser when it needs the next chunk of the document.
+_NEED_DATA = object()
+
+
+class _JsonStreamParser(object):
+    def __init__(self):
+        """
+        Incremental parser for streamed listings like {"entries": [...], "status": true}.
+        Entries of the array are decoded and yielded one by one, so memory use does not depend on the listing size.
+
+        parse() is a generator which yields _NEED_DATA when it wants more input; the driver sends it the next
+        bytes chunk, or None at the end of the stream. See _iter_json_entries and _aiter_json_entries.
+        """
+        self.__text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.__json_decoder = json.JSONDecoder()
+        self.__buffer = ''
+        self.__pos = 0
+        self.__eof = False
+
+    def __fill(self):
+        chunk = yield _NEED_DATA
+        if chunk is None:
+            text = self.__text_decoder.decode(b'', final=True)
+            self.__eof = True
+        else:
+            text = self.__text_decoder.decode(chunk)
+        # Consumed part of the buffer is dropped here.
+        self.__buffer = self.__buffer[self.__pos:] + text
+        self.__pos = 0
+
+    def __peek(self):
+        while True:
+            while self.__pos < len(self.__buffer) and self.__buffer[self.__pos] in ' \t\r\n':
+                self.__pos += 1
+            if self.__pos < len(self.__buffer):
+                return self.__buffer[self.__pos]
+            if self.__eof:
+                return ''
+            yield from self.__fill()
+
+    def __expect(self, chars):
+        char = yield from self.__peek()
+        if not char or char not in chars:
+            raise ValueError(f'Unexpected {char!r} in JSON stream, expected one of {chars!r}')
+        self.__pos += 1
+        return char
+
+    def __value(self):
+        yield from self.__peek()
+        while True:
+            try:
+                value, end = self.__json_decoder.raw_decode(self.__buffer, self.__pos)
+                # A value touching the end of the buffer may be cut (e.g. a number), unless the stream is over.
+                if end < len(self.__buffer) or self.__eof:
+                    self.__pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.__eof:
+                    raise
+            yield from self.__fill()
+
+    def __array(self):
+        yield from self.__expect('[')
+        if (yield from self.__peek()) == ']':
+            self.__pos += 1
+            return
+        while True:
+            yield (yield from self.__value())
+            if (yield from self.__expect(',]')) == ']':
+                return
+
+    def parse(self, key='entries', meta=None):
+        """
+        :param key: Top level key of the array to stream. A top level array is streamed as is.
+        :type key: str
+        :param meta: Dict to collect the other top level fields to (e.g. a pagination cursor).
+        :type meta: dict
+        """
+        if (yield from self.__peek()) == '[':
+            yield from self.__array()
+            return
+        yield from self.__expect('{')
+        if (yield from self.__peek()) == '}':
+            return
+        while True:
+            name = yield from self.__value()
+            yield from self.__expect(':')
+            if name == key and (yield from self.__peek()) == '[':
+                yield from self.__array()
+            else:
+                value = yield from self.__value()
+                if meta is not None:
+                    meta[name] = value
+            if (yield from self.__expect(',}')) == '}':
+                return
+
+
+def _iter_json_entries(chunks, key='entries', meta=None):
+    """
+    Streams entries of a JSON listing from an iterable of bytes chunks.
+    """
+    parser = _JsonStreamParser().parse(key, meta)
+    chunks = iter(chunks)
+    try:
+        signal = next(parser)
+        while True:
+            if signal is _NEED_DATA:
+                signal = parser.send(next(chunks, None))
+            else:
+                yield signal
+                signal = next(parser)
+    except StopIteration:
+        return
+
+
+async def _aiter_json_entries(chunks, key='entries', meta=None):
+    """
+    Streams entries of a JSON listing from an async iterable of bytes chunks.
+    """
+    parser = _JsonStreamParser().parse(key, meta)
+    chunks = chunks.__aiter__()
+    try:
+        signal = next(parser)
+        while True:
+            if signal is _NEED_DATA:
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    chunk = None
+                signal = parser.send(chunk)
+            else:
+                yield signal
+                signal = next(parser)
+    except StopIteration:
+        return
+
+
+def _json_loads(data):
+    """
+    Decodes JSON with orjson when it is installed, else with the json module.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dig(data, path):
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def _flatten_numbers(data, prefix=''):
+    """
+    :return: Generator of (dotted path, number) for every numeric leaf of nested dicts, bools as 0/1.
+        Paths start with prefix, if it is given.
+    """
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from _flatten_numbers(value, f'{prefix}.{key}' if prefix else str(key))
+    elif isinstance(data, (int, float)):
+        yield prefix, float(data)
+
+
+class Model(object):
+    __slots__ = ('_source', 'response')
+    # Attribute -> dotted key paths in the api entry, the first one present wins.
+    FIELDS = {}
+    # Top level key of the array in a listing response.
+    LISTING_KEY = 'entries'
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._paths = tuple((attribute, tuple(tuple(path.split('.')) for path in paths))
+                           for attribute, paths in cls.FIELDS.items())
+
+    def __init__(self, source, response=None):
+        """
+        Typed, slotted result of an api call. The source is decoded and the fields are filled
+        on the first field access; after that the source is dropped.
+
+        :param source: Decoded dict, or a response (requests or httpx) whose body is decoded.
+        :param response: Response the data came from, kept as the raw response.
+        """
+        self._source = source
+        self.response = response
+
+    @classmethod
+    def from_response(cls, response):
+        """
+        :param response: Response of the api call.
+        :return: Model of the whole response body, decoded on the first field access.
+        """
+        return cls(response, response)
+
+    @classmethod
+    def listing(cls, response):
+        """
+        :param response: Response of a listing api call.
+        :return: Listing of the models of the entries.
+        :rtype: Listing
+        """
+        return Listing(response, cls)
+
+    def _decode(self, data):
+        for attribute, paths in self._paths:
+            value = None
+            for path in paths:
+                value = _dig(data, path)
+                if value is not None:
+                    break
+            object.__setattr__(self, attribute, value)
+
+    def __getattr__(self, name):
+        # Only reached for unset slots, i.e. before decoding.
+        source = object.__getattribute__(self, '_source')
+        if source is None or name not in self.FIELDS:
+            raise AttributeError(name)
+        if not isinstance(source, dict):
+            source.raise_for_status()
+            source = _json_loads(source.content)
+        self._decode(source)
+        self._source = None
+        return object.__getattribute__(self, name)
+
+    def to_dict(self):
+        return {attribute: getattr(self, attribute) for attribute in self.FIELDS}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    # Models compare by their fields, which are mutable and may hold dicts or lists, so they are not hashable.
+    # Key them by a field instead, e.g. {ban.id: ban}.
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ', '.join(f'{attribute}={value!r}' for attribute, value in list(self.to_dict().items())[:3])
+        return f'{type(self).__name__}({fields})'
+
+
+class PlayerSession(Model):
+    __slots__ = ('id', 'cftools_id', 'name', 'steam64', 'ip', 'country', 'ping', 'loaded', 'created_at')
+    FIELDS = {
+        'id': ('id', 'gamesession_id'),
+        'cftools_id': ('cftools_id',),
+        'name': ('gamedata.player_name', 'persona.profile.name', 'name'),
+        'steam64': ('gamedata.steam64',),
+        'ip': ('info.ip',),
+        'country': ('info.country_code',),
+        'ping': ('live.ping.actual',),
+        'loaded': ('live.loaded',),
+        'created_at': ('created_at',),
+    }
+    LISTING_KEY = 'sessions'
+
+
+def _ban_format(ban):
+    """
+    :return: Format of a ban entry: its format if given, else 'ipv4' for an IPv4 (wildcards allowed) identifier,
+        else 'cftools_id'.
+    :rtype: str
+    """
+    frmt = ban.get('format') or ban.get('frmt')
+    if frmt:
+        return frmt
+    identifier = str(ban.get('identifier', ''))
+    if identifier.count('.') == 3 and all(part.replace('*', '').isdigit() or part == '*'
+                                         for part in identifier.split('.')):
+        return 'ipv4'
+    return 'cftools_id'
+
+
+class Ban(Model):
+    __slots__ = ('id', 'identifier', 'format', 'reason', 'status', 'created_at', 'expires_at')
+    FIELDS = {
+        'id': ('id', '_id'),
+        'identifier': ('identifier', 'user.cftools_id'),
+        'format': ('format', 'frmt'),
+        'reason': ('reason',),
+        'status': ('status',),
+        'created_at': ('created_at',),
+        'expires_at': ('expires_at',),
+    }
+
+    def _decode(self, data):
+        super()._decode(data)
+        if self.format is None:
+            self.format = _ban_format(data)
+
+
+class ListEntry(Model):
+    __slots__ = ('id', 'cftools_id', 'comment', 'created_at', 'expires_at')
+    FIELDS = {
+        'id': ('uuid', 'id'),
+        'cftools_id': ('cftools_id', 'user.cftools_id', 'identifier'),
+        'comment': ('comment',),
+        'created_at': ('created_at',),
+        'expires_at': ('expires_at',),
+    }
+
+
+class LeaderboardRow(Model):
+    __slots__ = ('cftools_id', 'name', 'rank', 'kills', 'deaths', 'suicides', 'playtime', 'kdratio',
+                 'longest_kill', 'longest_shot')
+    FIELDS = {
+        'cftools_id': ('cftools_id',),
+        'name': ('latest_name', 'name'),
+        'rank': ('rank',),
+        'kills': ('kills',),
+        'deaths': ('deaths',),
+        'suicides': ('suicides',),
+        'playtime': ('playtime',),
+        'kdratio': ('kdratio',),
+        'longest_kill': ('longest_kill',),
+        'longest_shot': ('longest_shot',),
+    }
+    LISTING_KEY = 'leaderboard'
+
+
+class ServerStatistics(Model):
+    __slots__ = ('values',)
+    FIELDS = {'values': ()}
+
+    def _decode(self, data):
+        self.values = dict(_flatten_numbers(data))
+
+    def get(self, name, default=None):
+        """
+        :param name: Dotted path of a numeric statistic, e.g. 'general.players'.
+        :type name: str
+        :return: Value of the statistic.
+        :rtype: float
+        """
+        return self.values.get(name, default)
+
+
+class Listing(object):
+    __slots__ = ('response', 'model', '__entries')
+
+    def __init__(self, response, model):
+        """
+        Sequence of models of a listing response (player list, leaderboard, ...).
+        The body is decoded once, on the first access, and only the slotted models are kept.
+
+        Example:
+            players = pycftools.PlayerSession.listing(cfapi.server_player_list())
+            names = [player.name for player in players]
+
+        :param response: Response of the listing api call (requests or httpx), kept as the raw response.
+        :param model: Model subclass of the entries.
+        :type model: type
+        """
+        self.response = response
+        self.model = model
+        self.__entries = None
+
+    @property
+    def data(self):
+        """
+        :return: Freshly decoded response body.
+        """
+        return _json_loads(self.response.content)
+
+    @property
+    def entries(self):
+        if self.__entries is None:
+            self.response.raise_for_status()
+            data = _json_loads(self.response.content)
+            items = data.get(self.model.LISTING_KEY) or [] if isinstance(data, dict) else data
+            self.__entries = [self.model(item) for item in items]
+        return self.__entries
+
+    def by(self, attribute):
+        """
+        :return: Dict attribute value -> model, e.g. by('cftools_id').
+        :rtype: dict
+        """
+        return {getattr(entry, attribute): entry for entry in self.entries}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def __repr__(self):
+        return f'Listing({self.model.__name__}, {len(self)} entries)'
+
+
+class _BaseCfToolsApi(object):
+    def __init__(self, app_id, app_secret, game_identifier, ip, game_port, server_api_id, server_banlist_id,
+                 auth_token_filename, pycftools_debug, timestamp_delta, rate_limiter, token_store,
+                 token_refresh_ahead, api_url, response_cache, single_flight, retrier, timeout, circuit_breaker,
+                 scheduler, metrics):
+        """
+        Part of CfToolsApi and AsyncCfToolsApi which does not depend on the http library:
+        api urls and payloads, token bookkeeping, the response cache, write listeners,
+        and the deadline, circuit breaker and retry decisions of every attempt.
+
+        Subclasses do the I/O: _call() sends an api request with an up-to-date token,
+        _iter_entries() streams a listing. Api methods return what _call() returns -
+        a Response in CfToolsApi, an awaitable of httpx.Response in AsyncCfToolsApi.
+
+        See CfToolsApi for the parameters.
+        """
+        self._pycftools_debug = pycftools_debug
+        self.__application_id = app_id
+        self.__application_secret = app_secret
+        self.__server_id_hash = self._create_server_id_hash(game_identifier, ip, game_port)
+        self.__server_api_id = server_api_id
+
+        # General public api url
+        self._public_api_url = api_url.rstrip('/')
+
+        # ---------------- Api urls ----------------
+
+        self.__authentication_url = ''.join([self._public_api_url, '/v1/auth/register'])
+        self.__grants_url = ''.join([self._public_api_url, '/v1/@app/grants'])
+        self.__server_details_url = ''.join(
+            [self._public_api_url, f'/v1/gameserver/{self.__server_id_hash}'])
+        self.__server_info_url = ''.join(
+            [self._public_api_url, f'/v1/server/{self.__server_api_id}/info'])
+        self.__server_statistics_url = ''.join(
+            [self._public_api_url, f'/v1/server/{self.__server_api_id}/statistics'])
+        self.__server_player_list_url = ''.join(
+            [self._public_api_url, f'/v1/server/{self.__server_api_id}/GSM/list'])
+        self.__server_kick_url = ''.join(
+            [self._public_api_url, f'/v1/server/{self.__server_api_id}/kick'])
+        self.__server_private_message_url = ''.join(
+            [self._public_api_url, f'/v1/server/{self.__server_api_id}/message-private'])
+        self.__server_public_message_url = ''.join(
+            [self._public_api_url, f'/v1/server/{self.__server_api_id}/message-server'])
+        self.__server_row_rcon_command_url = ''.join(
+            [self._public_api_url, f'/v1/server/{self.__server_api_id}/raw'])
+        self.__server_teleport_url = ''.join(
+            [self._public_api_url, f'/v0/server/{self.__server_api_id}/gameLabs/teleport'])
+        self.__server_spawn_url = ''.join(
+            [self._public_api_url, f'/v0/server/{self.__server_api_id}/gameLabs/spawn'])
+        self.__server_queue_priority_url = ''.join(
+            [self._public_api_url, f'/v1/server/{self.__server_api_id}/queuepriority'])
+        self.__server_whitelist_url = ''.join(
+            [self._public_api_url, f'/v1/server/{self.__server_api_id}/whitelist'])
+        self.__server_leaderboard_url = ''.join(
+            [self._public_api_url, f'/v1/server/{self.__server_api_id}/leaderboard'])
+        self.__server_player_stats_url = ''.join(
+            [self._public_api_url, f'/v1/server/{self.__server_api_id}/player'])
+        self.__server_banlist_url = ''.join(
+            [self._public_api_url, f'/v1/banlist/{server_banlist_id}/bans'])
+        self.__server_lookup_url = ''.join([self._public_api_url, '/v1/users/lookup'])
+
+        # ---------------- Api urls End ----------------
+
+        self._headers = {}
+        self._token_store = FileTokenStore(auth_token_filename) if token_store is None else token_store
+        self._timestamp_delta = timestamp_delta
+        self._token_timestamp = None
+        self._token_refresh_ahead = min(token_refresh_ahead, timestamp_delta // 2)
+        # Maintained by the background refresher, while True api calls skip all token checks.
+        self._token_valid = False
+
+        self._rate_limiter = RateLimiter() if rate_limiter is None else rate_limiter
+        self._response_cache = response_cache
+        self._single_flight = SingleFlight() if single_flight is None else single_flight
+        self.__write_listeners = []
+        self._retrier = Retrier() if retrier is None else retrier
+        self._timeout = timeout
+        self._circuit_breaker = CircuitBreaker() if circuit_breaker is None else circuit_breaker
+        self._scheduler = scheduler
+        self._metrics = metrics
+
+    @property
+    def rate_limiter(self):
+        """
+        :return: RateLimiter used by this client, or False if rate limiting is disabled.
+        :rtype: RateLimiter
+        """
+        return self._rate_limiter
+
+    @property
+    def response_cache(self):
+        """
+        :return: ResponseCache used by this client, or None if responses are not cached.
+        :rtype: ResponseCache
+        """
+        return self._response_cache
+
+    @property
+    def single_flight(self):
+        """
+        :return: SingleFlight used by this client, or False if requests are not coalesced.
+        :rtype: SingleFlight
+        """
+        return self._single_flight
+
+    @property
+    def retrier(self):
+        """
+        :return: Retrier used by this client (see Retrier.stats()), or False if retries are disabled.
+        :rtype: Retrier
+        """
+        return self._retrier
+
+    @property
+    def circuit_breaker(self):
+        """
+        :return: CircuitBreaker used by this client (see CircuitBreaker.states()), or False if it is disabled.
+        :rtype: CircuitBreaker
+        """
+        return self._circuit_breaker
+
+    @property
+    def scheduler(self):
+        """
+        :return: RequestScheduler used by this client, or None if requests are not scheduled.
+        :rtype: RequestScheduler
+        """
+        return self._scheduler
+
+    @property
+    def metrics(self):
+        """
+        :return: Metrics of this client, or None if nothing is collected.
+        :rtype: Metrics
+        """
+        return self._metrics
+
+    def add_write_listener(self, listener):
+        """
+        Registers a callback called after every successful write (POST / DELETE) made through this client.
+        Used e.g. by BanlistMirror to follow bans and unbans. An exception of a listener does not fail the write,
+        it is only printed in debug mode.
+
+        :param listener: Callable listener(route, payload, response).
+        :type listener: callable
+        """
+        self.__write_listeners.append(listener)
+
+    def _call(self, route, method, url, **kwargs):
+        """
+        Sends an api request with an up-to-date token. Implemented by the clients.
+
+        :param route: Route name, the same as the api method name.
+        :type route: str
+        :return: Response, or an awaitable of it.
+        """
+        raise NotImplementedError
+
+    def _iter_entries(self, route, url, params, chunk_size, model=None):
+        """
+        Streams entries of a listing, see _listing(). Implemented by the clients.
+
+        :return: Generator or async generator of entries.
+        """
+        raise NotImplementedError
+
+    def _listing(self, route, url, params, chunk_size, model=None):
+        params = {key: value for key, value in params.items() if value is not None}
+        return self._iter_entries(route, url, params, chunk_size, model)
+
+    # ---------------- Token bookkeeping ----------------
+
+    def _check_token_timestamp(self, timestamp, ahead=0):
+        """
+        :param timestamp: Unix timestamp from file. It shows the creation date of the token.
+        :type timestamp: float
+        :param ahead: Treat the token as outdated this many seconds before its deadline.
+        :type ahead: int
+        :return: return True if token is outdated, else if token is not outdated - return False
+        :rtype: bool
+        """
+        if (timestamp + self._timestamp_delta - ahead) <= datetime.datetime.now().timestamp():
+            print(f'|| {datetime.datetime.now()} || Auth token is outdated') if self._pycftools_debug else None
+            return True
+        else:
+            print(f'|| {datetime.datetime.now()} || Auth token is not outdated') if self._pycftools_debug else None
+            return False
+
+    def _token_outdated(self, to_load_data, ahead=0):
+        """
+        :param to_load_data: Token data of the store, or None.
+        :type to_load_data: dict
+        :return: True if a new token has to be registered.
+        :rtype: bool
+        """
+        return to_load_data is None or self._check_token_timestamp(to_load_data['timestamp'], ahead)
+
+    def _registration(self):
+        """
+        Some routes require authentication in the form of Bearer tokens in the request headers.
+
+        Note:
+            MAX REQUESTS: 2/MINUTE
+
+        :return: Route, method, url and keyword arguments of the registration request.
+        :rtype: tuple
+        """
+        payload = {
+            # Your application id.
+            'application_id': self.__application_id,
+            # Your application secret.
+            'secret': self.__application_secret
+        }
+        return 'auth', 'POST', self.__authentication_url, {'data': payload, 'headers': {}}
+
+    def _registered_token(self, reg_data):
+        """
+        :param reg_data: Response of the registration request.
+        :return: Token data for the store, raises AuthenticationError if there is no token.
+        :rtype: dict
+        """
+        if reg_data.status_code == 200:
+            token = reg_data.json()['token']
+            print(f'|| {datetime.datetime.now()} || Auth token received. - ~ {token}') if self._pycftools_debug else None
+            return {'token': token, 'timestamp': datetime.datetime.now().timestamp()}
+        else:
+            print(f'|| {datetime.datetime.now()} || Auth error reg_data status code : {reg_data.status_code}') if self._pycftools_debug else None
+            raise AuthenticationError(reg_data.status_code)
+
+    def _use_token(self, to_load_data):
+        """
+        Puts a token into the api headers.
+        """
+        # Headers dict is replaced, not mutated, so concurrent requests always see a whole set of headers.
+        self._headers = {**self._headers, 'Authorization': f'''Bearer {to_load_data['token']}'''}
+        self._token_timestamp = to_load_data['timestamp']
+        print(f'|| {datetime.datetime.now()} || Setting api headers {self._headers}') if self._pycftools_debug else None
+
+    def _refreshed(self):
+        """
+        Called by the background refresher after a renewal.
+
+        :return: Seconds until the next renewal.
+        :rtype: float
+        """
+        self._token_valid = True
+        return (self._token_timestamp + self._timestamp_delta - self._token_refresh_ahead
+                - datetime.datetime.now().timestamp())
+
+    def _refresh_failed(self, err):
+        """
+        Called by the background refresher after a failed renewal.
+
+        :return: Seconds until the renewal is retried.
+        :rtype: float
+        """
+        print(f'|| {datetime.datetime.now()} || Background token refresh failed: {err}') if self._pycftools_debug else None
+        # Api calls check the token themselves again, and register a new one once the deadline passes.
+        self._token_valid = False
+        return 30
+
+    # ---------------- Requests ----------------
+
+    def _cached(self, route, url, params):
+        """
+        :return: Cache key of a GET request and its cached response, or None.
+        :rtype: tuple
+        """
+        request_key = ResponseCache.make_key(url, params)
+        cache = self._response_cache
+        response = None
+        if cache is not None and cache.cacheable(route):
+            response = cache.get(request_key)
+            if response is not None and self._metrics is not None:
+                self._metrics.inc('pycftools_cache_hits_total', route)
+        return request_key, response
+
+    def _cache(self, route, request_key, response):
+        if self._response_cache is not None:
+            self._response_cache.put(route, request_key, response)
+
+    def _written(self, route, payload, response):
+        """
+        Called after a successful write: drops the reads it made stale and tells the write listeners.
+        """
+        if self._response_cache is not None:
+            self._response_cache.invalidate_after(route)
+        for listener in self.__write_listeners:
+            # The write succeeded, a failing listener must not make the caller think otherwise.
+            try:
+                listener(route, payload, response)
+            except Exception as err:
+                print(f'|| {datetime.datetime.now()} || Write listener error on {route}: {err!r}') \
+                    if self._pycftools_debug else None
+
+    def _check_deadline(self, route, deadline_at):
+        """
+        Raises DeadlineExceeded if the deadline() budget is over, or the rate limiter would wait past it.
+        """
+        if deadline_at is not None:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0 or (self._rate_limiter and self._rate_limiter.wait_time(route) >= remaining):
+                raise DeadlineExceeded(route)
+
+    def _rate_limit_waited(self, route, waited):
+        """
+        :param waited: Monotonic time the rate limiter wait started.
+        :type waited: float
+        """
+        if self._metrics is not None:
+            self._metrics.observe_rate_limit_wait(route, time.monotonic() - waited)
+
+    @staticmethod
+    def _remaining(deadline_at):
+        return None if deadline_at is None else deadline_at - time.monotonic()
+
+    def _release_slot(self):
+        """
+        Gives the scheduler slot of a request back, for a streamed response once its body is read.
+        """
+        if self._scheduler:
+            self._scheduler.release()
+
+    def _allow(self, route, timeout, deadline_at):
+        """
+        Asks the circuit breaker right before sending, so a wait which fails can't leave a half open route
+        with its probe taken.
+
+        :return: Timeout of the attempt, cut to the deadline() budget.
+        """
+        if self._circuit_breaker:
+            self._circuit_breaker.allow(route)
+        if deadline_at is None:
+            return timeout
+        return _cap_timeout(timeout, max(deadline_at - time.monotonic(), 0.001))
+
+    def _retry_delay(self, route, method, attempt, deadline_at, response=None):
+        """
+        Records the outcome of an attempt in the circuit breaker and asks the retrier whether to retry it.
+
+        :param response: Response of the attempt, None for a transport error.
+        :return: Seconds to wait before the retry, or None if the outcome is final.
+        :rtype: float
+        """
+        if self._circuit_breaker:
+            self._circuit_breaker.record(route, response is not None and response.status_code < 500)
+        if not self._retrier:
+            return None
+        if response is None:
+            delay = self._retrier.retry_delay(route, method, attempt)
+        else:
+            delay = self._retrier.retry_delay(route, method, attempt, response.status_code,
+                                              response.headers.get('Retry-After'))
+        if delay is None or (deadline_at is not None and time.monotonic() + delay >= deadline_at):
+            return None
+        print(f'|| {datetime.datetime.now()} || Retrying {route} in {delay:.2f}s') if self._pycftools_debug else None
+        if self._metrics is not None:
+            self._metrics.inc('pycftools_retries_total', route)
+        return delay
+
+    # ---------------- Grant process and access permissions ----------------
+
+    # When trying to access restricted routes or data, an API application must be granted access by the resource owner.
+    # This permission can be granted by sending the resource owner the "Grant URL"
+    # You can find on your application dashboard.
+
+    def grants(self):
+        """
+        Get list of all grants and their respective id's.
+
+        Note:
+            MAX REQUESTS: 1/MINUTE
+
+        :return: List of all grants and their respective id's.
+        :rtype: Response
+        """
+        return self._call('grants', 'GET', self.__grants_url)
+
+    def server_details(self):
+        """
+        Get server details by Server Id. Server id server id is specified in the class constructor.
+
+        :return: Server details by Server Id.
+        :rtype: Response
+        """
+        return self._call('server_details', 'GET', self.__server_details_url)
+
+    # ---------------- Server ----------------
+
+    # All subsequent routes require a Server API Id and an active application grant.
+
+    def server_info(self):
+        """
+        Get general information about the registered server.
+
+        :return: Information about the registered server
+        :rtype: Response
+        """
+        return self._call('server_info', 'GET', self.__server_info_url)
+
+    def server_statistics(self):
+        """
+        Get server statistics.
+
+        :return: Server statistics.
+        :rtype: Response
+        """
+        return self._call('server_statistics', 'GET', self.__server_statistics_url)
+
+    def server_player_list(self):
+        """
+        Get full player list.
+
+        :return: Full player list.
+        :rtype: Response
+        """
+        return self._call('server_player_list', 'GET', self.__server_player_list_url)
+
+    def server_kick(self, gs_id, reason):
+        """
+        Kick a player.
+
+        :param gs_id: An active gamesession_id (See server_player_list() for details)
+        :type gs_id: str
+        :param reason: Reason 1-128 len max.
+        :type reason: str
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {
+            'gamesession_id': gs_id,
+            'reason': reason
+        }
+        return self._call('server_kick', 'POST', self.__server_kick_url, data=payload)
+
+    def server_private_message(self, gs_id, content):
+        """
+        Send a private message to a player.
+
+        :param gs_id: An active gamesession_id (See server_player_list() for details)
+        :type gs_id: str
+        :param content: Message content length: 1-256.
+        :type content: str
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {
+            'gamesession_id': gs_id,
+            'content': content
+        }
+        return self._call('server_private_message', 'POST', self.__server_private_message_url, data=payload)
+
+    def server_public_message(self, content):
+        """
+        Send a public message to the server.
+
+        :param content: Message content length: 1-256.
+        :type content: str
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {'content': content}
+        return self._call('server_public_message', 'POST', self.__server_public_message_url, data=payload)
+
+    def server_row_rcon_command(self, command):
+        """
+        Send a raw RCon command to the server.
+
+        :param command: Command length: 1-256.
+        :type command: str
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {'command': command}
+        return self._call('server_row_rcon_command', 'POST', self.__server_row_rcon_command_url, data=payload)
+
+    def server_teleport(self, gs_id, coords):
+        """
+        Teleport a player GameLabs required Not all games supported.
+
+        :param gs_id: An active gamesession_id (See server_player_list() for details)
+        :type gs_id: str
+        :param coords: Coordinates list{2}: [X, Y]
+        :type coords: list
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {
+            'gamesession_id': gs_id,
+            'coords': coords
+        }
+        return self._call('server_teleport', 'POST', self.__server_teleport_url, data=payload)
+
+    def server_spawn(self, gs_id, obj_name, quantity):
+        """
+        Spawn an object for player GameLabs required Not all games supported.
+
+        :param gs_id: An active gamesession_id (See server_player_list() for details)
+        :type gs_id: str
+        :param obj_name: Object string.
+        :type obj_name: str
+        :param quantity: Quantity 1-9999 High quantities will lag a server.
+        :type quantity: int
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {
+            'gamesession_id': gs_id,
+            'object': obj_name,
+            'quantity': quantity
+        }
+        return self._call('server_spawn', 'POST', self.__server_spawn_url, data=payload)
+
+    def server_queue_priority_list(self, cftools_id, comment):
+        """
+        Get a list of all queue priority entries Streamed response.
+
+        :param cftools_id: CFTools ID
+        :type cftools_id: str
+        :param comment: Comment string.
+        :type comment: str
+        :return: List of all queue priority entries.
+        :rtype: Response
+        """
+        payload = {
+            'cftools_id': cftools_id,
+            'comment': comment
+        }
+        return self._call('server_queue_priority_list', 'GET', self.__server_queue_priority_url, params=payload)
+
+    def server_queue_priority_entry(self, cftools_id, expires_at, comment):
+        """
+        Create a new queue priority entry.
+
+        :param cftools_id: A CFTools account id.
+        :type cftools_id: str
+        :param expires_at: Expiration datetime object or null; Null is a permanent entry.
+        :type expires_at: str
+        :param comment: A note or comment.
+        :type comment: str
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {
+            'cftools_id': cftools_id,
+            'expires_at': expires_at,
+            'comment': comment
+        }
+        return self._call('server_queue_priority_entry', 'POST', self.__server_queue_priority_url, data=payload)
+
+    def queue_priority_delete_entry(self, cftools_id):
+        """
+        Delete an existing queue priority entry.
+
+        :param cftools_id: A CFTools account id.
+        :type cftools_id: str
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {'cftools_id': cftools_id}
+        return self._call('queue_priority_delete_entry', 'DELETE', self.__server_queue_priority_url, data=payload)
+
+    def server_whitelist(self, cftools_id, comment):
+        """
+        Get a list of all whitelist entries Streamed response.
+
+        :param cftools_id: CFTools ID
+        :type cftools_id: str
+        :param comment: Comment string.
+        :type comment: str
+        :return: List of all whitelist entries.
+        :rtype: Response
+        """
+        payload = {
+            'cftools_id': cftools_id,
+            'comment': comment
+        }
+        return self._call('server_whitelist', 'GET', self.__server_whitelist_url, params=payload)
+
+    def server_whitelist_entry(self, cftools_id, expires_at, comment):
+        """
+        Create a new whitelist entry.
+
+        :param cftools_id: A CFTools account id.
+        :type cftools_id: str
+        :param expires_at: Expiration datetime object or null; Null is a permanent entry.
+        :type expires_at: str
+        :param comment: A note or comment.
+        :type comment: str
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {
+            'cftools_id': cftools_id,
+            'expires_at': expires_at,
+            'comment': comment
+        }
+        return self._call('server_whitelist_entry', 'POST', self.__server_whitelist_url, data=payload)
+
+    def server_whitelist_delete_entry(self, cftools_id):
+        """
+        Delete an existing whitelist entry.
+
+        :param cftools_id: A CFTools account id.
+        :type cftools_id: str
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {'cftools_id': cftools_id}
+        return self._call('server_whitelist_delete_entry', 'DELETE', self.__server_whitelist_url, data=payload)
+
+    def server_leaderboard(self, stat, order, limit):
+        """
+        Request the generation of a leaderboard based on internally kept player stats.
+        This may fail if no stats are present.
+
+        Note:
+            MAX REQUESTS: 7/MINUTE
+
+        :param stat: One of kills deaths suicides playtime longest_kill longest_shot kdratio
+        :type stat: str
+        :param order: 1 (Ascending) or -1 (Descending)
+        :type order: int
+        :param limit: An integer between 1 and 100; Defaults to 10
+        :type limit: int
+        :return: Leaderboard based on internally kept player stats.
+        :rtype: Response
+        """
+        payload = {
+            'stat': stat,
+            'order': order,
+            'limit': limit
+        }
+        return self._call('server_leaderboard', 'GET', self.__server_leaderboard_url, params=payload)
+
+    def server_player_stats(self, cftools_id):
+        """
+        Individual stats of a player for a server.
+
+        Note:
+            MAX REQUESTS: 10/MINUTE
+
+        :param cftools_id: A CFTools account id.
+        :type cftools_id: str
+        :return: Individual stats of a player.
+        :rtype: Response
+        """
+        payload = {'cftools_id': cftools_id}
+        return self._call('server_player_stats', 'GET', self.__server_player_stats_url, params=payload)
+
+    # ---------------- Banlist ----------------
+
+    # All subsequent routes require a Banlist Id and an active application grant.
+
+    def server_banlist(self, flt):
+        """
+        Get a list of all bans. Streamed response.
+
+        :param flt: Either an IPv4 or a CFTools account id
+        :type flt: str
+        :return: List of all bans.
+        :rtype: Response
+        """
+        payload = {'filter': flt}
+        return self._call('server_banlist', 'GET', self.__server_banlist_url, params=payload)
+
+    def server_ban(self, frmt, identifier, expires_at, reason):
+        """
+        Issue a new ban. Triggers an in-game kick.
+
+        :param frmt: cftools_id or ipv4.
+        :type frmt: str
+        :param identifier: A CFTools account id or an IPv4; IPv4 may contain wildcard substitutes in form of an asteriks.
+        :type identifier: str
+        :param expires_at: Expiration datetime object or null; Null is a permanent entry.
+        :type expires_at: str
+        :param reason: A ban reason,
+        :type reason: str
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {
+            'format': frmt,
+            'identifier': identifier,
+            'expires_at': expires_at,
+            'reason': reason
+        }
+        return self._call('server_ban', 'POST', self.__server_banlist_url, data=payload)
+
+    def server_unban(self, ban_id):
+        """
+        Revoke an existing ban.
+
+        :param ban_id: The ban id of an existing ban
+        :type ban_id: str
+        :return: Returns 204 on success.
+        :rtype: Response
+        """
+        payload = {'ban_id': ban_id}
+        return self._call('server_unban', 'DELETE', self.__server_banlist_url, data=payload)
+
+    def iter_bans(self, flt=None, chunk_size=65536, model=None):
+        """
+        Iterate over all bans of the banlist. Streamed, bounded memory version of server_banlist().
+
+        :param flt: Either an IPv4 or a CFTools account id, None for all bans.
+        :type flt: str
+        :param chunk_size: Size of chunks the response is read by.
+        :type chunk_size: int
+        :param model: Model to wrap the entries into, e.g. pycftools.Ban. By default, entries are dicts.
+        :type model: type
+        :return: Generator (async generator for AsyncCfToolsApi) of ban dicts or models. Raises requests.HTTPError (httpx.HTTPStatusError) on a non-successful response.
+        :rtype: generator
+        """
+        return self._listing('server_banlist', self.__server_banlist_url, {'filter': flt}, chunk_size, model)
+
+    def iter_whitelist(self, cftools_id=None, comment=None, chunk_size=65536, model=None):
+        """
+        Iterate over all whitelist entries. Streamed, bounded memory version of server_whitelist().
+
+        :param cftools_id: CFTools ID, None for all entries.
+        :type cftools_id: str
+        :param comment: Comment string, None for all entries.
+        :type comment: str
+        :param chunk_size: Size of chunks the response is read by.
+        :type chunk_size: int
+        :param model: Model to wrap the entries into, e.g. pycftools.ListEntry. By default, entries are dicts.
+        :type model: type
+        :return: Generator (async generator for AsyncCfToolsApi) of whitelist entry dicts or models. Raises requests.HTTPError (httpx.HTTPStatusError) on a non-successful response.
+        :rtype: generator
+        """
+        payload = {
+            'cftools_id': cftools_id,
+            'comment': comment
+        }
+        return self._listing('server_whitelist', self.__server_whitelist_url, payload, chunk_size, model)
+
+    def iter_queue_priority(self, cftools_id=None, comment=None, chunk_size=65536, model=None):
+        """
+        Iterate over all queue priority entries. Streamed, bounded memory version of server_queue_priority_list().
+
+        :param cftools_id: CFTools ID, None for all entries.
+        :type cftools_id: str
+        :param comment: Comment string, None for all entries.
+        :type comment: str
+        :param chunk_size: Size of chunks the response is read by.
+        :type chunk_size: int
+        :param model: Model to wrap the entries into, e.g. pycftools.ListEntry. By default, entries are dicts.
+        :type model: type
+        :return: Generator (async generator for AsyncCfToolsApi) of queue priority entry dicts or models. Raises requests.HTTPError (httpx.HTTPStatusError) on a non-successful response.
+        :rtype: generator
+        """
+        payload = {
+            'cftools_id': cftools_id,
+            'comment': comment
+        }
+        return self._listing('server_queue_priority_list', self.__server_queue_priority_url, payload, chunk_size, model)
+
+    # ---------------- Users ----------------
+
+    def server_lookup_user(self, identifier):
+        """
+        Search CFTools Cloud database for a user.
+
+        :param identifier: Either a Steam64, BattlEye GUID or Bohemia Interactive UID
+        :type identifier: str
+        :return: Json response with information about user.
+        :rtype: Response
+        """
+        payload = {'identifier': identifier}
+        return self._call('server_lookup_user', 'GET', self.__server_lookup_url, params=payload)
+
+    # ---------------- Server id ----------------
+
+    @staticmethod
+    def _create_server_id_hash(game_identifier, ip, game_port):
+        """
+        CFTools Cloud's Steamrelay service automatically queries all game servers for specific games
+        in a 30 to 60 second interval. To retrieve information about game servers you need to generate
+        a Data API specific server resource id, referenced to as server_id in the following.
+
+        The server_id generates from following datasets:
+        1. IPv4 of the game server
+        2. Gameport of the game server
+        3. Game identifier
+
+        For Dayz identifier is 1.
+
+        Once you have gathered this information, build a string with these parameters in the following order:
+        {game_identifier}{ipv4}{game_port}
+        Do not use any spacers or other additional symbols.
+
+        After you have this string use a sha1 hashing function on it.
+        The digest in hexademical form can then be used as server_id.
+
+        :param game_identifier: is a game id in cftools cloud.
+        :type game_identifier: str
+        :param ip: ipv4 address of server.
+        :type ip: str
+        :param game_port: server port.
+        :type game_port: str
+        :return: sha1 hash string.
+        :rtype: str
+        """
+        server_id_substring = ''.join([game_identifier, ip, game_port])
+        return hashlib.sha1(str.encode(server_id_substring)).hexdigest()
+
+
+class CfToolsApi(_BaseCfToolsApi):
+    def __init__(self, app_id, app_secret, game_identifier, ip, game_port, server_api_id, server_banlist_id,
+                 auth_token_filename='token.raw', pycftools_debug=False, timestamp_delta=43200,
+                 rate_limiter=None, token_store=None, background_token_refresh=False, token_refresh_ahead=600,
+                 api_url='https://data.cftools.cloud', response_cache=None,
+                 single_flight=None, session=None, retrier=None, timeout=(3.05, 30), circuit_breaker=None,
+                 scheduler=None, metrics=None, transport=None):
+        """
+        Class CfToolsApi used to access various cftools api methods.
+        The main use, getting access to api.
+        The ability to automate some processes, and getting access to the application from outside.
+
+        Note:
+            One instance is safe to share between threads (e.g. a ThreadPoolExecutor).
+            Token state is guarded by a lock and refreshed single-flight: when several threads find the token outdated,
+            one of them refreshes it and the others wait and reuse the result. The requests.Session connection pool
+            and the RateLimiter are thread-safe as well. Api calls themselves run in parallel, without locking.
+
+        :param app_id: Application Id from https://developer.cftools.cloud/applications
+        :type app_id: str
+        :param app_secret: Application secret from https://developer.cftools.cloud/applications
+        :type app_secret: str
+        :param game_identifier: Game_identifier is needed to create server id.
+        :type game_identifier: str
+        :param ip: Ipv4 is needed to create server id.
+        :type ip: str
+        :param game_port: Game_port is needed to create server id.
+        :type game_port: str
+        :param server_api_id: Server_api_id this is the global server identifier and it can be found in the server API settings.
+        :type server_api_id: str
+        :param server_banlist_id: Server_banlist_id is global banlist identifier, it can be found in ban-manager https://app.cftools.cloud/ban-manager - see for Banlist ID.
+        :type server_banlist_id: str
+        :param auth_token_filename: Auth_token_filename this is the filename var for auth token file.
+        :type auth_token_filename: str
+        :param pycftools_debug: This is the variable for enabling debug outputs from the program.
+        :type pycftools_debug: bool
+        :param timestamp_delta: This is the time offset delta when the token in the file needs to be updated. By default, the value is set to half a day - 43200. UNIXTIMESTAMP
+        :type timestamp_delta: int
+        :param rate_limiter: RateLimiter pacing calls by the documented CFTools quotas. By default, a new one is created. Pass False to disable.
+        :type rate_limiter: RateLimiter
+        :param token_store: TokenStore keeping the bearer token, may be shared between processes. By default, FileTokenStore(auth_token_filename).
+        :type token_store: TokenStore
+        :param background_token_refresh: Renew the token in a background thread ahead of its deadline, so api calls never wait for re-auth.
+        :type background_token_refresh: bool
+        :param token_refresh_ahead: How many seconds before the timestamp_delta deadline the background refresh happens.
+        :type token_refresh_ahead: int
+        :param api_url: Base url of the CFTools Data API, can point to a proxy or a local stub server.
+        :type api_url: str
+        :param response_cache: ResponseCache for read routes. By default, responses are not cached.
+        :type response_cache: ResponseCache
+        :param single_flight: SingleFlight collapsing identical concurrent GET requests into one. By default, a new one is created. Pass False to disable.
+        :type single_flight: SingleFlight
+        :param retrier: Retrier with retry policies per route. By default, Retrier() - 429 is retried for all requests, transport errors and 5xx for idempotent ones. Pass False to disable.
+        :type retrier: Retrier
+        :param timeout: Default timeout of every request, seconds or (connect, read) tuple. None waits forever. See deadline() for budgets per call.
+        :type timeout: tuple
+        :param circuit_breaker: CircuitBreaker failing fast on degraded routes. By default, a new one is created. Pass False to disable.
+        :type circuit_breaker: CircuitBreaker
+        :param scheduler: RequestScheduler limiting requests in flight and serving moderation before background reads. By default, requests are not scheduled.
+        :type scheduler: RequestScheduler
+        :param metrics: Metrics collecting latency histograms, counters and spans of the requests. By default, nothing is collected.
+        :type metrics: Metrics
+        :param session: requests.Session to send requests with, may be shared by several clients. By default, a new one is created and closed by close().
+        :type session: requests.Session
+        :param transport: requests transport adapter mounted on the session for http and https, e.g. PooledTransport, Cassette.recorder() or Cassette.replayer(). Closed by close(). By default, a PooledTransport() on a session created by the client, none on a passed one.
+        :type transport: requests.adapters.BaseAdapter
+        """
+
+        super().__init__(app_id, app_secret, game_identifier, ip, game_port, server_api_id, server_banlist_id,
+                         auth_token_filename, pycftools_debug, timestamp_delta, rate_limiter, token_store,
+                         token_refresh_ahead, api_url, response_cache, single_flight, retrier, timeout,
+                         circuit_breaker, scheduler, metrics)
+
+        self.__own_session = session is None
+        self.__api_cftools_session = requests.Session() if session is None else session
+        if transport is None and session is None:
+            transport = PooledTransport()
+        self.__transport = transport
+        if transport is not None:
+            self.__api_cftools_session.mount('https://', transport)
+            self.__api_cftools_session.mount('http://', transport)
+
+        self.__token_lock = threading.Lock()
+        self.__token_refresher = None
+        self.__token_refresher_stop = threading.Event()
+        if background_token_refresh:
+            self.start_token_refresher()
+
+    # ---------------- Save/load tokens ----------------
+
+    def check_register(wmethod):
+        """
+        This method is needed to check if we have an up-to-date authorization token.
+        It checks if there is a token in the token store (by default, a file).
+        If such is found, it checks the relevance of the token and loads if everything is correct.
+        Else asks for a new one, and automatically sets / saves.
+
+        Note:
+            Saving a token to a file is the simplest thing that came to my mind.
+            Perhaps there is some kind of security threat from this.
+            Write to issues on github to discuss :)
+
+            Saving the token to a file makes it possible not to request a new token -
+            every time after the object is re-created.
+            Moreover, there is a delay of 2 requests per minute.
+
+            this. - in this context is self.
+            I use this method as a wrapper for other methods where the authorization token must be up to date.
+
+            Errors are not swallowed: AuthenticationError, or a requests error left after retries, reaches the caller.
+
+        :return: Result of the wrapped method.
+        """
+
+        @wraps(wmethod)
+        def wrapper(*args, **kwargs):
+            self = args[0]
+            if self._token_valid:
+                # Background refresher keeps the token up to date, nothing to check.
+                return wmethod(*args, **kwargs)
+            print(f'|| {datetime.datetime.now()} || Cf tools auth...') if self._pycftools_debug else None
+            try:
+                if self._token_timestamp is None or self._check_token_timestamp(self._token_timestamp):
+                    with self.__token_lock:
+                        # Single-flight: threads which waited for the lock find the token already refreshed.
+                        if self._token_timestamp is None or self._check_token_timestamp(self._token_timestamp):
+                            self.__load_auth_bearer_token()
+                else:
+                    print(f'|| {datetime.datetime.now()} || Load token from mem') if self._pycftools_debug else None
+
+                print(f'|| {datetime.datetime.now()} || Token loaded') if self._pycftools_debug else None
+                return wmethod(*args, **kwargs)
+            except Exception as err:
+                print(f'|| {datetime.datetime.now()} || {type(err).__name__}: {err}') if self._pycftools_debug else None
+                raise
+
+        return wrapper
+
+    def __load_auth_bearer_token(self, ahead=0):
+        """
+        Method to load token from the token store.
+        If the stored token is missing or outdated, a new one is registered - but only by one client at a time:
+        the refresh lock of the store elects a single refresher, the others wait and reuse its token.
+
+        :param ahead: Treat the token as outdated this many seconds before its deadline.
+        :type ahead: int
+        """
+        to_load_data = self._token_store.load()
+        if self._token_outdated(to_load_data, ahead):
+            with self._token_store.refresh_lock():
+                # Someone else may have refreshed the token while we were waiting for the lock.
+                to_load_data = self._token_store.load()
+                if self._token_outdated(to_load_data, ahead):
+                    print(f'|| {datetime.datetime.now()} || Registering new token') if self._pycftools_debug else None
+                    route, method, url, kwargs = self._registration()
+                    to_load_data = self._registered_token(self.__send(route, method, url, **kwargs))
+                    self._token_store.save(to_load_data['token'], to_load_data['timestamp'])
+        self._use_token(to_load_data)
+
+    def start_token_refresher(self):
+        """
+        Starts a daemon thread which renews the token token_refresh_ahead seconds before its deadline.
+        While it runs, api calls read the token from memory only - no store access, no timestamp checks.
+        If a renewal fails it is retried every 30 seconds, and api calls fall back to the usual
+        check_register behaviour - they register a new token themselves once the deadline passes.
+        """
+        if self.__token_refresher is not None and self.__token_refresher.is_alive():
+            return
+        self.__token_refresher_stop.clear()
+        self.__token_refresher = threading.Thread(target=self.__token_refresher_loop,
+                                                  name='pycftools-token-refresher', daemon=True)
+        self.__token_refresher.start()
+
+    def stop_token_refresher(self):
+        """
+        Stops the background token refresher, api calls check the token themselves again.
+        """
+        self._token_valid = False
+        self.__token_refresher_stop.set()
+        if self.__token_refresher is not None:
+            self.__token_refresher.join()
+            self.__token_refresher = None
+
+    def __token_refresher_loop(self):
+        while not self.__token_refresher_stop.is_set():
+            try:
+                with self.__token_lock:
+                    self.__load_auth_bearer_token(self._token_refresh_ahead)
+                delay = self._refreshed()
+            except Exception as err:
+                delay = self._refresh_failed(err)
+            self.__token_refresher_stop.wait(max(delay, 1))
+
+    # ---------------- Save/load tokens End ----------------
+
+    @check_register
+    def _call(self, route, method, url, **kwargs):
+        return self.__request(route, method, url, **kwargs)
+
+    def __request(self, route, method, url, **kwargs):
+        """
+        Sends a request with the current auth headers, or serves it from the response cache.
+        Identical concurrent GET requests are collapsed into one by the single flight.
+
+        :param route: Route name, the same as the api method name.
+        :type route: str
+        :return: Response.
+        :rtype: Response
+        """
+        if method != 'GET':
+            response = self.__send(route, method, url, **kwargs)
+            if response.ok:
+                self._written(route, kwargs.get('data'), response)
+            return response
+
+        request_key, response = self._cached(route, url, kwargs.get('params'))
+        if response is not None:
+            return response
+        if self._single_flight:
+            response = self._single_flight.do(request_key, self.__send, route, method, url, **kwargs)
+        else:
+            response = self.__send(route, method, url, **kwargs)
+        self._cache(route, request_key, response)
+        return response
+
+    def __send(self, route, method, url, **kwargs):
+        """
+        Sends a request, recorded by the metrics if there are any.
+
+        :return: Response.
+        :rtype: Response
+        """
+        if self._metrics is None:
+            return self.__send_attempts(route, method, url, **kwargs)
+        token = self._metrics.start_request(route, method, url, kwargs)
+        try:
+            response = self.__send_attempts(route, method, url, **kwargs)
+        except Exception as err:
+            self._metrics.end_request(token, error=err)
+            raise
+        self._metrics.end_request(token, response)
+        return response
+
+    def __send_attempts(self, route, method, url, **kwargs):
+        """
+        Sends a request, paced by the rate limiter, guarded by the circuit breaker and retried by the retrier,
+        all within the deadline() budget if one is set.
+
+        With stream=True the scheduler slot is held until the caller has read the body, it releases it
+        with _release_slot() after closing the response.
+
+        :return: Response.
+        :rtype: Response
+        """
+        kwargs.setdefault('headers', self._headers)
+        timeout = kwargs.pop('timeout', self._timeout)
+        stream = kwargs.get('stream', False)
+        deadline_at = _deadline.get()
+        attempt = 0
+        hold_slot = False
+        while True:
+            self._check_deadline(route, deadline_at)
+            if self._rate_limiter:
+                waited = time.monotonic()
+                self._rate_limiter.acquire(route)
+                self._rate_limit_waited(route, waited)
+            if self._scheduler:
+                self._scheduler.acquire(route, self._remaining(deadline_at))
+            try:
+                attempt_timeout = self._allow(route, timeout, deadline_at)
+                response = self.__api_cftools_session.request(method, url, timeout=attempt_timeout, **kwargs)
+            except requests.RequestException:
+                delay = self._retry_delay(route, method, attempt, deadline_at)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(route, method, attempt, deadline_at, response)
+                if delay is None:
+                    hold_slot = stream
+                    return response
+                response.close()
+            finally:
+                if not hold_slot:
+                    self._release_slot()
+            attempt += 1
+            time.sleep(delay)
+
+    # ---------------- Streamed listings ----------------
+
+    # Iterators over the streamed listings. Entries are decoded one by one while the response is read,
+    # so memory use stays constant however big the listing is.
+
+    @check_register
+    def _iter_entries(self, route, url, params, chunk_size, model=None):
+        return self.__stream_entries(route, url, params, chunk_size, model)
+
+    def __stream_entries(self, route, url, params, chunk_size, model=None):
+        """
+        Streams entries of a listing, following a pagination cursor if the API returns one.
+        Entries are wrapped into the model if one is given.
+
+        :return: Generator of entries.
+        :rtype: generator
+        """
+        while True:
+            meta = {}
+            response = self.__send(route, 'GET', url, params=params, stream=True)
+            try:
+                with response:
+                    response.raise_for_status()
+                    entries = _iter_json_entries(response.iter_content(chunk_size), meta=meta)
+                    yield from entries if model is None else map(model, entries)
+            finally:
+                self._release_slot()
+            if not meta.get('cursor'):
+                return
+            params = {**params, 'cursor': meta['cursor']}
+
+    def warm_up(self, connections=2):
+        """
+        Opens connections to the api ahead of the first requests, so they don't pay for TCP and TLS handshakes.
+
+        :param connections: Number of connections, e.g. the number of threads calling the api.
+        :type connections: int
+        :return: Number of connections opened, 0 if the transport is not a PooledTransport.
+        :rtype: int
+        """
+        adapter = self.__api_cftools_session.get_adapter(self._public_api_url)
+        if not isinstance(adapter, PooledTransport):
+            return 0
+        return adapter.warm_up(self._public_api_url, connections)
+
+    def connection_stats(self):
+        """
+        :return: PooledTransport.stats() of the transport serving the api url, None for other transports.
+        :rtype: dict
+        """
+        adapter = self.__api_cftools_session.get_adapter(self._public_api_url)
+        return adapter.stats() if isinstance(adapter, PooledTransport) else None
+
+    def close(self):
+        """
+        Method to close a session. A session passed to the constructor is left open, the transport is closed.
+        """
+        self.stop_token_refresher()
+        if self.__own_session:
+            self.__api_cftools_session.close()
+        elif self.__transport is not None:
+            self.__transport.close()
+
+
+class AsyncCfToolsApi(_BaseCfToolsApi):
+    def __init__(self, app_id, app_secret, game_identifier, ip, game_port, server_api_id, server_banlist_id,
+                 auth_token_filename='token.raw', pycftools_debug=False, timestamp_delta=43200,
+                 max_connections=100, rate_limiter=None, token_store=None, background_token_refresh=False,
+                 token_refresh_ahead=600, api_url='https://data.cftools.cloud', response_cache=None,
+                 single_flight=None, client=None, retrier=None, timeout=(3.05, 30), circuit_breaker=None,
+                 scheduler=None, metrics=None, max_keepalive_connections=None, keepalive_expiry=55.0, http2=False):
+        """
+        Class AsyncCfToolsApi is the asyncio twin of CfToolsApi.
+        It exposes the same api methods, but every method is a coroutine running over a pooled httpx.AsyncClient,
+        so hundreds of requests can be in flight on a single event loop.
+
+        Note:
+            Requires the optional httpx dependency - pip install httpx
+            The token store is the same as in CfToolsApi, so both clients can share one token file.
+
+        :param app_id: Application Id from https://developer.cftools.cloud/applications
+        :type app_id: str
+        :param app_secret: Application secret from https://developer.cftools.cloud/applications
+        :type app_secret: str
+        :param game_identifier: Game_identifier is needed to create server id.
+        :type game_identifier: str
+        :param ip: Ipv4 is needed to create server id.
+        :type ip: str
+        :param game_port: Game_port is needed to create server id.
+        :type game_port: str
+        :param server_api_id: Server_api_id this is the global server identifier and it can be found in the server API settings.
+        :type server_api_id: str
+        :param server_banlist_id: Server_banlist_id is global banlist identifier, it can be found in ban-manager https://app.cftools.cloud/ban-manager - see for Banlist ID.
+        :type server_banlist_id: str
+        :param auth_token_filename: Auth_token_filename this is the filename var for auth token file.
+        :type auth_token_filename: str
+        :param pycftools_debug: This is the variable for enabling debug outputs from the program.
+        :type pycftools_debug: bool
+        :param timestamp_delta: This is the time offset delta when the token in the file needs to be updated. By default, the value is set to half a day - 43200. UNIXTIMESTAMP
+        :type timestamp_delta: int
+        :param max_connections: Maximum number of pooled connections kept by the async http client.
+        :type max_connections: int
+        :param rate_limiter: RateLimiter pacing calls by the documented CFTools quotas. By default, a new one is created. Pass False to disable.
+        :type rate_limiter: RateLimiter
+        :param token_store: TokenStore keeping the bearer token, may be shared between processes. By default, FileTokenStore(auth_token_filename).
+        :type token_store: TokenStore
+        :param background_token_refresh: Renew the token in a background task ahead of its deadline, so api calls never wait for re-auth. The task is started by the first api call.
+        :type background_token_refresh: bool
+        :param token_refresh_ahead: How many seconds before the timestamp_delta deadline the background refresh happens.
+        :type token_refresh_ahead: int
+        :param api_url: Base url of the CFTools Data API, can point to a proxy or a local stub server.
+        :type api_url: str
+        :param response_cache: ResponseCache for read routes. By default, responses are not cached.
+        :type response_cache: ResponseCache
+        :param single_flight: SingleFlight collapsing identical concurrent GET requests into one. By default, a new one is created. Pass False to disable.
+        :type single_flight: SingleFlight
+        :param retrier: Retrier with retry policies per route. By default, Retrier() - 429 is retried for all requests, transport errors and 5xx for idempotent ones. Pass False to disable.
+        :type retrier: Retrier
+        :param timeout: Default timeout of every request, seconds or (connect, read) tuple. None waits forever. See deadline() for budgets per call.
+        :type timeout: tuple
+        :param circuit_breaker: CircuitBreaker failing fast on degraded routes. By default, a new one is created. Pass False to disable.
+        :type circuit_breaker: CircuitBreaker
+        :param scheduler: RequestScheduler limiting requests in flight and serving moderation before background reads. By default, requests are not scheduled.
+        :type scheduler: RequestScheduler
+        :param metrics: Metrics collecting latency histograms, counters and spans of the requests. By default, nothing is collected.
+        :type metrics: Metrics
+        :param client: httpx.AsyncClient to send requests with, may be shared by several clients. By default, a new one is created and closed by close().
+        :type client: httpx.AsyncClient
+        :param max_keepalive_connections: Idle connections kept open for reuse. By default, max_connections.
+        :type max_keepalive_connections: int
+        :param keepalive_expiry: Seconds an idle connection is kept before it is closed.
+        :type keepalive_expiry: float
+        :param http2: Multiplex requests over HTTP/2 connections, needs the h2 package: pip install httpx[http2]
+        :type http2: bool
+        """
+
+        if httpx is None:
+            raise ImportError('AsyncCfToolsApi requires httpx, install it with: pip install httpx')
+
+        super().__init__(app_id, app_secret, game_identifier, ip, game_port, server_api_id, server_banlist_id,
+                         auth_token_filename, pycftools_debug, timestamp_delta, rate_limiter, token_store,
+                         token_refresh_ahead, api_url, response_cache, single_flight, retrier, timeout,
+                         circuit_breaker, scheduler, metrics)
+
+        self.__own_client = client is None
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections if max_keepalive_connections is None
+                                    else max_keepalive_connections,
+                                    keepalive_expiry=keepalive_expiry),
+                http2=http2)
+        self.__api_cftools_client = client
+        self.__connection_counts = collections.Counter()
+
+        # Created lazily, so the object can be built outside of a running event loop.
+        self.__token_lock = None
+        self.__background_token_refresh = background_token_refresh
+        self.__token_refresher = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    # ---------------- Save/load tokens ----------------
+
+    def check_register(wmethod):
+        """
+        Async replacement of CfToolsApi.check_register.
+        Makes sure there is an up-to-date authorization token before the wrapped coroutine is awaited.
+
+        Note:
+            The token state is guarded by an asyncio.Lock and the refresh lock of the token store,
+            so when many coroutines (or processes) find an outdated token at once - only one of them registers a new one,
+            the others wait for it and reuse the result. Auth endpoint is limited to 2 requests per minute.
+
+            Errors are not swallowed and propagate to the caller.
+
+        :return: Result of the wrapped coroutine.
+        """
+
+        @wraps(wmethod)
+        async def wrapper(*args, **kwargs):
+            self = args[0]
+            if not self._token_valid:
+                await self.__ensure_auth_bearer_token()
+            return await wmethod(*args, **kwargs)
+
+        return wrapper
+
+    async def __ensure_auth_bearer_token(self):
+        """
+        Body of check_register, makes sure the token in memory is up to date.
+        """
+        if self._token_valid:
+            # Background refresher keeps the token up to date, nothing to check.
+            return
+        # Fast path, token is in memory and still valid - no locking, no store access.
+        if self._token_timestamp is None or self._check_token_timestamp(self._token_timestamp):
+            if self.__token_lock is None:
+                self.__token_lock = asyncio.Lock()
+            async with self.__token_lock:
+                await self.__refresh_auth_bearer_token()
+        if self.__background_token_refresh and self.__token_refresher is None:
+            self.__token_refresher = asyncio.create_task(self.__token_refresher_loop())
+
+    async def __refresh_auth_bearer_token(self, ahead=0):
+        """
+        Loads token from the token store, registers a new one if it is missing or outdated.
+        Must be called with the token lock held.
+        The store and its refresh lock are used from worker threads, so file or database access
+        and waiting for another process do not block the loop.
+
+        :param ahead: Treat the token as outdated this many seconds before its deadline.
+        :type ahead: int
+        """
+        print(f'|| {datetime.datetime.now()} || Cf tools auth...') if self._pycftools_debug else None
+        if self._token_timestamp is not None and not self._check_token_timestamp(self._token_timestamp, ahead):
+            # Another coroutine refreshed the token while we were waiting for the lock.
+            return
+
+        to_load_data = await asyncio.to_thread(self._token_store.load)
+        if self._token_outdated(to_load_data, ahead):
+            refresh_lock = self._token_store.refresh_lock()
+            await _acquire_in_thread(refresh_lock)
+            try:
+                # Someone else may have refreshed the token while we were waiting for the lock.
+                to_load_data = await asyncio.to_thread(self._token_store.load)
+                if self._token_outdated(to_load_data, ahead):
+                    print(f'|| {datetime.datetime.now()} || Registering new token') if self._pycftools_debug else None
+                    route, method, url, kwargs = self._registration()
+                    to_load_data = self._registered_token(await self.__send(route, method, url, **kwargs))
+                    await asyncio.to_thread(self._token_store.save, to_load_data['token'], to_load_data['timestamp'])
+            finally:
+                refresh_lock.release()
+        self._use_token(to_load_data)
+
+    async def __token_refresher_loop(self):
+        """
+        Background task renewing the token token_refresh_ahead seconds before its deadline.
+        If a renewal fails it is retried every 30 seconds, and api calls fall back to the usual
+        check_register behaviour - they register a new token themselves once the deadline passes.
+        """
+        while True:
+            try:
+                async with self.__token_lock:
+                    await self.__refresh_auth_bearer_token(self._token_refresh_ahead)
+                delay = self._refreshed()
+            except Exception as err:
+                delay = self._refresh_failed(err)
+            await asyncio.sleep(max(delay, 1))
+
+    # ---------------- Save/load tokens End ----------------
+
+    @check_register
+    async def _call(self, route, method, url, **kwargs):
+        return await self.__request(route, method, url, **kwargs)
+
+    async def __request(self, route, method, url, **kwargs):
+        """
+        Sends a request with the current auth headers through the pooled client, or serves it from the response cache.
+        Identical concurrent GET requests are collapsed into one by the single flight.
+
+        :param route: Route name, the same as the api method name.
+        :type route: str
+        :return: Response.
+        :rtype: httpx.Response
+        """
+        if method != 'GET':
+            response = await self.__send(route, method, url, **kwargs)
+            if response.is_success:
+                self._written(route, kwargs.get('data'), response)
+            return response
+
+        request_key, response = self._cached(route, url, kwargs.get('params'))
+        if response is not None:
+            return response
+        if self._single_flight:
+            response = await self._single_flight.do_async(request_key, self.__send, route, method, url, **kwargs)
+        else:
+            response = await self.__send(route, method, url, **kwargs)
+        self._cache(route, request_key, response)
+        return response
+
+    async def __send(self, route, method, url, **kwargs):
+        """
+        Sends a request, recorded by the metrics if there are any.
+
+        :return: Response.
+        :rtype: httpx.Response
+        """
+        if self._metrics is None:
+            return await self.__send_attempts(route, method, url, **kwargs)
+        token = self._metrics.start_request(route, method, url, kwargs)
+        try:
+            response = await self.__send_attempts(route, method, url, **kwargs)
+        except Exception as err:
+            self._metrics.end_request(token, error=err)
+            raise
+        self._metrics.end_request(token, response)
+        return response
+
+    async def __send_attempts(self, route, method, url, **kwargs):
+        """
+        Sends a request, paced by the rate limiter, guarded by the circuit breaker and retried by the retrier,
+        all within the deadline() budget if one is set.
+        With stream=True the body is not read, the caller reads it and closes the response with aclose(),
+        then releases the scheduler slot held until then with _release_slot().
+
+        :return: Response.
+        :rtype: httpx.Response
+        """
+        kwargs.setdefault('headers', self._headers)
+        timeout = kwargs.pop('timeout', self._timeout)
+        stream = kwargs.pop('stream', False)
+        deadline_at = _deadline.get()
+        attempt = 0
+        hold_slot = False
+        while True:
+            self._check_deadline(route, deadline_at)
+            if self._rate_limiter:
+                waited = time.monotonic()
+                await self._rate_limiter.acquire_async(route)
+                self._rate_limit_waited(route, waited)
+            if self._scheduler:
+                await self._scheduler.acquire_async(route, self._remaining(deadline_at))
+            try:
+                attempt_timeout = self._allow(route, timeout, deadline_at)
+                request = self.__api_cftools_client.build_request(method, url, timeout=_httpx_timeout(attempt_timeout),
+                                                                  extensions={'trace': self.__trace}, **kwargs)
+                response = await self.__api_cftools_client.send(request, stream=stream)
+            except httpx.TransportError:
+                delay = self._retry_delay(route, method, attempt, deadline_at)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(route, method, attempt, deadline_at, response)
+                if delay is None:
+                    hold_slot = stream
+                    return response
+                await response.aclose()
+            finally:
+                if not hold_slot:
+                    self._release_slot()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    # ---------------- Streamed listings ----------------
+
+    async def _iter_entries(self, route, url, params, chunk_size, model=None):
+        """
+        Streams entries of a listing, following a pagination cursor if the API returns one.
+        Entries are wrapped into the model if one is given.
+
+        :return: Async generator of entries.
+        :rtype: async_generator
+        """
+        await self.__ensure_auth_bearer_token()
+        while True:
+            meta = {}
+            response = await self.__send(route, 'GET', url, params=params, stream=True)
+            try:
+                response.raise_for_status()
+                async for entry in _aiter_json_entries(response.aiter_bytes(chunk_size), meta=meta):
+                    yield entry if model is None else model(entry)
+            finally:
+                await response.aclose()
+                self._release_slot()
+            if not meta.get('cursor'):
+                return
+            params = {**params, 'cursor': meta['cursor']}
+
+    async def __trace(self, event, info):
+        """
+        httpcore trace hook counting requests, new connections and TLS handshakes.
+        """
+        if event == 'connection.connect_tcp.complete':
+            self.__connection_counts['connections'] += 1
+        elif event == 'connection.start_tls.complete':
+            self.__connection_counts['tls_handshakes'] += 1
+        elif event == 'http11.send_request_headers.started':
+            self.__connection_counts['requests'] += 1
+        elif event == 'http2.send_request_headers.started':
+            self.__connection_counts['requests'] += 1
+            self.__connection_counts['http2_requests'] += 1
+
+    async def warm_up(self, connections=2):
+        """
+        Opens connections to the api ahead of the first requests, with concurrent HEAD requests to the api root.
+        Over HTTP/2 they share one connection.
+
+        :param connections: Number of connections.
+        :type connections: int
+        :return: Number of connections opened.
+        :rtype: int
+        """
+        opened = self.__connection_counts['connections']
+
+        async def head():
+            try:
+                await self.__api_cftools_client.head(self._public_api_url + '/', timeout=_httpx_timeout(self._timeout),
+                                                     extensions={'trace': self.__trace})
+            except httpx.TransportError:
+                pass
+
+        await asyncio.gather(*[head() for _ in range(connections)])
+        return self.__connection_counts['connections'] - opened
+
+    def connection_stats(self):
+        """
+        :return: Connection reuse statistics: requests, connections (opened), tls_handshakes, http2_requests,
+            reused, reuse_ratio.
+        :rtype: dict
+        """
+        stats = {name: self.__connection_counts[name]
+                 for name in ('requests', 'connections', 'tls_handshakes', 'http2_requests')}
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        stats['reuse_ratio'] = stats['reused'] / stats['requests'] if stats['requests'] else 0.0
+        return stats
+
+    async def close(self):
+        """
+        Method to close the pooled async client. A client passed to the constructor is left open.
+        """
+        if self.__token_refresher is not None:
+            self.__token_refresher.cancel()
+            self.__token_refresher = None
+            self._token_valid = False
+        if self.__own_client:
+            await self.__api_cftools_client.aclose()
+
+
+def _parse_expires_at(expires_at):
+    """
+    :param expires_at: Expiration as returned by the API (ISO 8601 string), datetime, unix timestamp or None.
+    :return: Unix timestamp, or None for a permanent entry.
+    :rtype: float
+    """
+    if expires_at is None or expires_at == '':
+        return None
+    if isinstance(expires_at, (int, float)):
+        return float(expires_at)
+    if isinstance(expires_at, datetime.datetime):
+        return expires_at.timestamp()
+    return datetime.datetime.fromisoformat(str(expires_at).replace('Z', '+00:00')).timestamp()
+
+
+class BanlistMirror(object):
+    def __init__(self, cfapi=None, sync=True):
+        """
+        Local in-memory mirror of the banlist, so a ban check is a dict lookup instead of a server_banlist() call.
+
+        Bans are indexed by cftools_id in a hash map, IPv4 bans in a trie by octets where an asterisk octet
+        matches any value ("1.2.*.*"). Expired bans are dropped lazily by their expiration time.
+        When a client is given, bans and unbans made through it are applied to the mirror right away;
+        if one can't be applied, the mirror is marked stale until the next sync.
+        Call sync() (sync_async() for AsyncCfToolsApi) periodically to pick up changes made elsewhere.
+
+        :param cfapi: CfToolsApi or AsyncCfToolsApi to sync from and to follow writes of.
+        :param sync: Load the banlist right away, only for CfToolsApi.
+        :type sync: bool
+        """
+        self.__cfapi = cfapi
+        self.__lock = threading.RLock()
+        self.__by_id = {}
+        self.__by_cftools_id = {}
+        self.__ipv4_trie = {}
+        # Bans with wildcards inside of an octet ("1.2.3.1*"), matched one by one.
+        self.__ipv4_patterns = []
+        # Heap of (expires timestamp, ban key).
+        self.__expiry_heap = []
+        self.__pending_counter = 0
+        self.last_sync = None
+        # True when a followed write could not be applied, sync() clears it.
+        self.stale = False
+        self.last_error = None
+        if cfapi is not None:
+            cfapi.add_write_listener(self.on_write)
+            if sync and not isinstance(cfapi, AsyncCfToolsApi):
+                self.sync()
+
+    def __len__(self):
+        return len(self.__by_id)
+
+    def add(self, ban):
+        """
+        Adds a ban entry to the mirror. Entries without an id (e.g. just issued by server_ban) get a local one,
+        the next sync() replaces them with the real entries.
+
+        :param ban: Ban dict with identifier, optional format, id and expires_at.
+        :type ban: dict
+        """
+        expires = _parse_expires_at(ban.get('expires_at'))
+        if expires is not None and expires <= time.time():
+            if ban.get('id') is not None:
+                self.remove(ban['id'])
+            return
+        with self.__lock:
+            key = ban.get('id')
+            if key is None:
+                self.__pending_counter += 1
+                key = f'pending-{self.__pending_counter}'
+            if key in self.__by_id:
+                self.remove(key)
+            identifier = str(ban['identifier'])
+            frmt = _ban_format(ban)
+            self.__by_id[key] = (ban, frmt, identifier, expires)
+            if frmt == 'ipv4':
+                octets = identifier.split('.')
+                if any('*' in octet and octet != '*' for octet in octets):
+                    self.__ipv4_patterns.append((key, identifier))
+                else:
+                    node = self.__ipv4_trie
+                    for octet in octets:
+                        node = node.setdefault(octet, {})
+                    node.setdefault(None, {})[key] = ban
+            else:
+                self.__by_cftools_id.setdefault(identifier, {})[key] = ban
+            if expires is not None:
+                heapq.heappush(self.__expiry_heap, (expires, key))
+
+    def remove(self, ban_id):
+        """
+        Removes a ban from the mirror.
+
+        :param ban_id: Ban id.
+        :type ban_id: str
+        :return: True if the ban was in the mirror.
+        :rtype: bool
+        """
+        with self.__lock:
+            entry = self.__by_id.pop(ban_id, None)
+            if entry is None:
+                return False
+            ban, frmt, identifier, expires = entry
+            if frmt == 'ipv4':
+                self.__ipv4_patterns = [item for item in self.__ipv4_patterns if item[0] != ban_id]
+                node = self.__ipv4_trie
+                for octet in identifier.split('.'):
+                    node = node.get(octet)
+                    if node is None:
+                        break
+                else:
+                    node.get(None, {}).pop(ban_id, None)
+            else:
+                bans = self.__by_cftools_id.get(identifier)
+                if bans is not None:
+                    bans.pop(ban_id, None)
+                    if not bans:
+                        del self.__by_cftools_id[identifier]
+            return True
+
+    def __evict_expired(self):
+        now = time.time()
+        if not self.__expiry_heap or self.__expiry_heap[0][0] > now:
+            return
+        with self.__lock:
+            while self.__expiry_heap and self.__expiry_heap[0][0] <= now:
+                expires, key = heapq.heappop(self.__expiry_heap)
+                entry = self.__by_id.get(key)
+                # The ban may have been replaced by one with another expiration.
+                if entry is not None and entry[3] == expires:
+                    self.remove(key)
+
+    def __match_ipv4(self, node, octets, index):
+        if index == len(octets):
+            bans = node.get(None)
+            return next(iter(bans.values())) if bans else None
+        for octet in (octets[index], '*'):
+            child = node.get(octet)
+            if child is not None:
+                ban = self.__match_ipv4(child, octets, index + 1)
+                if ban is not None:
+                    return ban
+        return None
+
+    def is_banned(self, cftools_id=None, ipv4=None):
+        """
+        Checks a player against the mirror.
+
+        :param cftools_id: A CFTools account id.
+        :type cftools_id: str
+        :param ipv4: Player IPv4 address.
+        :type ipv4: str
+        :return: Matching active ban dict, or None if not banned.
+        :rtype: dict
+        """
+        self.__evict_expired()
+        # Under the lock, a concurrent add() or remove() changes the indexes in place.
+        with self.__lock:
+            if cftools_id is not None:
+                bans = self.__by_cftools_id.get(cftools_id)
+                if bans:
+                    return next(iter(bans.values()))
+            if ipv4 is not None:
+                ban = self.__match_ipv4(self.__ipv4_trie, ipv4.split('.'), 0)
+                if ban is not None:
+                    return ban
+                for key, pattern in self.__ipv4_patterns:
+                    if fnmatch.fnmatchcase(ipv4, pattern):
+                        return self.__by_id[key][0]
+        return None
+
+    def load(self, bans):
+        """
+        Replaces the content of the mirror with the given bans.
+        The new indexes are built aside and swapped in at once, so lookups never see a half loaded mirror.
+
+        :param bans: Iterable of ban dicts.
+        :type bans: iterable
+        """
+        fresh = BanlistMirror()
+        for ban in bans:
+            self.__add_listed(fresh, ban)
+        self.__swap(fresh)
+
+    def __add_listed(self, mirror, ban):
+        """
+        Adds a listed ban to the mirror. A ban with an unparsable expires_at is skipped and kept in last_error,
+        so one bad entry does not abort the whole load or sync.
+        """
+        try:
+            mirror.add(ban)
+        except ValueError as err:
+            self.last_error = err
+
+    def __swap(self, fresh):
+        with self.__lock:
+            self.__by_id = fresh.__by_id
+            self.__by_cftools_id = fresh.__by_cftools_id
+            self.__ipv4_trie = fresh.__ipv4_trie
+            self.__ipv4_patterns = fresh.__ipv4_patterns
+            self.__expiry_heap = fresh.__expiry_heap
+            self.last_sync = time.time()
+            self.stale = False
+
+    def __merge(self, ban, seen):
+        """
+        Applies a listed ban if it is new or changed.
+        """
+        key = ban.get('id')
+        if key is not None:
+            seen.add(key)
+            entry = self.__by_id.get(key)
+            if entry is not None and entry[0] == ban:
+                return
+        self.__add_listed(self, ban)
+
+    def __drop_unseen(self, seen):
+        """
+        Removes bans missing from the listing, e.g. revoked elsewhere or pending ones now listed with a real id.
+        """
+        with self.__lock:
+            for key in [key for key in self.__by_id if key not in seen]:
+                self.remove(key)
+            self.last_sync = time.time()
+            self.stale = False
+
+    def sync(self):
+        """
+        Streams the banlist from CfToolsApi.iter_bans() and applies only the differences:
+        new and changed bans are added, bans missing from the listing are removed.
+        The API has no change feed, so the whole listing is read, but the indexes are not rebuilt.
+        """
+        seen = set()
+        for ban in self.__cfapi.iter_bans():
+            self.__merge(ban, seen)
+        self.__drop_unseen(seen)
+
+    async def sync_async(self):
+        """
+        sync() for AsyncCfToolsApi.
+        """
+        seen = set()
+        async for ban in self.__cfapi.iter_bans():
+            self.__merge(ban, seen)
+        self.__drop_unseen(seen)
+
+    def on_write(self, route, payload, response):
+        """
+        Write listener of the client, applies bans and unbans to the mirror.
+        The write has already succeeded, so a ban that can't be applied (e.g. an unparsable expires_at)
+        marks the mirror stale instead of raising to the caller.
+        """
+        try:
+            if route == 'server_ban':
+                self.add({
+                    'format': payload['format'],
+                    'identifier': payload['identifier'],
+                    'expires_at': payload['expires_at'],
+                    'reason': payload['reason']
+                })
+            elif route == 'server_unban':
+                self.remove(payload['ban_id'])
+        except Exception as err:
+            self.stale = True
+            self.last_error = err
+
+
+class PlayerEvent(object):
+    __slots__ = ('kind', 'gamesession_id', 'session', 'previous')
+
+    def __init__(self, kind, gamesession_id, session, previous=None):
+        """
+        Change of the player list.
+
+        :param kind: PlayerFeed.JOIN, PlayerFeed.LEAVE or PlayerFeed.UPDATE.
+        :param gamesession_id: Gamesession id of the player.
+        :param session: Session entry of server_player_list(), for leave the last seen one.
+        :param previous: Previous session entry, for update only.
+        """
+        self.kind = kind
+        self.gamesession_id = gamesession_id
+        self.session = session
+        self.previous = previous
+
+    def __repr__(self):
+        return f'PlayerEvent(kind={self.kind!r}, gamesession_id={self.gamesession_id!r})'
+
+
+class PlayerFeed(object):
+    JOIN = 'join'
+    LEAVE = 'leave'
+    UPDATE = 'update'
+
+    def __init__(self, cfapi, on_join=None, on_leave=None, on_update=None, fields=None,
+                 min_interval=5.0, max_interval=60.0, emit_initial=False, on_error=None):
+        """
+        Change feed of the player list. Polls server_player_list(), keeps a snapshot keyed by gamesession_id
+        and turns every poll into join / leave / update events, delivered to the callbacks,
+        returned by poll() or yielded by the async iterator.
+
+        An unchanged response body is not decoded at all, a changed one is compared in one pass of dict lookups.
+        The poll interval follows the observed change rate, aiming at about one change per poll:
+        busy servers are polled every min_interval seconds, quiet ones down to every max_interval seconds.
+
+        Example:
+            feed = pycftools.PlayerFeed(cfapi, on_join=lambda event: print(event.session))
+            feed.start()
+
+            async for event in pycftools.PlayerFeed(async_cfapi):
+                ...
+
+        :param cfapi: CfToolsApi, or AsyncCfToolsApi for poll_async() and the async iterator.
+        :param on_join: Callable on_join(event).
+        :param on_leave: Callable on_leave(event).
+        :param on_update: Callable on_update(event).
+        :param fields: Keys of a session entry compared for updates, None compares whole entries.
+        :type fields: tuple
+        :param min_interval: Shortest poll interval in seconds.
+        :type min_interval: float
+        :param max_interval: Longest poll interval in seconds.
+        :type max_interval: float
+        :param emit_initial: Emit joins for the players found by the first poll.
+        :type emit_initial: bool
+        :param on_error: Callable on_error(err) for a failed poll of the start() thread, which keeps polling.
+            The last error is kept in last_error either way.
+        """
+        self.__cfapi = cfapi
+        self.__callbacks = {self.JOIN: on_join, self.LEAVE: on_leave, self.UPDATE: on_update}
+        self.__on_error = on_error
+        self.last_error = None
+        self.__fields = fields
+        self.__min_interval = min_interval
+        self.__max_interval = max_interval
+        self.__emit_initial = emit_initial
+        self.__snapshot = None
+        self.__last_body = None
+        self.__last_poll = None
+        # Exponentially weighted changes per second.
+        self.__change_rate = 0.0
+        self.interval = min_interval
+        self.__lock = threading.Lock()
+        self.__poller = None
+        self.__poller_stop = threading.Event()
+
+    @property
+    def players(self):
+        """
+        :return: Dict gamesession_id -> session entry of the last poll.
+        :rtype: dict
+        """
+        return dict(self.__snapshot or {})
+
+    @staticmethod
+    def __sessions(data):
+        sessions = data.get('sessions', data.get('players', [])) if isinstance(data, dict) else data
+        return {session.get('id', session.get('gamesession_id')): session for session in sessions or []}
+
+    def __changed(self, old, new):
+        if self.__fields is None:
+            return old != new
+        return any(old.get(field) != new.get(field) for field in self.__fields)
+
+    def apply(self, sessions):
+        """
+        Applies a fresh player list to the snapshot and dispatches the events.
+
+        :param sessions: Dict gamesession_id -> session entry.
+        :type sessions: dict
+        :return: List of PlayerEvent.
+        :rtype: list
+        """
+        with self.__lock:
+            previous, self.__snapshot = self.__snapshot, sessions
+        if previous is None:
+            events = [PlayerEvent(self.JOIN, gs_id, session) for gs_id, session in sessions.items()] \
+                if self.__emit_initial else []
+        else:
+            events = []
+            for gs_id, session in sessions.items():
+                old = previous.get(gs_id)
+                if old is None:
+                    events.append(PlayerEvent(self.JOIN, gs_id, session))
+                elif self.__changed(old, session):
+                    events.append(PlayerEvent(self.UPDATE, gs_id, session, old))
+            events.extend(PlayerEvent(self.LEAVE, gs_id, session)
+                          for gs_id, session in previous.items() if gs_id not in sessions)
+        self.__adapt(len(events))
+        for event in events:
+            callback = self.__callbacks[event.kind]
+            if callback is not None:
+                callback(event)
+        return events
+
+    def __adapt(self, changes):
+        now = time.monotonic()
+        elapsed, self.__last_poll = (now - self.__last_poll if self.__last_poll else None), now
+        if not elapsed:
+            return
+        self.__change_rate = 0.7 * self.__change_rate + 0.3 * changes / elapsed
+        interval = 1 / self.__change_rate if self.__change_rate else self.__max_interval
+        self.interval = min(max(interval, self.__min_interval), self.__max_interval)
+
+    def __apply_response(self, response):
+        response.raise_for_status()
+        body = response.content
+        if body == self.__last_body:
+            self.__adapt(0)
+            return []
+        self.__last_body = body
+        return self.apply(self.__sessions(response.json()))
+
+    def poll(self):
+        """
+        Polls CfToolsApi.server_player_list() once.
+
+        :return: List of PlayerEvent.
+        :rtype: list
+        """
+        return self.__apply_response(self.__cfapi.server_player_list())
+
+    async def poll_async(self):
+        """
+        Polls AsyncCfToolsApi.server_player_list() once.
+
+        :return: List of PlayerEvent.
+        :rtype: list
+        """
+        return self.__apply_response(await self.__cfapi.server_player_list())
+
+    async def events(self):
+        """
+        Polls forever, every interval seconds.
+
+        :return: Async generator of PlayerEvent.
+        :rtype: async_generator
+        """
+        while True:
+            for event in await self.poll_async():
+                yield event
+            await asyncio.sleep(self.interval)
+
+    def __aiter__(self):
+        return self.events()
+
+    def start(self):
+        """
+        Starts a daemon thread polling CfToolsApi every interval seconds and dispatching the callbacks.
+        """
+        if self.__poller is not None and self.__poller.is_alive():
+            return
+        self.__poller_stop.clear()
+        self.__poller = threading.Thread(target=self.__poller_loop, name='pycftools-player-feed', daemon=True)
+        self.__poller.start()
+
+    def stop(self):
+        """
+        Stops the polling thread.
+        """
+        self.__poller_stop.set()
+        if self.__poller is not None:
+            self.__poller.join()
+            self.__poller = None
+
+    def __poller_loop(self):
+        while not self.__poller_stop.is_set():
+            try:
+                self.poll()
+            except Exception as err:
+                self.last_error = err
+                if self.__on_error is not None:
+                    self.__on_error(err)
+            self.__poller_stop.wait(self.interval)
+
+
+class StatsRecorder(object):
+    # Bucket sizes in seconds, 0 - raw samples.
+    RESOLUTIONS = (0, 60, 3600, 86400)
+    # Seconds every resolution is kept for, None - forever.
+    DEFAULT_RETENTION = {0: 2 * 86400, 60: 14 * 86400, 3600: 180 * 86400, 86400: None}
+
+    def __init__(self, cfapi=None, filename='pycftools_stats.sqlite3', routes=('server_statistics', 'server_info'),
+                 retention=None, on_error=None):
+        """
+        Time series of server_statistics() and server_info() in a local SQLite database.
+
+        Every numeric field of a response is a metric named by its path ("server_info.server.status.players").
+        A sample is written as a raw point and folded into 1m / 1h / 1d buckets (count, sum, min, max) right away,
+        so no separate rollup job is needed. Points older than the retention of their resolution are pruned
+        about once an hour. query() returns array-backed series, picking a resolution which fits the range.
+
+        Example:
+            recorder = pycftools.StatsRecorder(cfapi)
+            recorder.start(interval=60)
+            timestamps, values = recorder.query('server_info.server.status.players', start=time.time() - 7 * 86400)
+
+        :param cfapi: CfToolsApi, or AsyncCfToolsApi for sample_async(). Not needed to only query.
+        :param filename: Database file name.
+        :type filename: str
+        :param routes: Api methods sampled by sample().
+        :type routes: tuple
+        :param retention: Dict resolution -> seconds to keep, merged over DEFAULT_RETENTION.
+        :type retention: dict
+        :param on_error: Callable on_error(err) for a failed sample of the start() thread, which keeps sampling.
+            The last error is kept in last_error either way.
+        """
+        self.__cfapi = cfapi
+        self.__routes = routes
+        self.__on_error = on_error
+        self.last_error = None
+        self.__retention = {**self.DEFAULT_RETENTION, **(retention or {})}
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        with self.__connection:
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS pycftools_metric '
+                                      '(id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS pycftools_series '
+                                      '(resolution INTEGER NOT NULL, metric INTEGER NOT NULL, bucket INTEGER NOT NULL, '
+                                      'count INTEGER NOT NULL, sum REAL NOT NULL, min REAL NOT NULL, max REAL NOT NULL, '
+                                      'PRIMARY KEY (resolution, metric, bucket)) WITHOUT ROWID')
+        self.__metric_ids = dict((name, metric_id) for metric_id, name in
+                                 self.__connection.execute('SELECT id, name FROM pycftools_metric'))
+        self.__last_prune = 0
+        self.__sampler = None
+        self.__sampler_stop = threading.Event()
+
+    def __metric_id(self, name):
+        metric_id = self.__metric_ids.get(name)
+        if metric_id is None:
+            self.__connection.execute('INSERT OR IGNORE INTO pycftools_metric (name) VALUES (?)', (name,))
+            metric_id = self.__connection.execute('SELECT id FROM pycftools_metric WHERE name = ?',
+                                                  (name,)).fetchone()[0]
+            self.__metric_ids[name] = metric_id
+        return metric_id
+
+    def record(self, route, data, timestamp=None):
+        """
+        Records all numeric fields of a decoded response as one sample.
+
+        :param route: Route name, the prefix of the metric names.
+        :type route: str
+        :param data: Decoded json of the response.
+        :type data: dict
+        :param timestamp: Unix time of the sample, now by default.
+        :type timestamp: float
+        :return: Number of recorded metrics.
+        :rtype: int
+        """
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        with self.__lock, self.__connection:
+            rows = []
+            for name, value in _flatten_numbers(data, route):
+                metric_id = self.__metric_id(name)
+                for resolution in self.RESOLUTIONS:
+                    bucket = timestamp - timestamp % resolution if resolution else timestamp
+                    rows.append((resolution, metric_id, bucket, value, value, value))
+            self.__connection.executemany(
+                'INSERT INTO pycftools_series (resolution, metric, bucket, count, sum, min, max) '
+                'VALUES (?, ?, ?, 1, ?, ?, ?) ON CONFLICT (resolution, metric, bucket) DO UPDATE SET '
+                'count = count + 1, sum = sum + excluded.sum, '
+                'min = MIN(min, excluded.min), max = MAX(max, excluded.max)', rows)
+        if timestamp - self.__last_prune >= 3600:
+            self.prune(timestamp)
+        return len(rows) // len(self.RESOLUTIONS)
+
+    def prune(self, now=None):
+        """
+        Deletes points older than the retention of their resolution.
+
+        :param now: Unix time to count the retention from, now by default.
+        :type now: float
+        """
+        now = time.time() if now is None else now
+        with self.__lock, self.__connection:
+            for resolution, keep in self.__retention.items():
+                if keep is not None:
+                    self.__connection.execute('DELETE FROM pycftools_series WHERE resolution = ? AND bucket < ?',
+                                              (resolution, int(now - keep)))
+            self.__last_prune = now
+
+    def metrics(self):
+        """
+        :return: Sorted names of all recorded metrics.
+        :rtype: list
+        """
+        with self.__lock:
+            return sorted(self.__metric_ids)
+
+    def query(self, metric, start=None, end=None, resolution=None, agg='avg', max_points=2000):
+        """
+        Series of one metric.
+
+        :param metric: Metric name, see metrics().
+        :type metric: str
+        :param start: Unix time of the first point, by default the oldest one.
+        :type start: float
+        :param end: Unix time of the last point, now by default.
+        :type end: float
+        :param resolution: One of RESOLUTIONS. By default, the finest one that still keeps start
+            and gives about max_points points or less.
+        :type resolution: int
+        :param agg: Value of a bucket: 'avg', 'min', 'max', 'sum' or 'count'.
+        :type agg: str
+        :param max_points: Point budget for picking the resolution.
+        :type max_points: int
+        :return: Tuple (timestamps, values), both array.array('d').
+        :rtype: tuple
+        """
+        column = {'avg': 'sum / count', 'min': 'min', 'max': 'max', 'sum': 'sum', 'count': 'count'}[agg]
+        end = time.time() if end is None else end
+        timestamps, values = array.array('d'), array.array('d')
+        with self.__lock:
+            metric_id = self.__metric_ids.get(metric)
+            if metric_id is None:
+                return timestamps, values
+            if start is None:
+                start = self.__connection.execute('SELECT MIN(bucket) FROM pycftools_series WHERE metric = ?',
+                                                  (metric_id,)).fetchone()[0] or end
+            if resolution is None:
+                resolution = self.__pick_resolution(metric_id, start, end, max_points)
+            for bucket, value in self.__connection.execute(
+                    f'SELECT bucket, {column} FROM pycftools_series WHERE resolution = ? AND metric = ? '
+                    f'AND bucket >= ? AND bucket <= ? ORDER BY bucket',
+                    (resolution, metric_id, int(start) - int(start) % max(resolution, 1), int(end))):
+                timestamps.append(bucket)
+                values.append(value)
+        return timestamps, values
+
+    def __pick_resolution(self, metric_id, start, end, max_points):
+        now = time.time()
+        for resolution in self.RESOLUTIONS[:-1]:
+            keep = self.__retention.get(resolution)
+            if keep is not None and start < now - keep:
+                continue
+            if resolution:
+                points = (end - start) / resolution
+            else:
+                points = self.__connection.execute(
+                    'SELECT COUNT(*) FROM pycftools_series WHERE resolution = 0 AND metric = ? '
+                    'AND bucket >= ? AND bucket <= ?', (metric_id, int(start), int(end))).fetchone()[0]
+            if points <= max_points:
+                return resolution
+        return self.RESOLUTIONS[-1]
+
+    def sample(self):
+        """
+        Calls every route of CfToolsApi once and records the responses.
+        """
+        timestamp = time.time()
+        for route in self.__routes:
+            response = getattr(self.__cfapi, route)()
+            response.raise_for_status()
+            self.record(route, response.json(), timestamp)
+
+    async def sample_async(self):
+        """
+        Calls every route of AsyncCfToolsApi once and records the responses.
+        """
+        timestamp = time.time()
+        for route in self.__routes:
+            response = await getattr(self.__cfapi, route)()
+            response.raise_for_status()
+            await asyncio.to_thread(self.record, route, response.json(), timestamp)
+
+    def start(self, interval=60):
+        """
+        Starts a daemon thread calling sample() every interval seconds.
+
+        :param interval: Seconds between samples.
+        :type interval: float
+        """
+        if self.__sampler is not None and self.__sampler.is_alive():
+            return
+        self.__sampler_stop.clear()
+        self.__sampler = threading.Thread(target=self.__sampler_loop, args=(interval,),
+                                          name='pycftools-stats-recorder', daemon=True)
+        self.__sampler.start()
+
+    def stop(self):
+        """
+        Stops the sampling thread.
+        """
+        self.__sampler_stop.set()
+        if self.__sampler is not None:
+            self.__sampler.join()
+            self.__sampler = None
+
+    def __sampler_loop(self, interval):
+        while not self.__sampler_stop.is_set():
+            try:
+                self.sample()
+            except Exception as err:
+                self.last_error = err
+                if self.__on_error is not None:
+                    self.__on_error(err)
+            self.__sampler_stop.wait(interval)
+
+    def close(self):
+        """
+        Stops sampling and closes the database.
+        """
+        self.stop()
+        self.__connection.close()
+
+
+class PlayerStatsHarvester(object):
+    LEADERBOARD_STATS = ('kills', 'deaths', 'playtime')
+
+    def __init__(self, cfapi, filename='pycftools_player_stats.sqlite3', max_age=86400):
+        """
+        Collects server_player_stats() of many players within the 10/minute quota.
+
+        Results are kept in a local SQLite cache with the time they were fetched, so a rerun (also after a crash)
+        only fetches entries older than max_age. Players currently online go first, then the ones never fetched,
+        then the stalest. Players found in server_leaderboard() results are cached from there and skipped,
+        one leaderboard call covers up to 100 players.
+
+        Example:
+            harvester = pycftools.PlayerStatsHarvester(cfapi)
+            harvester.merge_leaderboard()
+            harvester.harvest(all_known_cftools_ids)
+            harvester.get(cftools_id)   # {'data': {...}, 'fetched_at': ..., 'source': 'player_stats'}
+
+        :param cfapi: CfToolsApi, its rate limiter paces the requests.
+        :param filename: Database file name.
+        :type filename: str
+        :param max_age: Seconds an entry stays fresh.
+        :type max_age: float
+        """
+        self.__cfapi = cfapi
+        self.__max_age = max_age
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__connection = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        with self.__connection:
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS pycftools_player_stats '
+                                      '(cftools_id TEXT PRIMARY KEY, fetched_at REAL NOT NULL, '
+                                      'source TEXT NOT NULL, data TEXT NOT NULL)')
+
+    def __fetched_at(self):
+        with self.__lock:
+            return dict(self.__connection.execute('SELECT cftools_id, fetched_at FROM pycftools_player_stats'))
+
+    def __put(self, cftools_id, source, data, fetched_at=None):
+        with self.__lock, self.__connection:
+            self.__connection.execute('INSERT OR REPLACE INTO pycftools_player_stats '
+                                      '(cftools_id, fetched_at, source, data) VALUES (?, ?, ?, ?)',
+                                      (cftools_id, time.time() if fetched_at is None else fetched_at, source,
+                                       json.dumps(data)))
+
+    def get(self, cftools_id):
+        """
+        :return: Cached entry {'data': ..., 'fetched_at': ..., 'source': 'player_stats' or 'leaderboard'} or None.
+        :rtype: dict
+        """
+        with self.__lock:
+            row = self.__connection.execute('SELECT data, fetched_at, source FROM pycftools_player_stats '
+                                            'WHERE cftools_id = ?', (cftools_id,)).fetchone()
+        if row is None:
+            return None
+        return {'data': json.loads(row[0]), 'fetched_at': row[1], 'source': row[2]}
+
+    def items(self):
+        """
+        :return: Generator of (cftools_id, data) for all cached players.
+        :rtype: generator
+        """
+        with self.__lock:
+            rows = self.__connection.execute('SELECT cftools_id, data FROM pycftools_player_stats').fetchall()
+        for cftools_id, data in rows:
+            yield cftools_id, json.loads(data)
+
+    def is_fresh(self, cftools_id, fetched_at=None):
+        """
+        :return: True if the player has an entry younger than max_age.
+        :rtype: bool
+        """
+        if fetched_at is None:
+            entry = self.get(cftools_id)
+            fetched_at = entry and entry['fetched_at']
+        return fetched_at is not None and time.time() - fetched_at < self.__max_age
+
+    def merge_leaderboard(self, stats=LEADERBOARD_STATS, limit=100):
+        """
+        Caches the players of server_leaderboard() for every stat, so harvest() skips them.
+        Entries already fetched by server_player_stats() and still fresh are kept.
+
+        :param stats: Leaderboard stats to request, each one is a request of the 7/minute quota.
+        :type stats: tuple
+        :param limit: Players per leaderboard, 1-100.
+        :type limit: int
+        :return: Number of players cached from the leaderboards.
+        :rtype: int
+        """
+        merged = {}
+        for stat in stats:
+            response = self.__cfapi.server_leaderboard(stat, -1, limit)
+            response.raise_for_status()
+            for entry in response.json().get('leaderboard', []):
+                cftools_id = entry.get('cftools_id')
+                if cftools_id is not None:
+                    merged.setdefault(cftools_id, {}).update(entry)
+        cached = 0
+        for cftools_id, data in merged.items():
+            entry = self.get(cftools_id)
+            if entry is not None and entry['source'] == 'player_stats' and self.is_fresh(cftools_id,
+                                                                                      entry['fetched_at']):
+                continue
+            self.__put(cftools_id, 'leaderboard', data)
+            cached += 1
+        return cached
+
+    def online_players(self):
+        """
+        :return: cftools_ids of the players in server_player_list().
+        :rtype: list
+        """
+        response = self.__cfapi.server_player_list()
+        response.raise_for_status()
+        data = response.json()
+        sessions = data.get('sessions', []) if isinstance(data, dict) else data
+        return [session['cftools_id'] for session in sessions if session.get('cftools_id')]
+
+    def plan(self, cftools_ids=(), include_online=True):
+        """
+        Players harvest() would fetch, in order: online ones, never fetched ones, then the stalest first.
+
+        :param cftools_ids: Players to keep fresh besides the online ones.
+        :type cftools_ids: iterable
+        :param include_online: Add the players of server_player_list() with the highest priority.
+        :type include_online: bool
+        :return: List of cftools_ids.
+        :rtype: list
+        """
+        fetched_at = self.__fetched_at()
+        online = self.online_players() if include_online else []
+        queue = []
+        seen = set()
+        for priority, ids in enumerate((online, cftools_ids)):
+            for cftools_id in ids:
+                if cftools_id in seen or self.is_fresh(cftools_id, fetched_at.get(cftools_id)):
+                    continue
+                seen.add(cftools_id)
+                heapq.heappush(queue, (priority, fetched_at.get(cftools_id, 0), len(queue), cftools_id))
+        return [heapq.heappop(queue)[-1] for _ in range(len(queue))]
+
+    def harvest(self, cftools_ids=(), include_online=True, max_requests=None, on_result=None):
+        """
+        Fetches the stale players of plan() one by one, each result is cached as soon as it arrives.
+        The client's rate limiter spaces the requests by the 10/minute quota, so this takes about
+        6 seconds a player; stop() ends it after the current request.
+
+        :param cftools_ids: Players to keep fresh besides the online ones.
+        :type cftools_ids: iterable
+        :param include_online: Add the players of server_player_list() with the highest priority.
+        :type include_online: bool
+        :param max_requests: Stop after so many requests, None - until every player is fresh.
+        :type max_requests: int
+        :param on_result: Callable on_result(cftools_id, response) called after every request.
+        :type on_result: callable
+        :return: Dict with counts of fetched and remaining players, and errors - cftools_id -> error text.
+        :rtype: dict
+        """
+        self.__stop.clear()
+        queue = self.plan(cftools_ids, include_online)
+        summary = {'fetched': 0, 'remaining': len(queue), 'errors': {}}
+        for cftools_id in queue:
+            if self.__stop.is_set() or (max_requests is not None and summary['fetched'] + len(summary['errors'])
+                                        >= max_requests):
+                break
+            try:
+                response = self.__cfapi.server_player_stats(cftools_id)
+                if response.ok:
+                    self.__put(cftools_id, 'player_stats', response.json())
+                    summary['fetched'] += 1
+                else:
+                    summary['errors'][cftools_id] = f'HTTP {response.status_code}'
+                if on_result is not None:
+                    on_result(cftools_id, response)
+            # ValueError - a successful response with a body which is not json.
+            except (CfToolsError, requests.RequestException, ValueError) as err:
+                summary['errors'][cftools_id] = str(err)
+            summary['remaining'] -= 1
+        return summary
+
+    def stop(self):
+        """
+        Makes a running harvest() return after its current request.
+        """
+        self.__stop.set()
+
+    def close(self):
+        self.__connection.close()
+
+
+class UserLookupCache(object):
+    def __init__(self, cfapi, filename='pycftools_users.sqlite3', maxsize=4096, ttl=None, negative_ttl=300):
+        """
+        Two-tier cache of server_lookup_user(): an in-memory LRU over an SQLite store which survives restarts.
+        Identifier -> cftools_id mappings practically never change, so by default found users are kept forever.
+        Unknown identifiers (404) are cached too, for negative_ttl seconds, so a join storm of new players
+        does not repeat the same failed lookups. Other errors are raised and never cached.
+
+        Example:
+            users = pycftools.UserLookupCache(cfapi)
+            users.warm_up(steam64_ids_of_regulars)
+            cftools_id = users.lookup(steam64)   # None if the user is unknown to CFTools
+
+        :param cfapi: CfToolsApi, or AsyncCfToolsApi for lookup_async().
+        :param filename: Database file name, None keeps the memory tier only.
+        :type filename: str
+        :param maxsize: Maximum number of identifiers in memory.
+        :type maxsize: int
+        :param ttl: Seconds a found user is kept, None - forever.
+        :type ttl: float
+        :param negative_ttl: Seconds an unknown identifier is kept.
+        :type negative_ttl: float
+        """
+        self.__cfapi = cfapi
+        self.__maxsize = maxsize
+        self.__ttl = ttl
+        self.__negative_ttl = negative_ttl
+        # identifier -> (cftools_id or None, expires unix time or None)
+        self.__entries = collections.OrderedDict()
+        # Guards the memory tier only, memory hits never wait for the disk.
+        self.__lock = threading.Lock()
+        self.__disk_lock = threading.Lock()
+        # Bumped by invalidate(), so an entry read from disk before it is not put back into memory.
+        self.__generation = 0
+        self.__connection = None
+        if filename is not None:
+            self.__connection = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+            with self.__connection:
+                self.__connection.execute('CREATE TABLE IF NOT EXISTS pycftools_user '
+                                          '(identifier TEXT PRIMARY KEY, cftools_id TEXT, expires REAL)')
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __remember(self, identifier, entry):
+        self.__entries[identifier] = entry
+        self.__entries.move_to_end(identifier)
+        while len(self.__entries) > self.__maxsize:
+            self.__entries.popitem(last=False)
+
+    def __get(self, identifier):
+        """
+        :return: Cached (cftools_id, expires) from memory or disk, None if missing or expired.
+        """
+        with self.__lock:
+            entry = self.__entries.get(identifier)
+            if entry is not None:
+                if entry[1] is None or entry[1] > time.time():
+                    self.__entries.move_to_end(identifier)
+                    self.memory_hits += 1
+                    return entry
+                del self.__entries[identifier]
+            generation = self.__generation
+        if self.__connection is not None:
+            with self.__disk_lock:
+                entry = self.__connection.execute('SELECT cftools_id, expires FROM pycftools_user '
+                                                  'WHERE identifier = ?', (identifier,)).fetchone()
+            if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                with self.__lock:
+                    if generation == self.__generation:
+                        self.__remember(identifier, entry)
+                    self.disk_hits += 1
+                return entry
+        with self.__lock:
+            self.misses += 1
+        return None
+
+    def __put_response(self, identifier, response):
+        """
+        Caches a server_lookup_user() response.
+
+        :return: cftools_id or None.
+        """
+        if response.status_code == 404:
+            cftools_id, ttl = None, self.__negative_ttl
+        else:
+            response.raise_for_status()
+            cftools_id, ttl = response.json().get('cftools_id'), self.__ttl
+        entry = (cftools_id, None if ttl is None else time.time() + ttl)
+        with self.__lock:
+            self.__remember(identifier, entry)
+        if self.__connection is not None:
+            with self.__disk_lock, self.__connection:
+                self.__connection.execute('INSERT OR REPLACE INTO pycftools_user (identifier, cftools_id, expires) '
+                                          'VALUES (?, ?, ?)', (identifier, *entry))
+        return cftools_id
+
+    def lookup(self, identifier):
+        """
+        Resolves an identifier through the cache, calling CfToolsApi.server_lookup_user() on a miss.
+
+        :param identifier: Either a Steam64, BattlEye GUID or Bohemia Interactive UID
+        :type identifier: str
+        :return: cftools_id, or None if the user is unknown.
+        :rtype: str
+        """
+        entry = self.__get(identifier)
+        if entry is not None:
+            return entry[0]
+        return self.__put_response(identifier, self.__cfapi.server_lookup_user(identifier))
+
+    async def lookup_async(self, identifier):
+        """
+        Resolves an identifier through the cache, awaiting AsyncCfToolsApi.server_lookup_user() on a miss.
+
+        :param identifier: Either a Steam64, BattlEye GUID or Bohemia Interactive UID
+        :type identifier: str
+        :return: cftools_id, or None if the user is unknown.
+        :rtype: str
+        """
+        entry = await asyncio.to_thread(self.__get, identifier)
+        if entry is not None:
+            return entry[0]
+        response = await self.__cfapi.server_lookup_user(identifier)
+        return await asyncio.to_thread(self.__put_response, identifier, response)
+
+    def warm_up(self, identifiers, max_workers=8):
+        """
+        Loads many identifiers at once: the ones on disk with one query per 500, the missing ones
+        with server_lookup_user() calls in parallel. Failed lookups are left out and not cached.
+
+        :param identifiers: Identifiers to resolve.
+        :type identifiers: iterable
+        :param max_workers: Parallel api calls.
+        :type max_workers: int
+        :return: Dict identifier -> cftools_id or None.
+        :rtype: dict
+        """
+        resolved = {}
+        identifiers = list(dict.fromkeys(identifiers))
+        now = time.time()
+        with self.__lock:
+            for identifier in identifiers:
+                entry = self.__entries.get(identifier)
+                if entry is not None and (entry[1] is None or entry[1] > now):
+                    resolved[identifier] = entry[0]
+            generation = self.__generation
+        if self.__connection is not None:
+            pending = [identifier for identifier in identifiers if identifier not in resolved]
+            found = []
+            with self.__disk_lock:
+                for start in range(0, len(pending), 500):
+                    chunk = pending[start:start + 500]
+                    found.extend(self.__connection.execute(
+                        f'SELECT identifier, cftools_id, expires FROM pycftools_user '
+                        f'WHERE identifier IN ({",".join("?" * len(chunk))})', chunk))
+            found = [(identifier, cftools_id, expires) for identifier, cftools_id, expires in found
+                     if expires is None or expires > now]
+            with self.__lock:
+                for identifier, cftools_id, expires in found:
+                    if generation == self.__generation:
+                        self.__remember(identifier, (cftools_id, expires))
+                    resolved[identifier] = cftools_id
+        missing = [identifier for identifier in identifiers if identifier not in resolved]
+        if missing:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Lookups keep the deadline() and priority() of the caller.
+                futures = {executor.submit(contextvars.copy_context().run, self.__cfapi.server_lookup_user,
+                                           identifier): identifier
+                           for identifier in missing}
+                for future, identifier in futures.items():
+                    try:
+                        resolved[identifier] = self.__put_response(identifier, future.result())
+                    except (CfToolsError, requests.RequestException):
+                        pass
+        return resolved
+
+    def invalidate(self, identifier=None):
+        """
+        Drops cached identifiers from both tiers.
+
+        :param identifier: Identifier to drop, if None - everything is dropped.
+        :type identifier: str
+        """
+        if self.__connection is not None:
+            with self.__disk_lock, self.__connection:
+                if identifier is None:
+                    self.__connection.execute('DELETE FROM pycftools_user')
+                else:
+                    self.__connection.execute('DELETE FROM pycftools_user WHERE identifier = ?', (identifier,))
+        # After the disk, so an entry read from it meanwhile is dropped here or not remembered at all.
+        with self.__lock:
+            self.__generation += 1
+            if identifier is None:
+                self.__entries.clear()
+            else:
+                self.__entries.pop(identifier, None)
+
+    def stats(self):
+        """
+        :return: Dict with memory_hits, disk_hits, misses and current memory size.
+        :rtype: dict
+        """
+        with self.__lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'size': len(self.__entries)
+            }
+
+    def close(self):
+        if self.__connection is not None:
+            self.__connection.close()
+
+
+class CfToolsCluster(object):
+    def __init__(self, app_id, app_secret, auth_token_filename='token.raw', pycftools_debug=False,
+                 timestamp_delta=43200, rate_limiter=None, token_store=None, response_cache=None,
+                 max_workers=16, api_url='https://data.cftools.cloud', scheduler=None, metrics=None, transport=None):
+        """
+        Pool of CfToolsApi handles for many servers of one application.
+        Application credentials are held once, and all handles share one requests.Session (connection pool),
+        one token store (so there is one auth flow for the whole cluster), one rate limiter, one retrier,
+        one single flight, and the optional response cache and request scheduler.
+
+        :param app_id: Application Id from https://developer.cftools.cloud/applications
+        :type app_id: str
+        :param app_secret: Application secret from https://developer.cftools.cloud/applications
+        :type app_secret: str
+        :param auth_token_filename: Auth_token_filename this is the filename var for auth token file.
+        :type auth_token_filename: str
+        :param pycftools_debug: This is the variable for enabling debug outputs from the program.
+        :type pycftools_debug: bool
+        :param timestamp_delta: This is the time offset delta when the token in the file needs to be updated. UNIXTIMESTAMP
+        :type timestamp_delta: int
+        :param rate_limiter: Shared RateLimiter. By default, a new one is created. Pass False to disable.
+        :type rate_limiter: RateLimiter
+        :param token_store: Shared TokenStore. By default, FileTokenStore(auth_token_filename).
+        :type token_store: TokenStore
+        :param response_cache: Shared ResponseCache. By default, responses are not cached.
+        :type response_cache: ResponseCache
+        :param max_workers: Number of threads for fan-out calls, also the size of the shared connection pool.
+        :type max_workers: int
+        :param api_url: Base url of the CFTools Data API.
+        :type api_url: str
+        :param scheduler: Shared RequestScheduler, so moderation on one server goes before background reads of all. By default, requests are not scheduled.
+        :type scheduler: RequestScheduler
+        :param metrics: Shared Metrics of all servers. By default, nothing is collected.
+        :type metrics: Metrics
+        :param transport: requests transport adapter of the shared session. By default, PooledTransport(pool_maxsize=max_workers).
+        :type transport: requests.adapters.BaseAdapter
+        """
+        self.__application_id = app_id
+        self.__application_secret = app_secret
+        self.__pycftools_debug = pycftools_debug
+        self.__timestamp_delta = timestamp_delta
+        self.__api_url = api_url
+
+        self.__session = requests.Session()
+        self.__transport = PooledTransport(pool_maxsize=max_workers) if transport is None else transport
+        self.__session.mount('https://', self.__transport)
+        self.__session.mount('http://', self.__transport)
+        self.__token_store = FileTokenStore(auth_token_filename) if token_store is None else token_store
+        self.__rate_limiter = RateLimiter() if rate_limiter is None else rate_limiter
+        self.__response_cache = response_cache
+        self.__single_flight = SingleFlight()
+        self.__retrier = Retrier()
+        self.__scheduler = scheduler
+        self.__metrics = metrics
+        self.__max_workers = max_workers
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pycftools-cluster')
+
+        self.servers = {}
+
+    def add_server(self, name, game_identifier, ip, game_port, server_api_id, server_banlist_id):
+        """
+        Adds a server to the cluster.
+
+        :param name: Name of the server inside of the cluster.
+        :type name: str
+        :param game_identifier: Game_identifier is needed to create server id.
+        :type game_identifier: str
+        :param ip: Ipv4 is needed to create server id.
+        :type ip: str
+        :param game_port: Game_port is needed to create server id.
+        :type game_port: str
+        :param server_api_id: Server_api_id this is the global server identifier and it can be found in the server API settings.
+        :type server_api_id: str
+        :param server_banlist_id: Server_banlist_id is global banlist identifier.
+        :type server_banlist_id: str
+        :return: Lightweight CfToolsApi handle for the server, sharing the cluster resources.
+        :rtype: CfToolsApi
+        """
+        handle = CfToolsApi(self.__application_id, self.__application_secret, game_identifier, ip, game_port,
+                            server_api_id, server_banlist_id,
+                            pycftools_debug=self.__pycftools_debug,
+                            timestamp_delta=self.__timestamp_delta,
+                            rate_limiter=self.__rate_limiter,
+                            token_store=self.__token_store,
+                            api_url=self.__api_url,
+                            response_cache=self.__response_cache,
+                            single_flight=self.__single_flight,
+                            session=self.__session,
+                            retrier=self.__retrier,
+                            scheduler=self.__scheduler,
+                            metrics=self.__metrics)
+        self.servers[name] = handle
+        return handle
 
-    @check_register
-    def server_queue_priority_entry(self, cftools_id, expires_at, comment):
+    def __getitem__(self, name):
+        return self.servers[name]
+
+    def __iter__(self):
+        return iter(self.servers)
+
+    def __len__(self):
+        return len(self.servers)
+
+    def fan_out(self, method_name, *args, servers=None, **kwargs):
         """
-        Create a new queue priority entry.
+        Calls an api method on many servers concurrently.
 
-        :param cftools_id: A CFTools account id.
-        :type cftools_id: str
-        :param expires_at: Expiration datetime object or null; Null is a permanent entry.
-        :type expires_at: str
-        :param comment: A note or comment.
-        :type comment: str
-        :return: Returns 204 on success.
-        :rtype: Response
+        Example:
+            cluster.fan_out('server_public_message', 'Restart in 5 minutes')
+
+        :param method_name: Name of the CfToolsApi method.
+        :type method_name: str
+        :param servers: Names of servers to call, by default all of them.
+        :type servers: list
+        :return: Dict server name -> response. If a call raised, the exception is put instead of the response.
+        :rtype: dict
         """
-        payload = {
-            'cftools_id': cftools_id,
-            'expires_at': expires_at,
-            'comment': comment
-        }
-        return self.__api_cftools_session.post(self.__server_queue_priority_url,
-                                               data=payload,
-                                               headers=self.__api_cftools_headers)
+        names = list(self.servers) if servers is None else list(servers)
+        # Every call runs in a copy of the caller's context, so deadline(), priority() and nowait() apply to it.
+        futures = {name: self.__executor.submit(contextvars.copy_context().run,
+                                                getattr(self.servers[name], method_name), *args, **kwargs)
+                   for name in names}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as err:
+                results[name] = err
+        return results
 
-    @check_register
-    def queue_priority_delete_entry(self, cftools_id):
+    def statistics_for_all(self, servers=None):
         """
-        Delete an existing queue priority entry.
+        :return: Dict server name -> server_statistics() response.
+        :rtype: dict
+        """
+        return self.fan_out('server_statistics', servers=servers)
 
-        :param cftools_id: A CFTools account id.
-        :type cftools_id: str
-        :return: Returns 204 on success.
-        :rtype: Response
+    def info_for_all(self, servers=None):
         """
-        payload = {'cftools_id': cftools_id}
-        return self.__api_cftools_session.delete(self.__server_queue_priority_url,
-                                                 data=payload,
-                                                 headers=self.__api_cftools_headers)
+        :return: Dict server name -> server_info() response.
+        :rtype: dict
+        """
+        return self.fan_out('server_info', servers=servers)
 
-    @check_register
-    def server_whitelist(self, cftools_id, comment):
+    def player_list_for_all(self, servers=None):
         """
-        Get a list of all whitelist entries Streamed response.
+        :return: Dict server name -> server_player_list() response.
+        :rtype: dict
+        """
+        return self.fan_out('server_player_list', servers=servers)
 
-        :param cftools_id: CFTools ID
-        :type cftools_id: str
-        :param comment: Comment string.
-        :type comment: str
-        :return: List of all whitelist entries.
-        :rtype: Response
+    def warm_up(self, connections=None):
         """
-        payload = {
-            'cftools_id': cftools_id,
-            'comment': comment
-        }
-        return self.__api_cftools_session.get(self.__server_whitelist_url,
-                                              params=payload,
-                                              headers=self.__api_cftools_headers)
+        Opens connections of the shared session to the api ahead of the first fan-out.
 
-    @check_register
-    def server_whitelist_entry(self, cftools_id, expires_at, comment):
+        :param connections: Number of connections, by default one per fan-out thread.
+        :type connections: int
+        :return: Number of connections opened, 0 if the transport is not a PooledTransport.
+        :rtype: int
         """
-        Create a new whitelist entry.
+        if not isinstance(self.__transport, PooledTransport):
+            return 0
+        return self.__transport.warm_up(self.__api_url, self.__max_workers if connections is None else connections)
 
-        :param cftools_id: A CFTools account id.
-        :type cftools_id: str
-        :param expires_at: Expiration datetime object or null; Null is a permanent entry.
-        :type expires_at: str
-        :param comment: A note or comment.
-        :type comment: str
-        :return: Returns 204 on success.
-        :rtype: Response
+    def connection_stats(self):
         """
-        payload = {
-            'cftools_id': cftools_id,
-            'expires_at': expires_at,
-            'comment': comment
-        }
-        return self.__api_cftools_session.post(self.__server_whitelist_url, data=payload,
-                                               headers=self.__api_cftools_headers)
+        :return: PooledTransport.stats() of the shared session, None for other transports.
+        :rtype: dict
+        """
+        return self.__transport.stats() if isinstance(self.__transport, PooledTransport) else None
 
-    @check_register
-    def server_whitelist_delete_entry(self, cftools_id):
+    def close(self):
         """
-        Delete an existing whitelist entry.
+        Stops the fan-out threads and closes the shared session.
+        """
+        self.__executor.shutdown(wait=True)
+        for handle in self.servers.values():
+            handle.close()
+        self.__session.close()
 
-        :param cftools_id: A CFTools account id.
-        :type cftools_id: str
-        :return: Returns 204 on success.
-        :rtype: Response
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class BulkItemResult(object):
+    __slots__ = ('key', 'ok', 'status_code', 'retries', 'error', 'error_type')
+
+    def __init__(self, key, ok, status_code=None, retries=0, error=None, error_type=None):
         """
-        payload = {'cftools_id': cftools_id}
-        return self.__api_cftools_session.delete(self.__server_whitelist_url,
-                                                 data=payload,
-                                                 headers=self.__api_cftools_headers)
+        Result of one item of a bulk operation.
 
-    @check_register
-    def server_leaderboard(self, stat, order, limit):
+        :param key: Item key (identifier, cftools_id or ban id).
+        :param ok: True if the api accepted the item.
+        :param status_code: Status code of the last response, None if there was none.
+        :param retries: How many times the item was retried.
+        :param error: Error text of the last failed attempt.
+        :param error_type: Class name of the exception of the last failed attempt, e.g. 'CircuitOpenError'.
         """
-        Request the generation of a leaderboard based on internally kept player stats.
-        This may fail if no stats are present.
+        self.key = key
+        self.ok = ok
+        self.status_code = status_code
+        self.retries = retries
+        self.error = error
+        self.error_type = error_type
 
-        Note:
-            MAX REQUESTS: 7/MINUTE
+    def __repr__(self):
+        return f'BulkItemResult(key={self.key!r}, ok={self.ok}, status_code={self.status_code}, retries={self.retries})'
 
-        :param stat: One of kills deaths suicides playtime longest_kill longest_shot kdratio
-        :type stat: str
-        :param order: 1 (Ascending) or -1 (Descending)
-        :type order: int
-        :param limit: An integer between 1 and 100; Defaults to 10
-        :type limit: int
-        :return: Leaderboard based on internally kept player stats.
-        :rtype: Response
+
+class BulkResult(object):
+    def __init__(self):
         """
-        payload = {
-            'stat': stat,
-            'order': order,
-            'limit': limit
-        }
-        return self.__api_cftools_session.get(self.__server_leaderboard_url, params=payload,
-                                              headers=self.__api_cftools_headers)
+        Summary of a bulk operation.
+        items - BulkItemResult for every processed item, skipped - items already done according to the checkpoint.
+        """
+        self.items = []
+        self.skipped = 0
 
-    @check_register
-    def server_player_stats(self, cftools_id):
+    @property
+    def succeeded(self):
+        return sum(1 for item in self.items if item.ok)
+
+    @property
+    def failed(self):
+        return [item for item in self.items if not item.ok]
+
+    def __repr__(self):
+        return f'BulkResult(succeeded={self.succeeded}, failed={len(self.failed)}, skipped={self.skipped})'
+
+
+class BulkModerator(object):
+    # Client methods sending DELETE, safe to repeat after a 5xx or a transport error.
+    IDEMPOTENT_METHODS = ('server_unban', 'server_whitelist_delete_entry', 'queue_priority_delete_entry')
+
+    def __init__(self, cfapi, max_workers=8, checkpoint_file=None, retries=3, backoff=1.0):
         """
-        Individual stats of a player for a server.
+        Applies thousands of bans, unbans, whitelist and queue priority entries concurrently.
+        Calls go through the client, so they stay within its rate limiter quotas.
 
-        Note:
-            MAX REQUESTS: 10/MINUTE
+        With a checkpoint file every finished item is appended to it as a JSON line,
+        and a rerun after an interruption skips the items which already succeeded.
 
-        :param cftools_id: A CFTools account id.
-        :type cftools_id: str
-        :return: Individual stats of a player.
-        :rtype: Response
+        :param cfapi: CfToolsApi to send requests with.
+        :type cfapi: CfToolsApi
+        :param max_workers: Number of concurrent requests.
+        :type max_workers: int
+        :param checkpoint_file: JSON lines file with finished items, None for no checkpointing.
+        :type checkpoint_file: str
+        :param retries: How many times a rejected item (429; for deletes also 5xx and transport errors) is retried.
+            Used only if the client has no Retrier, otherwise the Retrier alone retries, within its budget.
+        :type retries: int
+        :param backoff: Base delay in seconds between retries, doubled every retry. Retry-After is honored.
+        :type backoff: float
         """
-        payload = {'cftools_id': cftools_id}
-        return self.__api_cftools_session.get(self.__server_player_stats_url, params=payload,
-                                              headers=self.__api_cftools_headers)
+        self.__cfapi = cfapi
+        self.__max_workers = max_workers
+        self.__checkpoint_file = checkpoint_file
+        # Retries on top of the client's Retrier would multiply with its own.
+        self.__retries = 0 if getattr(cfapi, 'retrier', None) else retries
+        self.__backoff = backoff
+        self.__checkpoint_lock = threading.Lock()
 
-    # ---------------- Banlist ----------------
+    def __load_checkpoint(self, method_name):
+        """
+        :return: Keys of the items which already succeeded, and False if the last line was cut by an interruption.
+        :rtype: tuple
+        """
+        done = set()
+        complete = True
+        if self.__checkpoint_file is None or not os.path.exists(self.__checkpoint_file):
+            return done, complete
+        with open(self.__checkpoint_file, 'r', encoding='utf-8') as checkpoint:
+            for line in checkpoint:
+                complete = line.endswith('\n')
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Line cut by an interruption.
+                    continue
+                if record.get('method') == method_name and record.get('ok'):
+                    done.add(record['key'])
+        return done, complete
 
-    # All subsequent routes require a Banlist Id and an active application grant.
+    def __save_checkpoint(self, checkpoint, method_name, result):
+        if checkpoint is None:
+            return
+        record = {'method': method_name, 'key': result.key, 'ok': result.ok, 'status_code': result.status_code}
+        with self.__checkpoint_lock:
+            checkpoint.write(json.dumps(record) + '\n')
+            checkpoint.flush()
 
-    @check_register
-    def server_banlist(self, flt):
+    def __finish(self, result, item_result, checkpoint, method_name, on_result):
+        result.items.append(item_result)
+        self.__save_checkpoint(checkpoint, method_name, item_result)
+        if on_result is not None:
+            on_result(item_result)
+
+    def __call(self, method_name, key, kwargs):
         """
-        Get a list of all bans. Streamed response.
+        Sends one item. 429 is retried for every method - the request was rejected, not executed.
+        5xx and transport errors are retried for the DELETE methods only, a repeated POST may e.g. issue a ban twice.
+        Errors raised by the client itself (open circuit, deadline, rate limit, auth) fail the item right away.
+        Reported retries include the ones made by the client's Retrier.
+        """
+        method = getattr(self.__cfapi, method_name)
+        idempotent = method_name in self.IDEMPOTENT_METHODS
+        status_code = None
+        with Retrier.counting() as counter:
+            for attempt in range(self.__retries + 1):
+                delay = self.__backoff * 2 ** attempt
+                try:
+                    response = method(**kwargs)
+                except requests.RequestException as err:
+                    error, error_type = str(err), type(err).__name__
+                    if not idempotent:
+                        return BulkItemResult(key, False, None, attempt + counter.retries, error, error_type)
+                except Exception as err:
+                    return BulkItemResult(key, False, None, attempt + counter.retries, str(err), type(err).__name__)
+                else:
+                    status_code = response.status_code
+                    if status_code < 300:
+                        return BulkItemResult(key, True, status_code, attempt + counter.retries)
+                    error, error_type = f'status code {status_code}', None
+                    if status_code != 429 and (status_code < 500 or not idempotent):
+                        return BulkItemResult(key, False, status_code, attempt + counter.retries, error)
+                    retry_after = response.headers.get('Retry-After')
+                    if retry_after is not None and retry_after.isdigit():
+                        delay = float(retry_after)
+                if attempt < self.__retries:
+                    time.sleep(delay)
+            return BulkItemResult(key, False, status_code, self.__retries + counter.retries, error, error_type)
 
-        :param flt: Either an IPv4 or a CFTools account id
-        :type flt: str
-        :return: List of all bans.
-        :rtype: Response
+    def run(self, method_name, items, key, on_result=None):
         """
-        payload = {'filter': flt}
-        return self.__api_cftools_session.get(self.__server_banlist_url, params=payload,
-                                              headers=self.__api_cftools_headers)
+        Calls a client method for every item concurrently. Items are consumed lazily,
+        at most 2 * max_workers of them are in flight at once.
 
-    @check_register
-    def server_ban(self, frmt, identifier, expires_at, reason):
+        :param method_name: Name of the CfToolsApi method.
+        :type method_name: str
+        :param items: Iterable of dicts with keyword arguments of the method.
+        :type items: iterable
+        :param key: Function item -> unique key of the item, used in results and in the checkpoint.
+        :type key: callable
+        :param on_result: Callable on_result(BulkItemResult) called for every finished item, e.g. for progress output.
+        :type on_result: callable
+        :return: Summary of the operation.
+        :rtype: BulkResult
         """
-        Issue a new ban. Triggers an in-game kick.
+        result = BulkResult()
+        done, complete = self.__load_checkpoint(method_name)
+        checkpoint = None
+        if self.__checkpoint_file is not None:
+            checkpoint = open(self.__checkpoint_file, 'a', encoding='utf-8')
+            if not complete:
+                # Do not glue the first new record to the cut line.
+                checkpoint.write('\n')
+        try:
+            with ThreadPoolExecutor(max_workers=self.__max_workers,
+                                    thread_name_prefix='pycftools-bulk') as executor:
+                in_flight = set()
+                for item in items:
+                    item_key = key(item)
+                    if item_key in done:
+                        result.skipped += 1
+                        continue
+                    if len(in_flight) >= 2 * self.__max_workers:
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            self.__finish(result, future.result(), checkpoint, method_name, on_result)
+                    in_flight.add(executor.submit(contextvars.copy_context().run, self.__call, method_name,
+                                                  item_key, item))
+                for future in in_flight:
+                    self.__finish(result, future.result(), checkpoint, method_name, on_result)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        return result
 
-        :param frmt: cftools_id or ipv4.
-        :type frmt: str
-        :param identifier: A CFTools account id or an IPv4; IPv4 may contain wildcard substitutes in form of an asteriks.
-        :type identifier: str
-        :param expires_at: Expiration datetime object or null; Null is a permanent entry.
-        :type expires_at: str
-        :param reason: A ban reason,
-        :type reason: str
-        :return: Returns 204 on success.
-        :rtype: Response
+    def ban_many(self, entries, on_result=None):
         """
-        payload = {
-            'format': frmt,
-            'identifier': identifier,
-            'expires_at': expires_at,
-            'reason': reason
-        }
-        return self.__api_cftools_session.post(self.__server_banlist_url, data=payload,
-                                               headers=self.__api_cftools_headers)
+        Issue many bans.
 
-    @check_register
-    def server_unban(self, ban_id):
+        :param entries: Iterable of dicts with keys of server_ban(): frmt, identifier, expires_at, reason.
+        :type entries: iterable
+        :param on_result: Callable on_result(BulkItemResult), see run().
+        :type on_result: callable
+        :rtype: BulkResult
         """
-        Revoke an existing ban.
+        return self.run('server_ban', entries, key=lambda entry: f'''{entry['frmt']}:{entry['identifier']}''',
+                        on_result=on_result)
 
-        :param ban_id: The ban id of an existing ban
-        :type ban_id: str
-        :return: Returns 204 on success.
-        :rtype: Response
+    def unban_many(self, ban_ids, on_result=None):
         """
-        payload = {'ban_id': ban_id}
-        return self.__api_cftools_session.delete(self.__server_banlist_url, data=payload,
-                                                 headers=self.__api_cftools_headers)
+        Revoke many bans.
 
-    # ---------------- Users ----------------
+        :param ban_ids: Iterable of ban ids.
+        :type ban_ids: iterable
+        :param on_result: Callable on_result(BulkItemResult), see run().
+        :type on_result: callable
+        :rtype: BulkResult
+        """
+        return self.run('server_unban', ({'ban_id': ban_id} for ban_id in ban_ids),
+                        key=lambda entry: entry['ban_id'], on_result=on_result)
 
-    @check_register
-    def server_lookup_user(self, identifier):
+    def whitelist_many(self, entries, on_result=None):
         """
-        Search CFTools Cloud database for a user.
+        Create many whitelist entries.
 
-        :param identifier: Either a Steam64, BattlEye GUID or Bohemia Interactive UID
-        :type identifier: str
-        :return: Json response with information about user.
-        :rtype: Response
+        :param entries: Iterable of dicts with keys of server_whitelist_entry(): cftools_id, expires_at, comment.
+        :type entries: iterable
+        :param on_result: Callable on_result(BulkItemResult), see run().
+        :type on_result: callable
+        :rtype: BulkResult
         """
-        payload = {'identifier': identifier}
-        return self.__api_cftools_session.get(self.__server_lookup_url, params=payload,
-                                              headers=self.__api_cftools_headers)
+        return self.run('server_whitelist_entry', entries, key=lambda entry: entry['cftools_id'],
+                        on_result=on_result)
 
-    # ---------------- Server id ----------------
+    def whitelist_delete_many(self, cftools_ids, on_result=None):
+        """
+        Delete many whitelist entries.
 
-    @staticmethod
-    def _create_server_id_hash(game_identifier, ip, game_port):
+        :param cftools_ids: Iterable of CFTools account ids.
+        :type cftools_ids: iterable
+        :param on_result: Callable on_result(BulkItemResult), see run().
+        :type on_result: callable
+        :rtype: BulkResult
         """
-        CFTools Cloud's Steamrelay service automatically queries all game servers for specific games
-        in a 30 to 60 second interval. To retrieve information about game servers you need to generate
-        a Data API specific server resource id, referenced to as server_id in the following.
+        return self.run('server_whitelist_delete_entry', ({'cftools_id': cftools_id} for cftools_id in cftools_ids),
+                        key=lambda entry: entry['cftools_id'], on_result=on_result)
 
-        The server_id generates from following datasets:
-        1. IPv4 of the game server
-        2. Gameport of the game server
-        3. Game identifier
+    def queue_priority_many(self, entries, on_result=None):
+        """
+        Create many queue priority entries.
 
-        For Dayz identifier is 1.
+        :param entries: Iterable of dicts with keys of server_queue_priority_entry(): cftools_id, expires_at, comment.
+        :type entries: iterable
+        :param on_result: Callable on_result(BulkItemResult), see run().
+        :type on_result: callable
+        :rtype: BulkResult
+        """
+        return self.run('server_queue_priority_entry', entries, key=lambda entry: entry['cftools_id'],
+                        on_result=on_result)
 
-        Once you have gathered this information, build a string with these parameters in the following order:
-        {game_identifier}{ipv4}{game_port}
-        Do not use any spacers or other additional symbols.
+    def queue_priority_delete_many(self, cftools_ids, on_result=None):
+        """
+        Delete many queue priority entries.
 
-        After you have this string use a sha1 hashing function on it.
-        The digest in hexademical form can then be used as server_id.
+        :param cftools_ids: Iterable of CFTools account ids.
+        :type cftools_ids: iterable
+        :param on_result: Callable on_result(BulkItemResult), see run().
+        :type on_result: callable
+        :rtype: BulkResult
+        """
+        return self.run('queue_priority_delete_entry', ({'cftools_id': cftools_id} for cftools_id in cftools_ids),
+                        key=lambda entry: entry['cftools_id'], on_result=on_result)
 
-        :param game_identifier: is a game id in cftools cloud.
-        :type game_identifier: str
-        :param ip: ipv4 address of server.
-        :type ip: str
-        :param game_port: server port.
-        :type game_port: str
-        :return: sha1 hash string.
+
+class Broadcaster(object):
+    def __init__(self, cfapi, max_workers=16, retries=1, backoff=0.5):
+        """
+        Sends a message to many players at once: private messages go out concurrently through a BulkModerator,
+        so a 100 player announcement takes a few round trips instead of a hundred.
+
+        :param cfapi: CfToolsApi to send messages with.
+        :type cfapi: CfToolsApi
+        :param max_workers: Number of concurrent requests.
+        :type max_workers: int
+        :param retries: How many times a rejected message (429) is retried, if the client has no Retrier.
+            Otherwise the client's Retrier alone retries.
+        :type retries: int
+        :param backoff: Base delay in seconds between retries.
+        :type backoff: float
+        """
+        self.__cfapi = cfapi
+        self.__moderator = BulkModerator(cfapi, max_workers=max_workers, retries=retries, backoff=backoff)
+
+    @staticmethod
+    def render(message, session):
+        """
+        :param message: Template formatted with the session entry ('Hi {gamedata[player_name]}'),
+            or callable message(session) -> str.
+        :param session: Session entry of server_player_list().
+        :type session: dict
+        :return: Message text for the player.
         :rtype: str
         """
-        server_id_substring = ''.join([game_identifier, ip, game_port])
-        return hashlib.sha1(str.encode(server_id_substring)).hexdigest()
+        return message(session) if callable(message) else message.format_map(session)
 
-    def close(self):
+    def broadcast(self, message, players=None, flt=None, public_fallback=True):
+        """
+        Sends a message to players, rendered for every one of them.
+
+        When the message goes to everyone online and renders the same for all,
+        a single server_public_message() is sent instead (result key 'public').
+
+        Example:
+            Broadcaster(cfapi).broadcast('{gamedata[player_name]}, restart in 5 minutes',
+                                         flt=lambda session: session.get('live', {}).get('loaded'))
+
+        :param message: Template or callable, see render().
+        :param players: Iterable of session entries or gamesession ids, by default everyone in server_player_list().
+        :type players: iterable
+        :param flt: Callable flt(session) -> bool choosing players to message.
+        :type flt: callable
+        :param public_fallback: Allow the single public message.
+        :type public_fallback: bool
+        :return: Delivery report, one item per gamesession_id.
+        :rtype: BulkResult
+        """
+        everyone = players is None
+        if everyone:
+            response = self.__cfapi.server_player_list()
+            response.raise_for_status()
+            data = response.json()
+            players = data.get('sessions', []) if isinstance(data, dict) else data
+        sessions = [{'id': player} if isinstance(player, str) else player for player in players]
+        if flt is not None:
+            selected = [session for session in sessions if flt(session)]
+            everyone = everyone and len(selected) == len(sessions)
+            sessions = selected
+        items = [{'gs_id': session.get('id', session.get('gamesession_id')), 'content': self.render(message, session)}
+                 for session in sessions]
+        if public_fallback and everyone and items and len({item['content'] for item in items}) == 1:
+            return self.__moderator.run('server_public_message', [{'content': items[0]['content']}],
+                                        key=lambda item: 'public')
+        return self.__moderator.run('server_private_message', items, key=lambda item: item['gs_id'])
+
+
+# ---------------- Command line ----------------
+
+# List -> (streaming iterator of CfToolsApi, model of the entries, BulkModerator add and delete methods).
+_CLI_LISTS = {
+    'bans': ('iter_bans', Ban, 'ban_many', None),
+    'whitelist': ('iter_whitelist', ListEntry, 'whitelist_many', 'whitelist_delete_many'),
+    'priority': ('iter_queue_priority', ListEntry, 'queue_priority_many', 'queue_priority_delete_many'),
+}
+
+
+class _Progress(object):
+    def __init__(self, label, quiet=False, interval=2.0):
         """
-        Method to close a session.
+        Progress and throughput lines on stderr, at most one per interval seconds.
         """
-        self.__api_cftools_session.close()
+        self.__label = label
+        self.__quiet = quiet
+        self.__interval = interval
+        self.__started = self.__printed = time.monotonic()
+        self.done = 0
+        self.failed = 0
+
+    def update(self, ok=True):
+        self.done += 1
+        self.failed += not ok
+        now = time.monotonic()
+        if now - self.__printed >= self.__interval:
+            self.__printed = now
+            self.__print(now)
+
+    def __print(self, now, final=False):
+        if self.__quiet:
+            return
+        elapsed = max(now - self.__started, 1e-9)
+        took = f' in {elapsed:.1f}s' if final else ''
+        print(f'{self.__label}: {self.done} done, {self.failed} failed, {self.done / elapsed:.1f}/s{took}',
+              file=sys.stderr, flush=True)
+
+    def finish(self):
+        self.__print(time.monotonic(), final=True)
+
+
+@contextmanager
+def _cli_open(path, mode):
+    if path == '-':
+        yield sys.stdin if mode == 'r' else sys.stdout
+        return
+    with open(path, mode, encoding='utf-8', newline='') as stream:
+        yield stream
+
+
+def _cli_format(arguments, path):
+    return arguments.format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+
+
+def _cli_read(stream, fmt):
+    """
+    :return: Generator of records of a JSON lines or CSV stream, empty CSV cells are None.
+    :rtype: generator
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value if value != '' else None for key, value in row.items()}
+        return
+    for line in stream:
+        if line.strip():
+            yield _json_loads(line)
+
+
+def _cli_entry(name, record):
+    """
+    :return: Keyword arguments of the BulkModerator add method from an imported record,
+        which may be an exported entry as well.
+    :rtype: dict
+    """
+    if name == 'bans':
+        ban = Ban(record)
+        if not ban.identifier:
+            raise ValueError(f'Ban record without an identifier: {record!r}')
+        return {'frmt': ban.format, 'identifier': ban.identifier, 'expires_at': ban.expires_at,
+                'reason': ban.reason or ''}
+    entry = ListEntry(record)
+    if not entry.cftools_id:
+        raise ValueError(f'Record without a cftools_id: {record!r}')
+    return {'cftools_id': entry.cftools_id, 'expires_at': entry.expires_at, 'comment': entry.comment or ''}
+
+
+def _cli_export(cfapi, arguments):
+    iterator, model, _, _ = _CLI_LISTS[arguments.list]
+    progress = _Progress(f'export {arguments.list}', arguments.quiet)
+    with _cli_open(arguments.output, 'w') as stream:
+        if _cli_format(arguments, arguments.output) == 'csv':
+            writer = csv.DictWriter(stream, fieldnames=list(model.FIELDS))
+            writer.writeheader()
+            for entry in getattr(cfapi, iterator)(model=model):
+                writer.writerow(entry.to_dict())
+                progress.update()
+        else:
+            for entry in getattr(cfapi, iterator)():
+                stream.write(json.dumps(entry, separators=(',', ':')) + '\n')
+                progress.update()
+    progress.finish()
+    return 0
+
+
+def _cli_report(result, progress):
+    progress.finish()
+    for item in result.failed:
+        print(f'failed {item.key}: {item.error}', file=sys.stderr)
+    return 1 if result.failed else 0
+
+
+def _cli_import(cfapi, arguments):
+    _, _, add, _ = _CLI_LISTS[arguments.list]
+    progress = _Progress(f'import {arguments.list}', arguments.quiet)
+    moderator = BulkModerator(cfapi, max_workers=arguments.workers, checkpoint_file=arguments.checkpoint)
+    with _cli_open(arguments.input, 'r') as stream:
+        records = (_cli_entry(arguments.list, record)
+                   for record in _cli_read(stream, _cli_format(arguments, arguments.input)))
+        result = getattr(moderator, add)(records, on_result=lambda item: progress.update(item.ok))
+    return _cli_report(result, progress)
+
+
+def _cli_sync(cfapi, arguments):
+    iterator, model, add, delete = _CLI_LISTS[arguments.list]
+    remote = {entry.cftools_id for entry in getattr(cfapi, iterator)(model=model)}
+    local = set()
+
+    def additions(stream):
+        for record in _cli_read(stream, _cli_format(arguments, arguments.input)):
+            entry = _cli_entry(arguments.list, record)
+            if entry['cftools_id'] in local:
+                continue
+            local.add(entry['cftools_id'])
+            if entry['cftools_id'] not in remote:
+                yield entry
+
+    progress = _Progress(f'sync {arguments.list}', arguments.quiet)
+    with _cli_open(arguments.input, 'r') as stream:
+        if arguments.dry_run:
+            for entry in additions(stream):
+                print(f'+ {entry["cftools_id"]}')
+        else:
+            added = getattr(BulkModerator(cfapi, max_workers=arguments.workers), add)(
+                additions(stream), on_result=lambda item: progress.update(item.ok))
+    removals = sorted(remote - local) if not arguments.keep_extra else []
+    if arguments.dry_run:
+        for cftools_id in removals:
+            print(f'- {cftools_id}')
+        return 0
+    removed = getattr(BulkModerator(cfapi, max_workers=arguments.workers), delete)(
+        removals, on_result=lambda item: progress.update(item.ok))
+    if not arguments.quiet:
+        print(f'sync {arguments.list}: {added.succeeded} added, {removed.succeeded} removed', file=sys.stderr)
+    added.items.extend(removed.items)
+    return _cli_report(added, progress)
+
+
+def main(argv=None):
+    """
+    Command line entry point: python -m pycftools {export,import,sync} ...
+
+    Streams bans, whitelist and queue priority lists to and from JSON lines or CSV files with bounded memory.
+    Imports and syncs are submitted concurrently through BulkModerator and paced by the client's rate limiter.
+
+    :param argv: Arguments, by default sys.argv[1:].
+    :type argv: list
+    :return: Exit code, 1 if any item failed.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(prog='pycftools', description='Bulk import / export of CFTools lists.')
+    parser.add_argument('--app-id', default=os.environ.get('PYCFTOOLS_APP_ID'),
+                        help='application id, or the PYCFTOOLS_APP_ID environment variable')
+    parser.add_argument('--app-secret', default=os.environ.get('PYCFTOOLS_APP_SECRET'),
+                        help='application secret, or the PYCFTOOLS_APP_SECRET environment variable')
+    parser.add_argument('--server-api-id', default=os.environ.get('PYCFTOOLS_SERVER_API_ID', ''))
+    parser.add_argument('--banlist-id', default=os.environ.get('PYCFTOOLS_BANLIST_ID', ''))
+    parser.add_argument('--game-identifier', default='')
+    parser.add_argument('--ip', default='')
+    parser.add_argument('--game-port', default='')
+    parser.add_argument('--token-file', default='token.raw')
+    parser.add_argument('--api-url', default='https://data.cftools.cloud')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), help='by default from the file extension, else jsonl')
+    parser.add_argument('--quiet', action='store_true', help='no progress output')
+    parser.add_argument('--debug', action='store_true')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='stream a list to a file')
+    export.add_argument('list', choices=tuple(_CLI_LISTS))
+    export.add_argument('-o', '--output', default='-', help='file, - for stdout')
+
+    load = commands.add_parser('import', help='add every entry of a file')
+    load.add_argument('list', choices=tuple(_CLI_LISTS))
+    load.add_argument('-i', '--input', default='-', help='file, - for stdin')
+    load.add_argument('--workers', type=int, default=8)
+    load.add_argument('--checkpoint', help='JSON lines checkpoint, a rerun skips the items done')
+
+    sync = commands.add_parser('sync', help='make a remote list equal to a file, applying only adds and removes')
+    sync.add_argument('list', choices=('whitelist', 'priority'))
+    sync.add_argument('-i', '--input', default='-', help='file, - for stdin')
+    sync.add_argument('--workers', type=int, default=8)
+    sync.add_argument('--dry-run', action='store_true', help='print the adds (+) and removes (-) only')
+    sync.add_argument('--keep-extra', action='store_true', help='do not remove entries missing from the file')
+
+    arguments = parser.parse_args(argv)
+    if not arguments.app_id or not arguments.app_secret:
+        parser.error('--app-id and --app-secret are required')
+    cfapi = CfToolsApi(app_id=arguments.app_id, app_secret=arguments.app_secret,
+                       game_identifier=arguments.game_identifier, ip=arguments.ip, game_port=arguments.game_port,
+                       server_api_id=arguments.server_api_id, server_banlist_id=arguments.banlist_id,
+                       auth_token_filename=arguments.token_file, pycftools_debug=arguments.debug,
+                       api_url=arguments.api_url)
+    commands = {'export': _cli_export, 'import': _cli_import, 'sync': _cli_sync}
+    try:
+        return commands[arguments.command](cfapi, arguments)
+    except ValueError as err:
+        parser.exit(2, f'pycftools: error: {err}\n')
+    finally:
+        cfapi.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
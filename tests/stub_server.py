@@ -0,0 +1,233 @@
+import argparse
+import collections
+import json
+import math
+import threading
+import time
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections under the stress tests.
+    request_queue_size = 128
+
+
+class StubCfToolsServer(object):
+    # Listing path suffix -> attribute with its entries.
+    LISTINGS = {
+        '/bans': 'bans',
+        '/whitelist': 'whitelist',
+        '/queuepriority': 'queue_priority',
+    }
+
+    def __init__(self, token='stub-token', port=0, credentials=None):
+        """
+        Local mock of the CFTools Data API, used by the offline tests and benchmarks.
+
+        /v1/auth/register hands out the token (checking credentials if given, else 401).
+        Every other route needs the bearer token, else 401. Then:
+        routes over their quota in rate_limits answer 429 with Retry-After,
+        failures queued by fail_next() are answered next,
+        GSM/list answers with the sessions in players, users/lookup resolves identifiers by users (else 404),
+        banlist, whitelist and queue priority listings are streamed chunked from bans, whitelist and queue_priority,
+        paged by page_size with a cursor, other GET paths found in responses answer with their json,
+        the rest with 200 {'status': true} (GET) or 204 (POST/DELETE).
+
+        :param token: Token handed out by /v1/auth/register.
+        :type token: str
+        :param port: Port to listen on, 0 picks a free one.
+        :type port: int
+        :param credentials: (application_id, secret) accepted by /v1/auth/register, None accepts any.
+        :type credentials: tuple
+        """
+        self.token = token
+        self.credentials = credentials
+        self.counts = {}
+        self.players = []
+        self.responses = {}
+        self.users = {}
+        self.bans = []
+        self.whitelist = []
+        self.queue_priority = []
+        # Entries per listing page, None - everything in one response.
+        self.page_size = None
+        # Path -> (requests, period in seconds), answered with 429 over the quota.
+        self.rate_limits = {}
+        # Seconds every request takes, like a round trip to the real API.
+        self.latency = 0.0
+        self.__failures = {}
+        self.__windows = {}
+        self.__counts_lock = threading.Lock()
+        self.__server = _StubHTTPServer(('127.0.0.1', port), self.__make_handler())
+        self.__thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.__server.server_port}'
+
+    def count(self, path):
+        """
+        :return: How many requests were made to the path.
+        :rtype: int
+        """
+        with self.__counts_lock:
+            return self.counts.get(path, 0)
+
+    def fail_next(self, path, status, times=1, retry_after=None):
+        """
+        Answers the next requests to the path with an error status.
+
+        :param path: Request path, e.g. '/v1/server/server/info'.
+        :type path: str
+        :param status: Status code, e.g. 429 or 503.
+        :type status: int
+        :param times: How many requests fail.
+        :type times: int
+        :param retry_after: Retry-After header of the failures.
+        :type retry_after: int
+        """
+        with self.__counts_lock:
+            self.__failures.setdefault(path, collections.deque()).extend([(status, retry_after)] * times)
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def serve_forever(self):
+        self.__server.serve_forever()
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def __hit(self, path):
+        """
+        Counts the request.
+
+        :return: (status, retry_after) to answer with instead of the route, or None.
+        """
+        now = time.monotonic()
+        with self.__counts_lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+            failures = self.__failures.get(path)
+            if failures:
+                return failures.popleft()
+            quota = self.rate_limits.get(path)
+            if quota is not None:
+                requests_count, period = quota
+                window = self.__windows.setdefault(path, collections.deque())
+                while window and window[0] <= now - period:
+                    window.popleft()
+                if len(window) >= requests_count:
+                    return 429, math.ceil(window[0] + period - now)
+                window.append(now)
+        return None
+
+    def __make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes, Nagle would hold the body for a delayed ack.
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, data=None, headers=None):
+                body = b'' if data is None else json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_failure(self, failure):
+                status, retry_after = failure
+                self.send_json(status, {'status': False, 'error': 'failure'},
+                               None if retry_after is None else {'Retry-After': str(retry_after)})
+
+            def send_listing(self, entries, query):
+                """
+                Streams a listing page with chunked transfer encoding, one chunk per entry.
+                """
+                flt = query.get('filter', [None])[0]
+                if flt is not None:
+                    entries = [entry for entry in entries if entry.get('identifier') == flt]
+                start = int(query.get('cursor', ['0'])[0])
+                end = len(entries) if stub.page_size is None else start + stub.page_size
+                page = entries[start:end]
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                chunks = [b'{"status": true, "entries": [']
+                chunks.extend((b', ' if i else b'') + json.dumps(entry).encode() for i, entry in enumerate(page))
+                cursor = f', "cursor": "{end}"' if end < len(entries) else ''
+                chunks.append(f'], "count": {len(page)}{cursor}}}'.encode())
+                for chunk in chunks:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                self.wfile.write(b'0\r\n\r\n')
+
+            def handle_any(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = urllib.parse.parse_qs(self.rfile.read(length).decode())
+                url = urllib.parse.urlsplit(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                failure = stub._StubCfToolsServer__hit(url.path)
+                if url.path == '/v1/auth/register':
+                    if failure is not None:
+                        return self.send_failure(failure)
+                    if stub.credentials is not None and stub.credentials != (body.get('application_id', [''])[0],
+                                                                             body.get('secret', [''])[0]):
+                        return self.send_json(401, {'status': False, 'error': 'bad-secret'})
+                    return self.send_json(200, {'token': stub.token})
+                if self.headers.get('Authorization') != f'Bearer {stub.token}':
+                    return self.send_json(401, {'status': False, 'error': 'unauthorized'})
+                if failure is not None:
+                    return self.send_failure(failure)
+                if self.command == 'GET':
+                    for suffix, attribute in StubCfToolsServer.LISTINGS.items():
+                        if url.path.endswith(suffix):
+                            return self.send_listing(getattr(stub, attribute), query)
+                if self.command == 'GET' and url.path.endswith('/GSM/list'):
+                    return self.send_json(200, {'status': True, 'sessions': stub.players})
+                if self.command == 'GET' and url.path == '/v1/users/lookup':
+                    identifier = query.get('identifier', [''])[0]
+                    if identifier not in stub.users:
+                        return self.send_json(404, {'status': False, 'error': 'not-found'})
+                    return self.send_json(200, {'status': True, 'cftools_id': stub.users[identifier]})
+                if self.command == 'GET' and url.path in stub.responses:
+                    return self.send_json(200, stub.responses[url.path])
+                if self.command == 'GET':
+                    return self.send_json(200, {'status': True})
+                return self.send_json(204)
+
+            do_GET = do_POST = do_DELETE = handle_any
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local mock of the CFTools Data API.')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--token', default='stub-token')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every request takes')
+    arguments = parser.parse_args()
+    server = StubCfToolsServer(arguments.token, arguments.port)
+    server.latency = arguments.latency
+    print(f'Serving on {server.url}')
+    server.serve_forever()
@@ -0,0 +1,91 @@
+import asyncio
+import contextlib
+import datetime
+import io
+import os
+import tempfile
+import unittest
+
+from pycftools import AsyncCfToolsApi, AuthenticationError, FileTokenStore, Retrier, RetryPolicy
+from stub_server import StubCfToolsServer
+
+
+class AsyncClientTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.token_filename = os.path.join(self.directory.name, 'token.raw')
+        self.stub = StubCfToolsServer(credentials=('app', 'secret')).start()
+
+    def tearDown(self) -> None:
+        self.stub.stop()
+        self.directory.cleanup()
+
+    def __run(self, fn, app_secret='secret'):
+        async def run():
+            async with AsyncCfToolsApi(app_id='app', app_secret=app_secret, game_identifier='1',
+                                       ip='127.0.0.1', game_port='2302',
+                                       server_api_id='server',
+                                       server_banlist_id='banlist',
+                                       auth_token_filename=self.token_filename,
+                                       rate_limiter=False,
+                                       retrier=Retrier(RetryPolicy(backoff=0.01)),
+                                       api_url=self.stub.url) as cfapi:
+                return await fn(cfapi)
+
+        return asyncio.run(run())
+
+    def test_token_flow(self):
+        async def calls(cfapi):
+            return [(await cfapi.server_info()).status_code, (await cfapi.server_statistics()).status_code]
+
+        self.assertEqual(self.__run(calls), [200, 200])
+        self.assertEqual(self.stub.count('/v1/auth/register'), 1)
+        self.assertEqual(FileTokenStore(self.token_filename).load()['token'], 'stub-token')
+
+        # A new client reuses the stored token.
+        self.__run(calls)
+        self.assertEqual(self.stub.count('/v1/auth/register'), 1)
+
+    def test_expired_token_registered_again(self):
+        stale = datetime.datetime.now() - datetime.timedelta(days=1)
+        FileTokenStore(self.token_filename).save('old-token', stale.timestamp())
+
+        async def call(cfapi):
+            return (await cfapi.server_info()).status_code
+
+        self.assertEqual(self.__run(call), 200)
+        self.assertEqual(self.stub.count('/v1/auth/register'), 1)
+        self.assertEqual(FileTokenStore(self.token_filename).load()['token'], 'stub-token')
+
+    def test_bad_credentials(self):
+        async def call(cfapi):
+            return await cfapi.server_info()
+
+        stdout = io.StringIO()
+        with self.assertRaises(AuthenticationError) as raised, contextlib.redirect_stdout(stdout):
+            self.__run(call, app_secret='wrong')
+        self.assertEqual(raised.exception.status_code, 401)
+        # Nothing is printed outside of debug mode, the error reaches the caller.
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertEqual(self.stub.count('/v1/server/server/info'), 0)
+
+    def test_read(self):
+        self.stub.responses['/v1/server/server/player'] = {'status': True, 'cf-1': {'omega': {'playtime': 60}}}
+
+        async def call(cfapi):
+            return (await cfapi.server_player_stats('cf-1')).json()
+
+        self.assertEqual(self.__run(call)['cf-1']['omega']['playtime'], 60)
+
+    def test_write(self):
+        async def call(cfapi):
+            return await asyncio.gather(cfapi.server_kick('gs-1', 'test'),
+                                        cfapi.server_ban('cftools_id', 'cf-1', None, 'test'))
+
+        self.assertEqual([response.status_code for response in self.__run(call)], [204, 204])
+        self.assertEqual(self.stub.count('/v1/server/server/kick'), 1)
+        self.assertEqual(self.stub.count('/v1/banlist/banlist/bans'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
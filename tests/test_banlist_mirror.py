@@ -0,0 +1,87 @@
+import time
+import unittest
+
+from pycftools import BanlistMirror, CfToolsApi, MemoryTokenStore
+from stub_server import StubCfToolsServer
+
+
+class BanlistMirrorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.mirror = BanlistMirror()
+        self.mirror.load([
+            {'id': '1', 'identifier': 'cftools-a', 'format': 'cftools_id', 'expires_at': None},
+            {'id': '2', 'identifier': '10.0.*.*', 'format': 'ipv4', 'expires_at': None},
+            {'id': '3', 'identifier': '1.2.3.4', 'format': 'ipv4', 'expires_at': '2000-01-01T00:00:00.000Z'},
+            {'id': '4', 'identifier': 'cftools-b', 'format': 'cftools_id', 'expires_at': time.time() + 0.2},
+        ])
+
+    def test_lookup(self):
+        self.assertEqual(self.mirror.is_banned(cftools_id='cftools-a')['id'], '1')
+        self.assertEqual(self.mirror.is_banned(ipv4='10.0.20.30')['id'], '2')
+        self.assertIsNone(self.mirror.is_banned(ipv4='10.1.20.30'))
+        self.assertIsNone(self.mirror.is_banned(cftools_id='cftools-c', ipv4='8.8.8.8'))
+
+    def test_expiry(self):
+        self.assertIsNone(self.mirror.is_banned(ipv4='1.2.3.4'))
+        self.assertIsNotNone(self.mirror.is_banned(cftools_id='cftools-b'))
+        time.sleep(0.25)
+        self.assertIsNone(self.mirror.is_banned(cftools_id='cftools-b'))
+        self.assertEqual(len(self.mirror), 2)
+
+    def test_writes_followed(self):
+        self.mirror.on_write('server_ban', {'format': 'ipv4', 'identifier': '9.9.*.1',
+                                            'expires_at': None, 'reason': 'test'}, None)
+        self.assertIsNotNone(self.mirror.is_banned(ipv4='9.9.200.1'))
+        self.mirror.on_write('server_unban', {'ban_id': '1'}, None)
+        self.assertIsNone(self.mirror.is_banned(cftools_id='cftools-a'))
+
+
+class BanlistMirrorClientTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.stub.bans = [{'id': '1', 'identifier': 'cf-1', 'expires_at': None},
+                          {'id': '2', 'identifier': '10.0.*.*', 'expires_at': None}]
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=False,
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url)
+        self.mirror = BanlistMirror(self.test_cfapi)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def test_unappliable_write_marks_stale(self):
+        response = self.test_cfapi.server_ban('cftools_id', 'cf-3', 'next tuesday', 'cheating')
+        self.assertEqual(response.status_code, 204)
+        self.assertTrue(self.mirror.stale)
+        self.assertIsInstance(self.mirror.last_error, ValueError)
+        self.mirror.sync()
+        self.assertFalse(self.mirror.stale)
+
+    def test_sync_applies_differences(self):
+        self.test_cfapi.server_ban('cftools_id', 'cf-3', None, 'cheating')
+        self.assertIsNotNone(self.mirror.is_banned(cftools_id='cf-3'))
+        self.stub.bans = [{'id': '2', 'identifier': '10.0.*.*', 'expires_at': None},
+                          {'id': '3', 'identifier': 'cf-3', 'expires_at': None}]
+        self.mirror.sync()
+        self.assertIsNone(self.mirror.is_banned(cftools_id='cf-1'))
+        self.assertEqual(self.mirror.is_banned(cftools_id='cf-3')['id'], '3')
+        self.assertEqual(self.mirror.is_banned(ipv4='10.0.1.2')['id'], '2')
+        self.assertEqual(len(self.mirror), 2)
+
+    def test_sync_skips_unparsable_entry(self):
+        self.stub.bans = [{'id': '1', 'identifier': 'cf-1', 'expires_at': 'next tuesday'},
+                          {'id': '2', 'identifier': '10.0.*.*', 'expires_at': None},
+                          {'id': '4', 'identifier': 'cf-4', 'expires_at': None}]
+        self.mirror.sync()
+        self.assertIsInstance(self.mirror.last_error, ValueError)
+        self.assertEqual(self.mirror.is_banned(cftools_id='cf-4')['id'], '4')
+        self.assertEqual(self.mirror.is_banned(ipv4='10.0.1.2')['id'], '2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from pycftools import Broadcaster, CfToolsApi, MemoryTokenStore
+from stub_server import StubCfToolsServer
+
+
+class BroadcasterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.stub.players = [{'id': f'gs-{i}', 'gamedata': {'player_name': f'player-{i}'}} for i in range(50)]
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=False,
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url)
+        self.broadcaster = Broadcaster(self.test_cfapi)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def test_templated_private_messages(self):
+        result = self.broadcaster.broadcast('Hi {gamedata[player_name]}',
+                                            flt=lambda session: session['id'] != 'gs-0')
+        self.assertEqual((result.succeeded, len(result.failed)), (49, 0))
+        self.assertEqual(self.stub.count('/v1/server/server/message-private'), 49)
+
+    def test_same_message_for_everyone_is_public(self):
+        result = self.broadcaster.broadcast('Restart in 5 minutes')
+        self.assertEqual([item.key for item in result.items], ['public'])
+        self.assertEqual(self.stub.count('/v1/server/server/message-server'), 1)
+        self.assertEqual(self.stub.count('/v1/server/server/message-private'), 0)
+
+        self.broadcaster.broadcast('Restart in 5 minutes', players=['gs-1', 'gs-2'])
+        self.assertEqual(self.stub.count('/v1/server/server/message-private'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pycftools import Broadcaster, BulkModerator, CfToolsApi, CircuitBreaker, MemoryTokenStore, Retrier, deadline
+from stub_server import StubCfToolsServer
+
+BANS = '/v1/banlist/banlist/bans'
+
+
+class BulkModeratorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+
+    def tearDown(self) -> None:
+        self.stub.stop()
+
+    def __client(self, **kwargs):
+        return CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                          ip='127.0.0.1', game_port='2302',
+                          server_api_id='server',
+                          server_banlist_id='banlist',
+                          rate_limiter=False,
+                          token_store=MemoryTokenStore(),
+                          api_url=self.stub.url, **kwargs)
+
+    def test_post_not_repeated_after_5xx(self):
+        cfapi = self.__client(retrier=False)
+        self.stub.fail_next(BANS, 503)
+        result = BulkModerator(cfapi, backoff=0.01).ban_many([{'frmt': 'cftools_id', 'identifier': 'cf-1',
+                                                                'expires_at': None, 'reason': 'cheating'}])
+        item, = result.items
+        self.assertEqual((item.ok, item.status_code, item.retries), (False, 503, 0))
+        self.assertEqual(self.stub.count(BANS), 1)
+        cfapi.close()
+
+    def test_delete_retried_after_5xx(self):
+        cfapi = self.__client(retrier=False)
+        self.stub.fail_next(BANS, 503)
+        item, = BulkModerator(cfapi, backoff=0.01).unban_many(['ban-1']).items
+        self.assertEqual((item.ok, item.retries), (True, 1))
+        self.assertEqual(self.stub.count(BANS), 2)
+        cfapi.close()
+
+    def test_client_errors_fail_at_once(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+        breaker.record('server_whitelist_entry', False)
+        cfapi = self.__client(circuit_breaker=breaker)
+        item, = BulkModerator(cfapi, backoff=0.01).whitelist_many([{'cftools_id': 'cf-1', 'expires_at': None,
+                                                                    'comment': ''}]).items
+        self.assertEqual((item.ok, item.retries, item.error_type), (False, 0, 'CircuitOpenError'))
+        self.assertEqual(self.stub.count('/v1/server/server/whitelist'), 0)
+        cfapi.close()
+
+    def test_items_keep_the_deadline(self):
+        cfapi = self.__client()
+        with deadline(0):
+            result = BulkModerator(cfapi).unban_many(['ban-1', 'ban-2'])
+        self.assertEqual([item.error_type for item in result.items], ['DeadlineExceeded'] * 2)
+        self.assertEqual(self.stub.count(BANS), 0)
+        cfapi.close()
+
+    def test_single_retry_layer_with_retrier(self):
+        retrier = Retrier()
+        cfapi = self.__client(retrier=retrier)
+        self.stub.fail_next(BANS, 429, times=10, retry_after=0)
+        item, = BulkModerator(cfapi, retries=3, backoff=0.01).ban_many([{'frmt': 'cftools_id', 'identifier': 'cf-1',
+                                                                          'expires_at': None, 'reason': ''}]).items
+        self.assertEqual((item.ok, item.status_code, item.retries), (False, 429, 3))
+        self.assertEqual(self.stub.count(BANS), 4)
+        self.assertEqual(retrier.stats()['server_ban']['retries'], 3)
+        cfapi.close()
+
+    def test_broadcaster_single_retry_layer(self):
+        cfapi = self.__client()
+        self.stub.fail_next('/v1/server/server/message-private', 429, times=1, retry_after=0)
+        result = Broadcaster(cfapi).broadcast('hi', players=['gs-1', 'gs-2'])
+        self.assertEqual(result.succeeded, 2)
+        self.assertEqual(sum(item.retries for item in result.items), 1)
+        self.assertEqual(self.stub.count('/v1/server/server/message-private'), 3)
+        cfapi.close()
+
+    def test_resume_from_checkpoint(self):
+        cfapi = self.__client()
+        entries = [{'frmt': 'cftools_id', 'identifier': f'cf-{i}', 'expires_at': None, 'reason': ''}
+                   for i in range(20)]
+
+        def interrupted():
+            for entry in entries[:10]:
+                yield entry
+            raise KeyboardInterrupt
+
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint_file = os.path.join(directory, 'bans.jsonl')
+            moderator = BulkModerator(cfapi, max_workers=2, checkpoint_file=checkpoint_file)
+            self.assertRaises(KeyboardInterrupt, moderator.ban_many, interrupted())
+            with open(checkpoint_file, 'r', encoding='utf-8') as checkpoint:
+                done = {json.loads(line)['key'] for line in checkpoint}
+            with open(checkpoint_file, 'a', encoding='utf-8') as checkpoint:
+                # A line cut by the interruption.
+                checkpoint.write('{"method": "server_ban", "key": "cftool')
+            self.assertTrue(done)
+            self.assertEqual(self.stub.count(BANS), 10)
+
+            resent = []
+            result = moderator.ban_many(entries, on_result=lambda item: resent.append(item.key))
+            self.assertEqual(result.skipped, len(done))
+            self.assertEqual(result.succeeded, 20 - len(done))
+            self.assertFalse(done & set(resent))
+            self.assertEqual(self.stub.count(BANS), 10 + 20 - len(done))
+
+            # Everything is done, a third run sends nothing.
+            self.assertEqual(moderator.ban_many(entries).skipped, 20)
+            self.assertEqual(self.stub.count(BANS), 10 + 20 - len(done))
+        cfapi.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
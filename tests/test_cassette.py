@@ -0,0 +1,70 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from pycftools import Cassette, CassetteMissError, CfToolsApi, MemoryTokenStore
+from stub_server import StubCfToolsServer
+
+
+class CassetteTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'traffic.jsonl.gz')
+        self.stub = StubCfToolsServer().start()
+        self.stub.bans = [{'identifier': f'cf-{i}'} for i in range(5)]
+
+    def tearDown(self) -> None:
+        self.stub.stop()
+        self.directory.cleanup()
+
+    def __client(self, **kwargs):
+        return CfToolsApi(app_id='app', app_secret='top-secret', game_identifier='1',
+                          ip='127.0.0.1', game_port='2302',
+                          server_api_id='server',
+                          server_banlist_id='banlist',
+                          rate_limiter=False,
+                          token_store=MemoryTokenStore(),
+                          api_url=self.stub.url, **kwargs)
+
+    def test_record_scrubbed_and_replay_offline(self):
+        cassette = Cassette(self.filename)
+        cfapi = self.__client(transport=cassette.recorder())
+        self.assertEqual(cfapi.server_info().status_code, 200)
+        self.assertEqual(len(list(cfapi.iter_bans())), 5)
+        self.assertEqual(cfapi.server_kick('gs-1', 'bye').status_code, 204)
+        cfapi.close()
+
+        with gzip.open(self.filename, 'rt') as recorded:
+            text = recorded.read()
+        self.assertNotIn('top-secret', text)
+        self.assertNotIn(self.stub.token, text)
+
+        self.stub.stop()
+        cassette = Cassette(self.filename)
+        self.assertEqual(len(cassette.interactions), 4)
+        cfapi = self.__client(transport=cassette.replayer())
+        self.assertEqual(cfapi.server_info().json(), {'status': True})
+        self.assertEqual([ban['identifier'] for ban in cfapi.iter_bans()], [f'cf-{i}' for i in range(5)])
+        self.assertEqual(cfapi.server_kick('gs-1', 'bye').status_code, 204)
+        with self.assertRaises(CassetteMissError):
+            cfapi.server_kick('gs-2', 'bye')
+        cfapi.close()
+        self.stub = StubCfToolsServer().start()
+
+    def test_play_accelerated_against_stub(self):
+        cassette = Cassette(self.filename)
+        cfapi = self.__client(transport=cassette.recorder())
+        for i in range(10):
+            cfapi.server_player_stats(f'cf-{i}')
+        cfapi.close()
+
+        self.stub.token = Cassette.SCRUBBED
+        results = Cassette(self.filename).play(speed=100, concurrency=4, base_url=self.stub.url)
+        self.assertEqual(len(results), 11)
+        self.assertTrue(all(response.status_code == 200 for _, response, _, _ in results))
+        self.assertEqual(self.stub.count('/v1/server/server/player'), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from pycftools import _cli_entry, main
+from stub_server import StubCfToolsServer
+
+
+class CliTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.stub = StubCfToolsServer().start()
+        self.stub.page_size = 2
+        self.stub.whitelist = [{'uuid': f'w-{i}', 'user': {'cftools_id': f'cf-{i}'}, 'comment': 'donor'}
+                               for i in range(5)]
+
+    def tearDown(self) -> None:
+        self.stub.stop()
+        self.directory.cleanup()
+
+    def __path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def __run(self, *args):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+            code = main(['--app-id', 'app', '--app-secret', 'secret', '--server-api-id', 'server',
+                         '--banlist-id', 'banlist', '--token-file', self.__path('token.raw'),
+                         '--api-url', self.stub.url, *args])
+        return code, stdout.getvalue()
+
+    def test_export_csv_and_import(self):
+        code, _ = self.__run('export', 'whitelist', '-o', self.__path('whitelist.csv'))
+        self.assertEqual(code, 0)
+        with open(self.__path('whitelist.csv'), newline='', encoding='utf-8') as exported:
+            rows = list(csv.DictReader(exported))
+        self.assertEqual([row['cftools_id'] for row in rows], [f'cf-{i}' for i in range(5)])
+
+        code, _ = self.__run('import', 'priority', '-i', self.__path('whitelist.csv'), '--workers', '4')
+        self.assertEqual(code, 0)
+        self.assertEqual(self.stub.count('/v1/server/server/queuepriority'), 5)
+
+    def test_export_jsonl_to_stdout(self):
+        code, output = self.__run('export', 'whitelist')
+        self.assertEqual(code, 0)
+        self.assertEqual([json.loads(line) for line in output.splitlines()], self.stub.whitelist)
+
+    def test_ban_format_round_trip(self):
+        self.stub.bans = [{'id': '1', 'identifier': '10.0.*.*', 'reason': 'vpn'},
+                          {'id': '2', 'identifier': 'cf-1', 'reason': 'cheating', 'format': 'cftools_id'}]
+        code, _ = self.__run('export', 'bans', '-o', self.__path('bans.csv'))
+        self.assertEqual(code, 0)
+        with open(self.__path('bans.csv'), newline='', encoding='utf-8') as exported:
+            rows = list(csv.DictReader(exported))
+        self.assertEqual([row['format'] for row in rows], ['ipv4', 'cftools_id'])
+        entries = [_cli_entry('bans', {key: value or None for key, value in row.items()}) for row in rows]
+        self.assertEqual([(entry['frmt'], entry['identifier']) for entry in entries],
+                         [('ipv4', '10.0.*.*'), ('cftools_id', 'cf-1')])
+        # JSON lines keep the raw entries, the format is inferred on import.
+        self.assertEqual(_cli_entry('bans', self.stub.bans[0])['frmt'], 'ipv4')
+        with self.assertRaises(ValueError):
+            _cli_entry('bans', {'reason': 'no identifier'})
+
+    def test_sync_applies_diff_only(self):
+        with open(self.__path('donors.jsonl'), 'w', encoding='utf-8') as donors:
+            for cftools_id in ('cf-0', 'cf-1', 'cf-2', 'cf-new'):
+                donors.write(json.dumps({'cftools_id': cftools_id, 'comment': 'donor'}) + '\n')
+        code, output = self.__run('sync', 'whitelist', '-i', self.__path('donors.jsonl'), '--dry-run')
+        self.assertEqual((code, output.split('\n')), (0, ['+ cf-new', '- cf-3', '- cf-4', '']))
+        listing_requests = self.stub.count('/v1/server/server/whitelist')
+
+        code, _ = self.__run('sync', 'whitelist', '-i', self.__path('donors.jsonl'))
+        self.assertEqual(code, 0)
+        # Three listing pages, one add, two removes.
+        self.assertEqual(self.stub.count('/v1/server/server/whitelist') - listing_requests, 6)
+
+    def test_failures_exit_code(self):
+        self.stub.fail_next('/v1/server/server/queuepriority', 400)
+        with open(self.__path('priority.jsonl'), 'w', encoding='utf-8') as priority:
+            priority.write(json.dumps({'cftools_id': 'cf-1'}) + '\n')
+        code, _ = self.__run('import', 'priority', '-i', self.__path('priority.jsonl'))
+        self.assertEqual(code, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from pycftools import CfToolsCluster, DeadlineExceeded, MemoryTokenStore, PooledTransport, RateLimiter, \
+    RateLimitExceeded, deadline
+from stub_server import StubCfToolsServer
+
+
+class CfToolsClusterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.transport = PooledTransport()
+        self.limiter = RateLimiter({'server_player_stats': (1, 60)})
+        self.cluster = CfToolsCluster(app_id='app', app_secret='secret',
+                                      rate_limiter=self.limiter,
+                                      token_store=MemoryTokenStore(),
+                                      transport=self.transport,
+                                      max_workers=4,
+                                      api_url=self.stub.url)
+        for i in range(3):
+            self.cluster.add_server(f's{i}', '1', '127.0.0.1', str(2302 + i), f'server{i}', 'banlist')
+
+    def tearDown(self) -> None:
+        self.cluster.close()
+        self.stub.stop()
+
+    def test_shared_token_store(self):
+        results = self.cluster.info_for_all()
+        self.assertEqual({name: response.status_code for name, response in results.items()},
+                         {'s0': 200, 's1': 200, 's2': 200})
+        self.assertEqual(self.stub.count('/v1/auth/register'), 1)
+        for i in range(3):
+            self.assertEqual(self.stub.count(f'/v1/server/server{i}/info'), 1)
+
+    def test_shared_session(self):
+        self.cluster.info_for_all()
+        # Every request of every server went through the one transport of the shared session.
+        self.assertEqual(self.transport.stats()['requests'], 4)
+        for name in self.cluster:
+            self.assertEqual(self.cluster[name].connection_stats(), self.cluster.connection_stats())
+
+    def test_shared_limiter(self):
+        handles = [self.cluster[name] for name in self.cluster]
+        self.assertTrue(all(handle.rate_limiter is self.limiter for handle in handles))
+        self.assertTrue(all(handle.retrier is handles[0].retrier for handle in handles))
+        self.assertTrue(all(handle.single_flight is handles[0].single_flight for handle in handles))
+        with RateLimiter.nowait():
+            self.assertEqual(handles[0].server_player_stats('cf-1').status_code, 200)
+            # The quota of the route is used up for the whole cluster.
+            self.assertRaises(RateLimitExceeded, handles[1].server_player_stats, 'cf-1')
+
+    def test_handle_close_leaves_shared_session_open(self):
+        self.cluster['s0'].server_info()
+        self.cluster['s0'].close()
+        requests_before = self.transport.stats()['requests']
+        self.assertEqual(self.cluster['s1'].server_info().status_code, 200)
+        self.assertEqual(self.transport.stats()['requests'], requests_before + 1)
+        # The connection opened by s0 is reused, the pool was not closed.
+        self.assertEqual(self.transport.stats()['connections'], 1)
+
+    def test_fan_out_keeps_the_deadline(self):
+        with deadline(0):
+            results = self.cluster.info_for_all()
+        self.assertTrue(all(isinstance(error, DeadlineExceeded) for error in results.values()))
+        self.assertEqual(self.transport.stats()['requests'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import datetime
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from pycftools import CfToolsApi, MemoryTokenStore
+from stub_server import StubCfToolsServer
+
+
+class ConcurrencyStressTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.token_store = MemoryTokenStore()
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=False,
+                                     token_store=self.token_store,
+                                     api_url=self.stub.url)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def __fan_out(self, calls, workers=32):
+        def call(i):
+            if i % 2:
+                return self.test_cfapi.server_kick(f'gs-{i}', 'stress').status_code
+            return self.test_cfapi.server_player_stats(f'cf-{i}').status_code
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(call, range(calls)))
+
+    def test_parallel_calls_register_once(self):
+        statuses = self.__fan_out(2000)
+        self.assertEqual(statuses.count(200), 1000)
+        self.assertEqual(statuses.count(204), 1000)
+        self.assertEqual(self.stub.count('/v1/auth/register'), 1)
+
+    def test_outdated_token_refreshed_single_flight(self):
+        outdated = datetime.datetime.now().timestamp() - 2 * 43200
+        self.token_store.save('outdated-token', outdated)
+        statuses = self.__fan_out(1000)
+        self.assertEqual(set(statuses), {200, 204})
+        self.assertEqual(self.stub.count('/v1/auth/register'), 1)
+        self.assertEqual(self.token_store.load()['token'], self.stub.token)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from pycftools import CfToolsApi, MemoryTokenStore, Metrics
+from stub_server import StubCfToolsServer
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.spans = []
+        self.responses = []
+        self.metrics = Metrics(span_exporter=self.spans.append)
+        self.metrics.add_response_hook(lambda route, method, response, error, duration:
+                                       self.responses.append((route, response.status_code)))
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=False,
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url,
+                                     metrics=self.metrics)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def test_histograms_and_counters(self):
+        for _ in range(3):
+            self.test_cfapi.server_info()
+        self.test_cfapi.server_kick('gs-1', 'reason')
+        latency = self.metrics.snapshot()['latency']
+        self.assertEqual(latency['server_info']['count'], 3)
+        self.assertEqual(latency['auth']['count'], 1)
+        self.assertEqual(self.responses, [('auth', 200)] + [('server_info', 200)] * 3 + [('server_kick', 204)])
+
+        text = self.metrics.prometheus()
+        self.assertIn('pycftools_request_duration_seconds_bucket{route="server_info",le="+Inf"} 3', text)
+        self.assertIn('pycftools_requests_total{route="server_kick",status="204"} 1.0', text)
+
+    def test_spans(self):
+        with self.metrics.span('moderation', admin='alice') as parent:
+            self.test_cfapi.server_kick('gs-1', 'reason')
+        kick = [span for span in self.spans if span.name == 'POST server_kick'][0]
+        self.assertEqual((kick.trace_id, kick.parent_span_id), (parent.trace_id, parent.span_id))
+        otlp = kick.to_otlp()
+        self.assertEqual(otlp['status'], {'code': 1})
+        self.assertIn({'key': 'http.response.status_code', 'value': {'intValue': '204'}}, otlp['attributes'])
+        self.assertIs(self.spans[-1], parent)
+
+
+if __name__ == '__main__':
+    unittest.main()
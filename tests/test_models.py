@@ -0,0 +1,78 @@
+import unittest
+from unittest import mock
+
+import requests
+
+import pycftools
+from pycftools import Ban, CfToolsApi, LeaderboardRow, ListEntry, MemoryTokenStore, PlayerSession, ServerStatistics
+from stub_server import StubCfToolsServer
+
+
+class ModelsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.stub.players = [{'id': f'gs-{i}', 'cftools_id': f'cf-{i}',
+                              'gamedata': {'player_name': f'Player {i}', 'steam64': str(i)},
+                              'live': {'loaded': True, 'ping': {'actual': 40 + i}}} for i in range(50)]
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=False,
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def test_player_listing(self):
+        response = self.test_cfapi.server_player_list()
+        players = PlayerSession.listing(response)
+        self.assertIs(players.response, response)
+        self.assertEqual(len(players), 50)
+        player = players.by('cftools_id')['cf-7']
+        self.assertEqual((player.id, player.name, player.steam64, player.ping, player.ip), ('gs-7', 'Player 7', '7', 47, None))
+        self.assertFalse(hasattr(player, '__dict__'))
+        self.assertEqual(players.data['sessions'][0]['id'], 'gs-0')
+
+    def test_decoded_on_first_access(self):
+        entry = {'latest_name': 'Top', 'cftools_id': 'cf-1', 'kills': 9}
+        row = LeaderboardRow(entry)
+        self.assertIs(row._source, entry)
+        self.assertEqual(row.kills, 9)
+        self.assertIsNone(row._source)
+        self.assertEqual(row.to_dict()['name'], 'Top')
+        with self.assertRaises(AttributeError):
+            row.missing
+
+    def test_equal_by_fields_and_not_hashable(self):
+        self.assertEqual(Ban({'id': '1', 'identifier': 'cf-1'}), Ban({'_id': '1', 'identifier': 'cf-1'}))
+        self.assertNotEqual(Ban({'id': '1', 'identifier': 'cf-1'}), Ban({'id': '2', 'identifier': 'cf-1'}))
+        with self.assertRaises(TypeError):
+            hash(Ban({'id': '1'}))
+
+    def test_streamed_models(self):
+        self.stub.bans = [{'id': str(i), 'identifier': f'cf-{i}', 'reason': 'cheating'} for i in range(10)]
+        self.stub.whitelist = [{'uuid': 'w', 'user': {'cftools_id': 'cf-1'}, 'comment': 'donor'}]
+        bans = list(self.test_cfapi.iter_bans(model=Ban))
+        self.assertEqual([ban.identifier for ban in bans], [f'cf-{i}' for i in range(10)])
+        entry, = self.test_cfapi.iter_whitelist(model=ListEntry)
+        self.assertEqual((entry.id, entry.cftools_id, entry.comment), ('w', 'cf-1', 'donor'))
+
+    def test_statistics_without_orjson(self):
+        self.stub.responses['/v1/server/server/statistics'] = {'general': {'players': 12, 'uptime': 3600}}
+        with mock.patch.object(pycftools, 'orjson', None):
+            statistics = ServerStatistics.from_response(self.test_cfapi.server_statistics())
+            self.assertEqual(statistics.get('general.players'), 12.0)
+        self.assertEqual(statistics.values, {'general.players': 12.0, 'general.uptime': 3600.0})
+
+    def test_error_response_raises(self):
+        self.stub.fail_next('/v1/server/server/GSM/list', 404)
+        players = PlayerSession.listing(self.test_cfapi.server_player_list())
+        with self.assertRaises(requests.HTTPError):
+            len(players)
+
+
+if __name__ == '__main__':
+    unittest.main()
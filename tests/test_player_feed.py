@@ -0,0 +1,72 @@
+import threading
+import unittest
+
+import requests
+
+from pycftools import CfToolsApi, MemoryTokenStore, PlayerFeed
+from stub_server import StubCfToolsServer
+
+
+class PlayerFeedTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=False,
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def test_join_leave_update(self):
+        joined, left = [], []
+        feed = PlayerFeed(self.test_cfapi, on_join=joined.append, on_leave=left.append, fields=('gamedata',),
+                          min_interval=1, max_interval=30)
+        self.stub.players = [{'id': 'gs-1', 'gamedata': {'player_name': 'a'}, 'live': {'ping': 10}},
+                             {'id': 'gs-2', 'gamedata': {'player_name': 'b'}, 'live': {'ping': 20}}]
+        self.assertEqual(feed.poll(), [])
+        self.assertEqual(set(feed.players), {'gs-1', 'gs-2'})
+
+        self.stub.players = [{'id': 'gs-1', 'gamedata': {'player_name': 'a'}, 'live': {'ping': 99}},
+                             {'id': 'gs-2', 'gamedata': {'player_name': 'c'}, 'live': {'ping': 20}},
+                             {'id': 'gs-3', 'gamedata': {'player_name': 'd'}, 'live': {'ping': 30}}]
+        events = feed.poll()
+        self.assertEqual(sorted((event.kind, event.gamesession_id) for event in events),
+                         [('join', 'gs-3'), ('update', 'gs-2')])
+        self.assertEqual(events[0].previous if events[0].kind == 'update' else events[1].previous,
+                         {'id': 'gs-2', 'gamedata': {'player_name': 'b'}, 'live': {'ping': 20}})
+
+        self.stub.players = self.stub.players[2:]
+        self.assertEqual(sorted(event.gamesession_id for event in feed.poll()), ['gs-1', 'gs-2'])
+        self.assertEqual([event.gamesession_id for event in joined], ['gs-3'])
+        self.assertEqual(sorted(event.gamesession_id for event in left), ['gs-1', 'gs-2'])
+
+    def test_quiet_server_backs_off(self):
+        feed = PlayerFeed(self.test_cfapi, min_interval=1, max_interval=30)
+        for _ in range(3):
+            feed.poll()
+        self.assertEqual(feed.interval, 30)
+
+    def test_poller_reports_errors(self):
+        failed = threading.Event()
+        errors = []
+
+        def on_error(err):
+            errors.append(err)
+            failed.set()
+
+        self.stub.fail_next('/v1/server/server/GSM/list', 404)
+        feed = PlayerFeed(self.test_cfapi, min_interval=1, max_interval=30, on_error=on_error)
+        feed.start()
+        self.assertTrue(failed.wait(5))
+        feed.stop()
+        self.assertIsInstance(errors[0], requests.HTTPError)
+        self.assertIs(feed.last_error, errors[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from pycftools import CfToolsApi, MemoryTokenStore, PlayerStatsHarvester
+from stub_server import StubCfToolsServer
+
+
+class PlayerStatsHarvesterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'stats.sqlite3')
+        self.stub = StubCfToolsServer().start()
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=False,
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+        self.directory.cleanup()
+
+    def test_harvest_skips_fresh_and_leaderboard_players(self):
+        self.stub.players = [{'id': 'gs-1', 'cftools_id': 'online'}]
+        self.stub.responses['/v1/server/server/leaderboard'] = {'leaderboard': [{'cftools_id': 'top', 'kills': 9}]}
+        harvester = PlayerStatsHarvester(self.test_cfapi, self.filename)
+        self.assertEqual(harvester.merge_leaderboard(stats=('kills',)), 1)
+        self.assertEqual(harvester.plan(['top', 'offline']), ['online', 'offline'])
+
+        summary = harvester.harvest(['top', 'offline'], max_requests=1)
+        self.assertEqual((summary['fetched'], summary['remaining']), (1, 1))
+        self.assertEqual(harvester.get('online')['source'], 'player_stats')
+        harvester.close()
+
+        # A rerun resumes with the stale players only.
+        harvester = PlayerStatsHarvester(self.test_cfapi, self.filename)
+        self.assertEqual(harvester.harvest(['top', 'offline'])['fetched'], 1)
+        self.assertEqual(self.stub.count('/v1/server/server/player'), 2)
+        self.assertEqual(dict(harvester.items())['top'], {'cftools_id': 'top', 'kills': 9})
+        harvester.close()
+
+    def test_non_json_body_is_a_failure_of_its_player(self):
+        self.stub.players = []
+        # An empty 200 body, not json.
+        self.stub.responses['/v1/server/server/player'] = None
+        harvester = PlayerStatsHarvester(self.test_cfapi, self.filename)
+        summary = harvester.harvest(['broken', 'next'])
+        self.assertEqual((summary['fetched'], summary['remaining']), (0, 0))
+        self.assertEqual(sorted(summary['errors']), ['broken', 'next'])
+        self.assertIsNone(harvester.get('broken'))
+        harvester.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import pickle
+import re
+import tempfile
+import unittest
+
+from pycftools import CfToolsApi, Retrier, RetryPolicy
+from stub_server import StubCfToolsServer
+
+
+class FullModuleTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.token_filename = os.path.join(self.directory.name, 'token.raw')
+        self.stub = StubCfToolsServer(credentials=('app', 'secret')).start()
+        self.test_cfapi = CfToolsApi(app_id='app',
+                                     app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     auth_token_filename=self.token_filename,
+                                     rate_limiter=False,
+                                     retrier=Retrier(RetryPolicy(backoff=0.01)),
+                                     api_url=self.stub.url)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+        self.directory.cleanup()
+
+    def test_cftools_server_id_hashing(self):
+        self.assertTrue(re.match(r"\A(([0-9a-f]{40})|([0-9a-f]{6,8}))",
+                                 self.test_cfapi._create_server_id_hash('1', '222.222.228.222', '2302')))
+
+    def test_cftools_register_test(self):
+        self.assertEqual(self.test_cfapi.server_info().status_code, 200)
+        self.assertEqual(self.test_cfapi.server_statistics().status_code, 200)
+        self.assertEqual(self.stub.count('/v1/auth/register'), 1)
+
+    def test_cftools_write_to_file_Test(self):
+        self.test_cfapi.server_info()
+        with open(self.token_filename, 'rb') as test_file:
+            dtest = pickle.load(test_file)
+        self.assertIn('token', dtest)
+
+    def test_rate_limited_call_retried(self):
+        self.stub.fail_next('/v1/server/server/info', 429, times=2, retry_after=0)
+        self.assertEqual(self.test_cfapi.server_info().status_code, 200)
+        self.assertEqual(self.stub.count('/v1/server/server/info'), 3)
+
+    def test_streamed_listing_pages(self):
+        self.stub.bans = [{'id': str(i), 'identifier': f'cftools-{i}', 'format': 'cftools_id'} for i in range(25)]
+        self.stub.page_size = 10
+        self.assertEqual([ban['id'] for ban in self.test_cfapi.iter_bans()], [str(i) for i in range(25)])
+        self.assertEqual(self.stub.count('/v1/banlist/banlist/bans'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from pycftools import CfToolsApi, MemoryTokenStore, RateLimiter, RateLimitExceeded
+from stub_server import StubCfToolsServer
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_try_acquire_and_wait_time(self):
+        limiter = RateLimiter({'route': (2, 1)})
+        self.assertEqual(limiter.wait_time('route'), 0.0)
+        self.assertTrue(limiter.try_acquire('route'))
+        self.assertTrue(limiter.try_acquire('route'))
+        self.assertFalse(limiter.try_acquire('route'))
+        # One token comes back every half second.
+        self.assertAlmostEqual(limiter.wait_time('route'), 0.5, delta=0.05)
+        time.sleep(0.55)
+        self.assertTrue(limiter.try_acquire('route'))
+
+    def test_unlimited_route(self):
+        limiter = RateLimiter({'route': (1, 60)})
+        for _ in range(100):
+            self.assertTrue(limiter.try_acquire('other'))
+        self.assertEqual(limiter.wait_time('other'), 0.0)
+
+    def test_acquire_paces_and_counts_queue_depth(self):
+        limiter = RateLimiter({'route': (1, 0.2)})
+        limiter.acquire('route')
+        threads = [threading.Thread(target=limiter.acquire, args=('route',)) for _ in range(2)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        self.assertEqual(limiter.queue_depth('route'), 2)
+        self.assertEqual(limiter.queue_depth(), 2)
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.monotonic() - started, 0.35)
+        self.assertEqual(limiter.queue_depth(), 0)
+
+    def test_nowait_raises(self):
+        limiter = RateLimiter({'route': (1, 60)})
+        with RateLimiter.nowait():
+            limiter.acquire('route')
+            with self.assertRaises(RateLimitExceeded) as raised:
+                limiter.acquire('route')
+        self.assertEqual(raised.exception.route, 'route')
+        self.assertAlmostEqual(raised.exception.retry_after, 60, delta=1)
+        self.assertEqual(limiter.queue_depth(), 0)
+
+    def test_nowait_async(self):
+        limiter = RateLimiter({'route': (1, 60)})
+
+        async def run():
+            with RateLimiter.nowait():
+                await limiter.acquire_async('route')
+                with self.assertRaises(RateLimitExceeded):
+                    await limiter.acquire_async('route')
+
+        asyncio.run(run())
+
+    def test_cancelled_wait_refunds_the_slot(self):
+        limiter = RateLimiter({'route': (1, 60)})
+
+        async def run():
+            await limiter.acquire_async('route')
+            waiter = asyncio.ensure_future(limiter.acquire_async('route'))
+            await asyncio.sleep(0.01)
+            self.assertEqual(limiter.queue_depth('route'), 1)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+
+        asyncio.run(run())
+        self.assertEqual(limiter.queue_depth(), 0)
+        # The next call waits for one slot, not for the slot of the cancelled call as well.
+        self.assertAlmostEqual(limiter.wait_time('route'), 60, delta=1)
+
+    def test_set_quota(self):
+        limiter = RateLimiter({})
+        limiter.set_quota('route', 1, 60)
+        self.assertTrue(limiter.try_acquire('route'))
+        self.assertFalse(limiter.try_acquire('route'))
+
+
+class ClientRateLimiterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.limiter = RateLimiter({'server_player_stats': (1, 60), 'server_leaderboard': (2, 60)})
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=self.limiter,
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def test_per_route_quotas(self):
+        with RateLimiter.nowait():
+            self.assertEqual(self.test_cfapi.server_player_stats('cf-1').status_code, 200)
+            self.assertRaises(RateLimitExceeded, self.test_cfapi.server_player_stats, 'cf-2')
+            for _ in range(2):
+                self.assertEqual(self.test_cfapi.server_leaderboard('kills', -1, 10).status_code, 200)
+            self.assertRaises(RateLimitExceeded, self.test_cfapi.server_leaderboard, 'kills', -1, 10)
+            # Routes without quota are not limited.
+            for _ in range(5):
+                self.assertEqual(self.test_cfapi.server_info().status_code, 200)
+        self.assertEqual(self.stub.count('/v1/server/server/player'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
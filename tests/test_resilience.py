@@ -0,0 +1,79 @@
+import time
+import unittest
+
+from pycftools import CfToolsApi, CircuitBreaker, CircuitOpenError, DeadlineExceeded, MemoryTokenStore, RateLimiter, \
+    RateLimitExceeded, deadline
+from stub_server import StubCfToolsServer
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_threshold_and_probes(self):
+        breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=0.2)
+        for _ in range(3):
+            breaker.allow('server_info')
+            breaker.record('server_info', False)
+        self.assertEqual(breaker.state('server_info'), CircuitBreaker.OPEN)
+        self.assertRaises(CircuitOpenError, breaker.allow, 'server_info')
+        # Other routes are not affected.
+        breaker.allow('server_kick')
+
+        time.sleep(0.25)
+        breaker.allow('server_info')
+        self.assertEqual(breaker.state('server_info'), CircuitBreaker.HALF_OPEN)
+        # Only one probe at a time.
+        self.assertRaises(CircuitOpenError, breaker.allow, 'server_info')
+        breaker.record('server_info', False)
+        self.assertEqual(breaker.state('server_info'), CircuitBreaker.OPEN)
+
+        time.sleep(0.25)
+        breaker.allow('server_info')
+        breaker.record('server_info', True)
+        self.assertEqual(breaker.state('server_info'), CircuitBreaker.CLOSED)
+
+
+class DeadlineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=RateLimiter({'server_player_stats': (1, 60)}),
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def test_rate_limit_wait_past_deadline_fails_fast(self):
+        with deadline(1.0):
+            self.assertEqual(self.test_cfapi.server_player_stats('cf-1').status_code, 200)
+            started = time.monotonic()
+            self.assertRaises(DeadlineExceeded, self.test_cfapi.server_player_stats, 'cf-2')
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_failed_wait_does_not_take_the_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+        cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                           ip='127.0.0.1', game_port='2302',
+                           server_api_id='server',
+                           server_banlist_id='banlist',
+                           rate_limiter=RateLimiter({'server_player_stats': (1, 60)}),
+                           circuit_breaker=breaker,
+                           token_store=MemoryTokenStore(),
+                           api_url=self.stub.url)
+        try:
+            cfapi.server_player_stats('cf-1')
+            breaker.record('server_player_stats', False)
+            time.sleep(0.1)
+            with RateLimiter.nowait():
+                self.assertRaises(RateLimitExceeded, cfapi.server_player_stats, 'cf-2')
+            # The request never got to the breaker, the probe is still free.
+            self.assertEqual(breaker.state('server_player_stats'), CircuitBreaker.OPEN)
+        finally:
+            cfapi.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import time
+import types
+import unittest
+
+from pycftools import CfToolsApi, MemoryTokenStore, ResponseCache
+from stub_server import StubCfToolsServer
+
+
+def _response(status_code=200):
+    return types.SimpleNamespace(status_code=status_code)
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_ttl_expiry(self):
+        cache = ResponseCache({'server_info': 0.1})
+        key = ResponseCache.make_key('http://api/info')
+        response = _response()
+        cache.put('server_info', key, response)
+        self.assertIs(cache.get(key), response)
+        time.sleep(0.15)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 0})
+
+    def test_only_cached_routes_and_successes(self):
+        cache = ResponseCache({'server_info': 30})
+        cache.put('server_kick', 'kick', _response())
+        cache.put('server_info', 'failed', _response(503))
+        self.assertIsNone(cache.get('kick'))
+        self.assertIsNone(cache.get('failed'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache({'server_info': 30}, maxsize=2)
+        cache.put('server_info', 'a', _response())
+        cache.put('server_info', 'b', _response())
+        # Reading 'a' makes 'b' the least recently used.
+        cache.get('a')
+        cache.put('server_info', 'c', _response())
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.stats(), {'hits': 3, 'misses': 1, 'evictions': 1, 'size': 2})
+
+    def test_make_key_ignores_params_order(self):
+        self.assertEqual(ResponseCache.make_key('url', {'a': 1, 'b': 2}),
+                         ResponseCache.make_key('url', {'b': '2', 'a': 1}))
+        self.assertNotEqual(ResponseCache.make_key('url', {'a': 1}), ResponseCache.make_key('url'))
+
+
+class ClientResponseCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.cache = ResponseCache()
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=False,
+                                     response_cache=self.cache,
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def test_reads_served_from_cache(self):
+        for _ in range(3):
+            self.assertEqual(self.test_cfapi.server_info().status_code, 200)
+        self.assertEqual(self.stub.count('/v1/server/server/info'), 1)
+        self.assertEqual(self.cache.stats(), {'hits': 2, 'misses': 1, 'evictions': 0, 'size': 1})
+
+    def test_invalidation_on_write(self):
+        self.test_cfapi.server_banlist(None)
+        self.test_cfapi.server_info()
+        self.test_cfapi.server_ban('cftools_id', 'cf-1', None, 'test')
+        self.test_cfapi.server_banlist(None)
+        self.test_cfapi.server_info()
+        # The ban (a POST to the same path) made the banlist stale, server info stays cached.
+        self.assertEqual(self.stub.count('/v1/banlist/banlist/bans'), 3)
+        self.assertEqual(self.stub.count('/v1/server/server/info'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import time
+import unittest
+
+from pycftools import CfToolsApi, MemoryTokenStore, Retrier, RetryPolicy
+from stub_server import StubCfToolsServer
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_retryable(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.retryable('POST', 429))
+        self.assertTrue(policy.retryable('GET', 503))
+        self.assertTrue(policy.retryable('GET'))
+        self.assertFalse(policy.retryable('POST', 503))
+        self.assertFalse(policy.retryable('POST'))
+        self.assertFalse(policy.retryable('GET', 404))
+        self.assertTrue(RetryPolicy(retry_non_idempotent=True).retryable('POST', 503))
+
+    def test_delay(self):
+        policy = RetryPolicy(backoff=1.0, max_backoff=4.0)
+        self.assertEqual(policy.delay(0, '2'), 2.0)
+        self.assertEqual(policy.delay(0, '120'), 4.0)
+        for attempt in range(6):
+            self.assertLessEqual(policy.delay(attempt), min(4.0, 2 ** attempt))
+        self.assertLessEqual(policy.delay(0, 'not a date'), 1.0)
+
+
+class RetrierTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.retrier = Retrier(RetryPolicy(backoff=0.01), budget_burst=3, budget_ratio=0.0)
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=False,
+                                     circuit_breaker=False,
+                                     retrier=self.retrier,
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url)
+        self.test_cfapi.server_info()
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def test_retry_after_honored(self):
+        self.stub.fail_next('/v1/server/server/info', 429, retry_after=0.3)
+        started = time.monotonic()
+        self.assertEqual(self.test_cfapi.server_info().status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertEqual(self.stub.count('/v1/server/server/info'), 3)
+
+    def test_post_not_retried_on_5xx(self):
+        self.stub.fail_next('/v1/server/server/kick', 503)
+        self.assertEqual(self.test_cfapi.server_kick('gs-1', 'test').status_code, 503)
+        self.assertEqual(self.stub.count('/v1/server/server/kick'), 1)
+
+    def test_post_retried_on_429(self):
+        self.stub.fail_next('/v1/server/server/kick', 429, retry_after=0)
+        self.assertEqual(self.test_cfapi.server_kick('gs-1', 'test').status_code, 204)
+        self.assertEqual(self.stub.count('/v1/server/server/kick'), 2)
+
+    def test_get_gives_up_after_max_retries(self):
+        self.stub.fail_next('/v1/server/server/info', 503, times=5)
+        self.assertEqual(self.test_cfapi.server_info().status_code, 503)
+        # The request of setUp, then the first attempt and 3 retries - the budget allows exactly those.
+        self.assertEqual(self.stub.count('/v1/server/server/info'), 5)
+        self.assertEqual(self.retrier.stats()['server_info']['gave_up'], 1)
+        self.assertEqual(self.retrier.budget, 0)
+
+    def test_budget_exhaustion(self):
+        self.stub.fail_next('/v1/server/server/info', 503, times=3)
+        self.assertEqual(self.test_cfapi.server_info().status_code, 200)
+        self.stub.fail_next('/v1/server/server/info', 503)
+        self.assertEqual(self.test_cfapi.server_info().status_code, 503)
+        stats = self.retrier.stats()['server_info']
+        self.assertEqual(stats['budget_denied'], 1)
+        self.assertEqual(self.stub.count('/v1/server/server/info'), 6)
+
+    def test_stats(self):
+        self.stub.fail_next('/v1/server/server/info', 503)
+        self.test_cfapi.server_info()
+        self.assertEqual(self.retrier.stats()['server_info'],
+                         {'requests': 2, 'retries': 1, 'recovered': 1, 'gave_up': 0, 'budget_denied': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
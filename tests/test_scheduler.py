@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import pycftools
+from pycftools import RequestDropped, RequestScheduler
+
+
+class RequestSchedulerTest(unittest.TestCase):
+    def __queue(self, scheduler, route, order, errors):
+        def run():
+            try:
+                scheduler.acquire(route)
+            except RequestDropped:
+                errors.append(route)
+                return
+            order.append(route)
+            scheduler.release()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        # Let it reach the queue, so the queue order is known.
+        while sum(scheduler.stats()['queued'].values()) + len(errors) < len(self.threads) + 1:
+            time.sleep(0.001)
+        self.threads.append(thread)
+
+    def setUp(self) -> None:
+        self.threads = []
+
+    def test_moderation_preempts_background(self):
+        scheduler = RequestScheduler(max_concurrent=1)
+        order, errors = [], []
+        scheduler.acquire('server_info')
+        for route in ('server_statistics', 'server_leaderboard', 'server_statistics', 'server_info', 'server_kick'):
+            self.__queue(scheduler, route, order, errors)
+        scheduler.release()
+        for thread in self.threads:
+            thread.join()
+        # Moderation, realtime, then background routes taking turns.
+        self.assertEqual(order, ['server_kick', 'server_info', 'server_statistics', 'server_leaderboard',
+                                 'server_statistics'])
+        self.assertEqual(scheduler.stats()['in_flight'], 0)
+
+    def test_background_reads_dropped_under_pressure(self):
+        scheduler = RequestScheduler(max_concurrent=1, max_background_queue=2, stale_after=0.05)
+        order, errors = [], []
+        scheduler.acquire('server_kick')
+        for _ in range(3):
+            self.__queue(scheduler, 'server_statistics', order, errors)
+        self.assertEqual(errors, ['server_statistics'])
+        time.sleep(0.1)
+        with RequestScheduler.priority(RequestScheduler.MODERATION):
+            self.assertEqual(scheduler.priority_of('server_statistics'), RequestScheduler.MODERATION)
+        scheduler.release()
+        for thread in self.threads:
+            thread.join()
+        self.assertEqual((order, scheduler.stats()['dropped']), ([], 3))
+
+    def test_dropped_as_wait_runs_out(self):
+        scheduler = RequestScheduler(max_concurrent=1, stale_after=0)
+        scheduler.acquire('server_info')
+
+        class ExpiringEvent(threading.Event):
+            # The waiter is dropped as stale at the moment its wait runs out.
+            def wait(self, timeout=None):
+                time.sleep(0.01)
+                scheduler.release()
+                return False
+
+        with mock.patch.object(pycftools.threading, 'Event', ExpiringEvent):
+            with self.assertRaises(RequestDropped) as raised:
+                scheduler.acquire('server_statistics', timeout=1)
+        self.assertEqual(raised.exception.reason, 'stale')
+        stats = scheduler.stats()
+        self.assertEqual((stats['in_flight'], stats['queued']['background'], stats['dropped']), (0, 0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from pycftools import CfToolsApi, MemoryTokenStore, SingleFlight
+from stub_server import StubCfToolsServer
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_coalesces_concurrent_calls(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+
+        with ThreadPoolExecutor(8) as executor:
+            futures = [executor.submit(flight.do, 'key', fn) for _ in range(8)]
+            while flight.coalesced < 7:
+                release.wait(0.01)
+            release.set()
+            self.assertEqual([future.result() for future in futures], ['result'] * 8)
+        self.assertEqual(len(calls), 1)
+        # Once the call is done, the next one runs again.
+        self.assertEqual(flight.do('key', fn), 'result')
+        self.assertEqual(len(calls), 2)
+
+    def test_exception_shared_with_waiters(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fn():
+            release.wait(5)
+            raise ValueError('failed')
+
+        with ThreadPoolExecutor(4) as executor:
+            futures = [executor.submit(flight.do, 'key', fn) for _ in range(4)]
+            while flight.coalesced < 3:
+                release.wait(0.01)
+            release.set()
+            for future in futures:
+                self.assertRaises(ValueError, future.result)
+
+    def test_do_async(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fn(value):
+            calls.append(value)
+            await asyncio.sleep(0.05)
+            return value
+
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise ValueError('failed')
+
+        async def run():
+            results = await asyncio.gather(*[flight.do_async('key', fn, 1) for _ in range(5)],
+                                           flight.do_async('other', fn, 2))
+            self.assertEqual(results, [1, 1, 1, 1, 1, 2])
+            errors = await asyncio.gather(*[flight.do_async('failing', failing) for _ in range(3)],
+                                          return_exceptions=True)
+            self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+
+        asyncio.run(run())
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(flight.coalesced, 6)
+
+    def test_cancelled_leader_leaves_followers_waiting(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return 'result'
+
+        async def run():
+            leader = asyncio.ensure_future(flight.do_async('key', fn))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do_async('key', fn))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            self.assertEqual(await follower, 'result')
+
+        asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.coalesced, 1)
+
+
+class ClientSingleFlightTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=False,
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url)
+        self.test_cfapi.server_info()
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def test_concurrent_identical_gets_coalesced(self):
+        self.stub.latency = 0.3
+        with ThreadPoolExecutor(8) as executor:
+            statuses = list(executor.map(lambda _: self.test_cfapi.server_info().status_code, range(8)))
+        self.assertEqual(statuses, [200] * 8)
+        self.assertEqual(self.stub.count('/v1/server/server/info'), 2)
+        self.assertEqual(self.test_cfapi.single_flight.coalesced, 7)
+
+    def test_writes_not_coalesced(self):
+        self.stub.latency = 0.1
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda _: self.test_cfapi.server_kick('gs-1', 'test'), range(4)))
+        self.assertEqual(self.stub.count('/v1/server/server/kick'), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
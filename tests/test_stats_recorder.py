@@ -0,0 +1,74 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from pycftools import StatsRecorder
+
+
+class StatsRecorderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.recorder = StatsRecorder(filename=os.path.join(self.directory.name, 'stats.sqlite3'))
+
+    def tearDown(self) -> None:
+        self.recorder.close()
+        self.directory.cleanup()
+
+    def test_rollups_and_query(self):
+        base = int(time.time()) // 3600 * 3600 - 3600
+        for second in range(0, 3600, 10):
+            self.recorder.record('server_info', {'server': {'status': {'players': second // 60, 'online': True},
+                                                            'name': 'x'}}, base + second)
+        self.assertEqual(self.recorder.metrics(), ['server_info.server.status.online',
+                                                   'server_info.server.status.players'])
+
+        timestamps, values = self.recorder.query('server_info.server.status.players', base, base + 3599,
+                                                 resolution=0)
+        self.assertEqual(len(values), 360)
+
+        timestamps, values = self.recorder.query('server_info.server.status.players', base, base + 3599,
+                                                 resolution=60, agg='max')
+        self.assertEqual(list(values), [float(minute) for minute in range(60)])
+        self.assertEqual(timestamps[1] - timestamps[0], 60)
+
+        # 360 raw points fit into the budget, 30 don't - the 1m buckets do.
+        self.assertEqual(len(self.recorder.query('server_info.server.status.players', base, base + 3599,
+                                                 max_points=500)[0]), 360)
+        self.assertEqual(len(self.recorder.query('server_info.server.status.players', base, base + 3599,
+                                                 max_points=100)[0]), 60)
+
+        timestamps, values = self.recorder.query('server_info.server.status.players', base, resolution=3600)
+        self.assertEqual(list(values), [sum(second // 60 for second in range(0, 3600, 10)) / 360])
+
+    def test_retention(self):
+        old = time.time() - 3 * 86400
+        self.recorder.record('server_statistics', {'players': 1}, old)
+        self.recorder.prune()
+        self.assertEqual(len(self.recorder.query('server_statistics.players', old - 1, resolution=0)[0]), 0)
+        self.assertEqual(len(self.recorder.query('server_statistics.players', old - 60, resolution=60)[0]), 1)
+
+    def test_sampler_reports_errors(self):
+        class DownApi(object):
+            def server_statistics(self):
+                raise ConnectionError('api is down')
+
+        failed = threading.Event()
+        errors = []
+
+        def on_error(err):
+            errors.append(err)
+            failed.set()
+
+        recorder = StatsRecorder(DownApi(), filename=os.path.join(self.directory.name, 'down.sqlite3'),
+                                 routes=('server_statistics',), on_error=on_error)
+        recorder.start(interval=60)
+        self.assertTrue(failed.wait(5))
+        recorder.close()
+        self.assertIsInstance(errors[0], ConnectionError)
+        self.assertIs(recorder.last_error, errors[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
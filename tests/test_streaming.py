@@ -0,0 +1,101 @@
+import asyncio
+import json
+import unittest
+
+import pycftools
+from pycftools import Ban, MemoryTokenStore, Metrics, Retrier, RetryPolicy, _iter_json_entries
+from stub_server import StubCfToolsServer
+
+
+class StreamedListingTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.listing = {
+            'status': True,
+            'entries': [{'id': str(i), 'reason': 'cheating ü' * i, 'expires_at': None} for i in range(200)],
+            'count': 200
+        }
+        self.document = json.dumps(self.listing).encode()
+
+    def test_entries_across_chunk_boundaries(self):
+        for chunk_size in (1, 3, 17, 4096):
+            chunks = [self.document[i:i + chunk_size] for i in range(0, len(self.document), chunk_size)]
+            meta = {}
+            self.assertEqual(list(_iter_json_entries(chunks, meta=meta)), self.listing['entries'])
+            self.assertEqual(meta, {'status': True, 'count': 200})
+
+    def test_top_level_array_and_empty_listing(self):
+        self.assertEqual(list(_iter_json_entries([b'[1, 2', b'3, 4]'])), [1, 23, 4])
+        self.assertEqual(list(_iter_json_entries([b'{"entries": []}'])), [])
+
+    def test_truncated_stream_raises(self):
+        with self.assertRaises(ValueError):
+            list(_iter_json_entries([self.document[:len(self.document) // 2]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+@unittest.skipIf(pycftools.httpx is None, 'httpx is not installed')
+class AsyncStreamedListingTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.stub.page_size = 3
+        self.stub.bans = [{'id': str(i), 'identifier': f'cf-{i}'} for i in range(7)]
+
+    def tearDown(self) -> None:
+        self.stub.stop()
+
+    def test_goes_through_the_request_pipeline(self):
+        metrics = Metrics()
+
+        async def run():
+            cfapi = pycftools.AsyncCfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                              ip='127.0.0.1', game_port='2302', server_api_id='server',
+                                              server_banlist_id='banlist', rate_limiter=False,
+                                              token_store=MemoryTokenStore(), api_url=self.stub.url,
+                                              retrier=Retrier(RetryPolicy(backoff=0.01)), metrics=metrics)
+            await cfapi.server_info()
+            self.stub.fail_next('/v1/banlist/banlist/bans', 503)
+            bans = [ban.identifier async for ban in cfapi.iter_bans(model=Ban)]
+            await cfapi.close()
+            return bans
+
+        self.assertEqual(asyncio.run(run()), [f'cf-{i}' for i in range(7)])
+        # One retried 503, then three pages.
+        self.assertEqual(self.stub.count('/v1/banlist/banlist/bans'), 4)
+        self.assertIn('pycftools_retries_total{route="server_banlist"} 1', metrics.prometheus())
+
+
+class StreamedListingSchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.stub.page_size = 3
+        self.stub.bans = [{'id': str(i), 'identifier': f'cf-{i}'} for i in range(7)]
+        self.scheduler = pycftools.RequestScheduler(max_concurrent=1)
+        self.test_cfapi = pycftools.CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                               ip='127.0.0.1', game_port='2302', server_api_id='server',
+                                               server_banlist_id='banlist', rate_limiter=False,
+                                               token_store=MemoryTokenStore(), api_url=self.stub.url,
+                                               scheduler=self.scheduler)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+
+    def test_slot_held_while_the_body_is_read(self):
+        bans = self.test_cfapi.iter_bans()
+        self.assertEqual(next(bans)['identifier'], 'cf-0')
+        self.assertEqual(self.scheduler.stats()['in_flight'], 1)
+        self.assertEqual([ban['identifier'] for ban in bans], [f'cf-{i}' for i in range(1, 7)])
+        self.assertEqual(self.scheduler.stats()['in_flight'], 0)
+
+    def test_slot_released_when_abandoned(self):
+        bans = self.test_cfapi.iter_bans()
+        next(bans)
+        bans.close()
+        self.assertEqual(self.scheduler.stats()['in_flight'], 0)
+        self.stub.fail_next('/v1/banlist/banlist/bans', 404)
+        with self.assertRaises(pycftools.requests.HTTPError):
+            list(self.test_cfapi.iter_bans())
+        self.assertEqual(self.scheduler.stats()['in_flight'], 0)
@@ -0,0 +1,107 @@
+import asyncio
+import time
+import unittest
+
+from pycftools import AsyncCfToolsApi, CfToolsApi, MemoryTokenStore
+from stub_server import StubCfToolsServer
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not met in time')
+        time.sleep(0.02)
+
+
+class TokenRefresherTest(unittest.TestCase):
+    # Tokens live 2 seconds and are renewed 1 second ahead of their deadline.
+    TIMESTAMP_DELTA = 2
+
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+        self.token_store = MemoryTokenStore()
+
+    def tearDown(self) -> None:
+        self.stub.stop()
+
+    def __registrations(self):
+        return self.stub.count('/v1/auth/register')
+
+    def __renewed(self, timestamp):
+        # The stub counts the request before the client saves the token, so wait for the store.
+        data = self.token_store.load()
+        return data is not None and data['timestamp'] != timestamp
+
+    def __client_kwargs(self):
+        return dict(app_id='app', app_secret='secret', game_identifier='1',
+                    ip='127.0.0.1', game_port='2302',
+                    server_api_id='server',
+                    server_banlist_id='banlist',
+                    rate_limiter=False,
+                    token_store=self.token_store,
+                    timestamp_delta=self.TIMESTAMP_DELTA,
+                    background_token_refresh=True,
+                    token_refresh_ahead=1,
+                    api_url=self.stub.url)
+
+    def test_renews_ahead_and_falls_back(self):
+        cfapi = CfToolsApi(**self.__client_kwargs())
+        try:
+            _wait_for(lambda: self.__renewed(None))
+            first = self.token_store.load()['timestamp']
+            self.assertEqual(cfapi.server_info().status_code, 200)
+
+            _wait_for(lambda: self.__renewed(first))
+            self.assertEqual(self.__registrations(), 2)
+            # Renewed before the first token ran out.
+            self.assertLess(time.time(), first + self.TIMESTAMP_DELTA)
+            second = self.token_store.load()['timestamp']
+
+            self.stub.fail_next('/v1/auth/register', 401)
+            _wait_for(lambda: self.__registrations() == 3)
+            # The renewal failed, but the token is still valid.
+            self.assertEqual(cfapi.server_info().status_code, 200)
+            self.assertEqual(self.__registrations(), 3)
+
+            # Past its deadline, the api call registers a new token itself.
+            time.sleep(max(second + self.TIMESTAMP_DELTA - time.time(), 0) + 0.1)
+            self.assertEqual(cfapi.server_info().status_code, 200)
+            self.assertEqual(self.__registrations(), 4)
+        finally:
+            cfapi.close()
+
+    def test_async_renews_ahead_and_falls_back(self):
+        async def wait_for(condition, timeout=5):
+            deadline = time.monotonic() + timeout
+            while not condition():
+                if time.monotonic() > deadline:
+                    raise AssertionError('condition not met in time')
+                await asyncio.sleep(0.02)
+
+        async def run():
+            async with AsyncCfToolsApi(**self.__client_kwargs()) as cfapi:
+                # The refresher task starts with the first api call.
+                self.assertEqual((await cfapi.server_info()).status_code, 200)
+                self.assertEqual(self.__registrations(), 1)
+                first = self.token_store.load()['timestamp']
+
+                await wait_for(lambda: self.__renewed(first))
+                self.assertEqual(self.__registrations(), 2)
+                self.assertLess(time.time(), first + self.TIMESTAMP_DELTA)
+                second = self.token_store.load()['timestamp']
+
+                self.stub.fail_next('/v1/auth/register', 401)
+                await wait_for(lambda: self.__registrations() == 3)
+                self.assertEqual((await cfapi.server_info()).status_code, 200)
+                self.assertEqual(self.__registrations(), 3)
+
+                await asyncio.sleep(max(second + self.TIMESTAMP_DELTA - time.time(), 0) + 0.1)
+                self.assertEqual((await cfapi.server_info()).status_code, 200)
+                self.assertEqual(self.__registrations(), 4)
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
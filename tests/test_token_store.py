@@ -0,0 +1,125 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+import unittest
+
+from pycftools import CfToolsApi, FileTokenStore, MemoryTokenStore, SqliteTokenStore, _acquire_in_thread
+from stub_server import StubCfToolsServer
+
+
+def _refresh_in_process(api_url, token_filename, barrier):
+    cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                       ip='127.0.0.1', game_port='2302', server_api_id='server', server_banlist_id='banlist',
+                       rate_limiter=False, token_store=FileTokenStore(token_filename), api_url=api_url)
+    try:
+        barrier.wait()
+        cfapi.server_info()
+    finally:
+        cfapi.close()
+
+
+class TokenStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.stub = StubCfToolsServer().start()
+
+    def tearDown(self) -> None:
+        self.stub.stop()
+        self.directory.cleanup()
+
+    def __path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def __client(self, token_store):
+        return CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                          ip='127.0.0.1', game_port='2302', server_api_id='server', server_banlist_id='banlist',
+                          rate_limiter=False, token_store=token_store, api_url=self.stub.url)
+
+    def test_concurrent_processes_register_once(self):
+        # Registration is slow, so every process reaches the refresh election before the token exists.
+        self.stub.latency = 0.3
+        context = multiprocessing.get_context('spawn')
+        barrier = context.Barrier(4)
+        processes = [context.Process(target=_refresh_in_process,
+                                     args=(self.stub.url, self.__path('token.raw'), barrier))
+                     for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+        self.assertEqual(self.stub.count('/v1/auth/register'), 1)
+        self.assertEqual(self.stub.count('/v1/server/server/info'), 4)
+
+    def test_file_store_round_trip(self):
+        store = FileTokenStore(self.__path('token.raw'))
+        self.assertIsNone(store.load())
+        store.save('abc', 123.0)
+        self.assertEqual(FileTokenStore(self.__path('token.raw')).load(), {'token': 'abc', 'timestamp': 123.0})
+
+    def test_corrupt_token_file_recovers(self):
+        filename = self.__path('token.raw')
+        for content in (b'', b'not a pickle', b'\x80\x04K\x01.'):
+            with open(filename, 'wb') as token_file:
+                token_file.write(content)
+            self.assertIsNone(FileTokenStore(filename).load())
+        cfapi = self.__client(FileTokenStore(filename))
+        try:
+            self.assertEqual(cfapi.server_info().status_code, 200)
+        finally:
+            cfapi.close()
+        self.assertEqual(self.stub.count('/v1/auth/register'), 1)
+        self.assertEqual(FileTokenStore(filename).load()['token'], 'stub-token')
+
+    def test_sqlite_store(self):
+        filename = self.__path('token.sqlite3')
+        first = SqliteTokenStore(filename)
+        other = SqliteTokenStore(filename, key='other')
+        self.assertIsNone(first.load())
+        first.save('abc', 1.0)
+        first.save('def', 2.0)
+        self.assertEqual(SqliteTokenStore(filename).load(), {'token': 'def', 'timestamp': 2.0})
+        self.assertIsNone(other.load())
+
+    def test_sqlite_store_shared_by_clients(self):
+        filename = self.__path('token.sqlite3')
+        clients = [self.__client(SqliteTokenStore(filename)) for _ in range(2)]
+        try:
+            for cfapi in clients:
+                self.assertEqual(cfapi.server_info().status_code, 200)
+        finally:
+            for cfapi in clients:
+                cfapi.close()
+        self.assertEqual(self.stub.count('/v1/auth/register'), 1)
+
+    def test_memory_store(self):
+        store = MemoryTokenStore()
+        self.assertIsNone(store.load())
+        store.save('abc', 1.0)
+        self.assertEqual(store.load(), {'token': 'abc', 'timestamp': 1.0})
+        with store.refresh_lock():
+            self.assertFalse(store.refresh_lock().acquire(blocking=False))
+
+    def test_cancelled_async_acquire_releases_lock(self):
+        lock = threading.Lock()
+        lock.acquire()
+
+        async def cancel_waiter():
+            waiter = asyncio.ensure_future(_acquire_in_thread(lock))
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            lock.release()
+            # The worker thread still takes the lock, and hands it back for the cancelled task.
+            await asyncio.sleep(0.2)
+
+        asyncio.run(cancel_waiter())
+        self.assertTrue(lock.acquire(timeout=1))
+        lock.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
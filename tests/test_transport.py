@@ -0,0 +1,78 @@
+import asyncio
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import pycftools
+from pycftools import CfToolsApi, MemoryTokenStore, PooledTransport
+from stub_server import StubCfToolsServer
+
+
+class PooledTransportTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub = StubCfToolsServer().start()
+
+    def tearDown(self) -> None:
+        self.stub.stop()
+
+    def __client(self, **kwargs):
+        return CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                          ip='127.0.0.1', game_port='2302',
+                          server_api_id='server',
+                          server_banlist_id='banlist',
+                          rate_limiter=False,
+                          token_store=MemoryTokenStore(),
+                          api_url=self.stub.url, **kwargs)
+
+    def test_warm_up_and_reuse(self):
+        cfapi = self.__client()
+        self.assertEqual(cfapi.warm_up(connections=4), 4)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda i: cfapi.server_player_stats(f'cf-{i}'), range(100)))
+        stats = cfapi.connection_stats()
+        self.assertEqual(stats['requests'], 101)
+        self.assertLessEqual(stats['connections'], 5)
+        self.assertEqual(stats['discarded'], 0)
+        self.assertGreater(stats['reuse_ratio'], 0.9)
+        cfapi.close()
+
+    def test_small_pool_discards_and_idle_eviction(self):
+        self.stub.latency = 0.02
+        transport = PooledTransport(pool_maxsize=1, idle_timeout=0.05)
+        cfapi = self.__client(transport=transport)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda i: cfapi.server_player_stats(f'cf-{i}'), range(8)))
+        self.assertGreater(transport.stats()['discarded'], 0)
+        time.sleep(0.1)
+        cfapi.server_info()
+        self.assertEqual(transport.stats()['evicted_idle'], 1)
+        cfapi.close()
+
+    def test_no_keep_alive(self):
+        cfapi = self.__client(transport=PooledTransport(keep_alive=False))
+        for _ in range(3):
+            cfapi.server_info()
+        stats = cfapi.connection_stats()
+        self.assertEqual(stats['connections'], stats['requests'])
+        cfapi.close()
+
+    @unittest.skipIf(pycftools.httpx is None, 'httpx is not installed')
+    def test_async_stats(self):
+        async def run():
+            cfapi = pycftools.AsyncCfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                              ip='127.0.0.1', game_port='2302', server_api_id='server',
+                                              server_banlist_id='banlist', rate_limiter=False,
+                                              token_store=MemoryTokenStore(), api_url=self.stub.url)
+            self.assertEqual(await cfapi.warm_up(connections=3), 3)
+            await asyncio.gather(*[cfapi.server_player_stats(f'cf-{i}') for i in range(30)])
+            stats = cfapi.connection_stats()
+            await cfapi.close()
+            return stats
+
+        stats = asyncio.run(run())
+        self.assertEqual(stats['requests'], 34)
+        self.assertGreaterEqual(stats['reused'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
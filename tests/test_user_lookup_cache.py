@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from pycftools import CfToolsApi, MemoryTokenStore, UserLookupCache
+from stub_server import StubCfToolsServer
+
+
+class UserLookupCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'users.sqlite3')
+        self.stub = StubCfToolsServer().start()
+        self.stub.users = {f'steam-{i}': f'cf-{i}' for i in range(100)}
+        self.test_cfapi = CfToolsApi(app_id='app', app_secret='secret', game_identifier='1',
+                                     ip='127.0.0.1', game_port='2302',
+                                     server_api_id='server',
+                                     server_banlist_id='banlist',
+                                     rate_limiter=False,
+                                     token_store=MemoryTokenStore(),
+                                     api_url=self.stub.url)
+
+    def tearDown(self) -> None:
+        self.test_cfapi.close()
+        self.stub.stop()
+        self.directory.cleanup()
+
+    def test_two_tiers_survive_restart(self):
+        users = UserLookupCache(self.test_cfapi, self.filename, maxsize=10)
+        resolved = users.warm_up([f'steam-{i}' for i in range(50)])
+        self.assertEqual(resolved['steam-7'], 'cf-7')
+        self.assertEqual(self.stub.count('/v1/users/lookup'), 50)
+        self.assertEqual(users.lookup('steam-49'), 'cf-49')
+        # Evicted from memory, still on disk.
+        self.assertEqual(users.lookup('steam-0'), 'cf-0')
+        self.assertEqual(users.stats()['disk_hits'], 1)
+        users.close()
+
+        users = UserLookupCache(self.test_cfapi, self.filename)
+        self.assertEqual(len(users.warm_up([f'steam-{i}' for i in range(50)])), 50)
+        self.assertEqual(self.stub.count('/v1/users/lookup'), 50)
+        users.close()
+
+    def test_negative_ttl(self):
+        users = UserLookupCache(self.test_cfapi, None, negative_ttl=0.2)
+        self.assertIsNone(users.lookup('unknown'))
+        self.assertIsNone(users.lookup('unknown'))
+        self.assertEqual(self.stub.count('/v1/users/lookup'), 1)
+        self.stub.users['unknown'] = 'cf-new'
+        time.sleep(0.25)
+        self.assertEqual(users.lookup('unknown'), 'cf-new')
+
+    def test_memory_hits_do_not_wait_for_the_disk(self):
+        users = UserLookupCache(self.test_cfapi, self.filename)
+        self.assertEqual(users.lookup('steam-1'), 'cf-1')
+        # Another process holds the database, a disk read waits for it.
+        other = sqlite3.connect(self.filename, isolation_level=None)
+        other.execute('BEGIN EXCLUSIVE')
+        reader = threading.Thread(target=users.lookup, args=('steam-2',))
+        reader.start()
+        time.sleep(0.1)
+        started = time.monotonic()
+        self.assertEqual(users.lookup('steam-1'), 'cf-1')
+        self.assertLess(time.monotonic() - started, 1)
+        other.execute('COMMIT')
+        reader.join()
+        other.close()
+        users.close()
+
+
+if __name__ == '__main__':
+    unittest.main()